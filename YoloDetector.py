@@ -1,40 +1,266 @@
 import cv2
+import gc
+import os
+import threading
 import time
 import numpy as np
-from ultralytics import YOLO
-from picamera2 import Picamera2
 
 from config import (
-    MODEL_PATH, CONF_THRESHOLD, FRAME_WIDTH, FRAME_HEIGHT,
-    CLASS_COLORS, CAMERA_FORMAT, CAMERA_SLEEP, IGNORE_CLASSES
+    MODEL_PATH, FRAME_WIDTH, FRAME_HEIGHT,
+    CLASS_COLORS, CAMERA_FORMAT, CAMERA_SLEEP,
+    WARMUP_ITERATIONS, MODEL_WATCH_INTERVAL, GOVERNOR_ENABLED, TILED_INFERENCE, CAMERA_SOURCES,
+    CASCADE_ENABLED, CASCADE_DETECTOR_PATH, SHADOW_MODEL_PATH, SHADOW_EVERY_N,
+    DARK_LUMA_THRESHOLD, DARK_FRAMES_TO_SLEEP, DARK_FRAME_INTERVAL, LUMA_SAMPLE_STEP
 )
 from timestep_logger import TimeStepLogger
 from show_activate import ShowActivate
+from metrics import REGISTRY
+from performance_governor import PerformanceGovernor
+from tiled_inference import TiledInference
+from postprocess import filter_detections
+from display import DisplayComposer
+
+
+def update_light_state(owner, frame, name=None):
+    """
+    Đo độ sáng trên lưới pixel thưa; trả về True nếu đang ở chế độ tiết kiệm.
+    Dùng chung cho YOLOCameraDetector và từng CameraSlot: `owner` có low_power,
+    _dark_frames, _dark_since và logger (TimeStepLogger của camera đó).
+    """
+    prefix = f"{name}: " if name else ""
+    luma = float(frame[::LUMA_SAMPLE_STEP, ::LUMA_SAMPLE_STEP].mean())
+    if luma < DARK_LUMA_THRESHOLD:
+        owner._dark_frames += 1
+        if not owner.low_power and owner._dark_frames >= DARK_FRAMES_TO_SLEEP:
+            owner.low_power = True
+            owner._dark_since = time.time()
+            print(f"[POWER] {prefix}Door closed (luma={luma:.1f}). Detector paused.")
+    else:
+        owner._dark_frames = 0
+        if owner.low_power:
+            # Mở cửa: chạy lại ngay trên chính frame này, dời các mốc thời gian đi đúng khoảng tạm dừng
+            owner.low_power = False
+            owner.logger.handle_pause(time.time() - owner._dark_since)
+            print(f"[POWER] {prefix}Door opened (luma={luma:.1f}). Detector resumed.")
+    return owner.low_power
+
 
 class YOLOCameraDetector:
     def __init__(self):
         print("[INIT] Loading Model & System...")
-        self.model = YOLO(MODEL_PATH)
+        self._init_state()
         self.logger = TimeStepLogger()
-        self.viewer = ShowActivate()
-
-        self.frame_width = FRAME_WIDTH
-        self.frame_height = FRAME_HEIGHT
+        # Khung hiển thị (frame + panel) cấp phát 1 lần, mỗi frame chỉ chép vào view cố định
+        self.display = DisplayComposer(self.frame_width, self.frame_height)
         
         # List to store current boxes for mouse interaction
         self.current_boxes_ui = [] 
-        self.latest_detection = None
-        self.delected_item = None
+
+        # Cửa đóng (khung hình tối) -> không suy luận, chụp thưa hơn, dừng bộ đếm thời gian của logger
+        self._dark_frames = 0
+        self._dark_since = None
+
+        # Suy luận theo vùng kệ / tile để chai nhỏ ở xa không bị mất khi thu nhỏ cả frame
+        self.tiler = TiledInference() if TILED_INFERENCE else None
+        if self.tiler is not None:
+            REGISTRY.gauge("detector_tile_reuse_ratio", "Tỉ lệ tile dùng lại kết quả cũ (không suy luận lại)",
+                           fn=lambda: self.tiler.stats()["reuse_rate"])
+
+        # Chế độ cascade: model chính là detector chỉ định vị chai
+        if CASCADE_ENABLED:
+            self.model_path = CASCADE_DETECTOR_PATH
+
+        camera_num = CAMERA_SOURCES[0]
+        if not isinstance(camera_num, int):
+            raise ValueError(f"YOLOCameraDetector only supports Picamera2 camera numbers, got {camera_num!r} "
+                             f"(use multi_camera_detector.py for cv2 sources)")
+        # Import nặng (picamera2, ultralytics/torch) để muộn tới đây, để import module này rẻ
         print("[INIT] Starting Camera...")
-        self.picam2 = Picamera2(camera_num = 1)
+        t0 = time.perf_counter()
+        from picamera2 import Picamera2
+        self.picam2 = Picamera2(camera_num=camera_num)
         cfg = self.picam2.create_still_configuration(
             main={"format": CAMERA_FORMAT, "size": (self.frame_width, self.frame_height)}
         )
         self.picam2.configure(cfg)
         self.picam2.start()
-        time.sleep(CAMERA_SLEEP)
+        camera_started = time.perf_counter()
+        self.init_profile["camera_start"] = camera_started - t0
+        self._load_model(camera_started, load_cascade=CASCADE_ENABLED)
+        self.init_profile["total"] = time.perf_counter() - t0
+
+        # Model ứng viên chạy ngầm trên 1/N frame để so với model đang dùng
+        if SHADOW_MODEL_PATH:
+            from shadow_eval import ShadowEvaluator
+            self.shadow = ShadowEvaluator()
+
+        if MODEL_WATCH_INTERVAL > 0:
+            threading.Thread(target=self._watch_model_file, name="model-watcher", daemon=True).start()
         print("[READY] System Started!")
 
+    def _init_state(self):
+        """Trạng thái dùng chung với MultiCameraDetector (metrics, governor, hot-swap); chưa mở camera/model."""
+        self.init_profile = {}  # Thời gian (giây) của từng bước khởi tạo
+        self.is_ready = False   # True sau khi frame đầu tiên đã được suy luận
+        self.viewer = ShowActivate()
+        self.frame_width = FRAME_WIDTH
+        self.frame_height = FRAME_HEIGHT
+        self.latest_detection = None
+        self.delected_item = None
+        self.low_power = False
+
+        self._init_metrics()
+
+        # Tile, cascade và shadow chỉ được bật trong YOLOCameraDetector.__init__
+        self.tiler = None
+        self.cascade = None
+        self.shadow = None
+
+        # Hot-swap: model mới được nạp + warm-up ở thread nền, thay vào giữa 2 frame
+        self.model_path = MODEL_PATH
+        self.model_swap_state = "idle"  # idle | loading | failed: <lỗi>
+        self._pending_model = None
+        self._swap_lock = threading.Lock()
+
+    def _init_metrics(self):
+        # Metrics (đọc qua endpoint /metrics của be_py/main.py)
+        self.frames_total = REGISTRY.counter("detector_frames_total", "Số frame đã xử lý")
+        self.detections_total = REGISTRY.counter("detector_detections_total", "Số box vượt ngưỡng sau lọc")
+        self.inference_seconds = REGISTRY.histogram("detector_inference_seconds", "Thời gian model.predict (giây)")
+        self.frame_seconds = REGISTRY.histogram("detector_frame_seconds", "Thời gian xử lý trọn 1 frame (giây)")
+        self.fps_gauge = REGISTRY.gauge("detector_fps", "FPS trung bình trượt")
+        self.model_swaps_total = REGISTRY.counter("detector_model_swaps_total", "Số lần thay model khi đang chạy")
+        self.low_power_gauge = REGISTRY.gauge("detector_low_power", "1 khi cửa đóng và nhận diện đang tạm dừng")
+
+        # Tự điều chỉnh imgsz / nhịp chụp theo FPS, CPU và nhiệt độ SoC
+        self.governor = PerformanceGovernor() if GOVERNOR_ENABLED else None
+        if self.governor is not None:
+            REGISTRY.gauge("detector_imgsz", "imgsz đang dùng cho suy luận", fn=lambda: self.governor.imgsz)
+            REGISTRY.gauge("detector_frame_interval_seconds", "Khoảng cách tối thiểu giữa 2 frame do governor đặt",
+                           fn=lambda: self.governor.frame_interval)
+            REGISTRY.gauge("detector_soc_temp_celsius", "Nhiệt độ SoC đọc từ sysfs",
+                           fn=lambda: self.governor.soc_temp or 0.0)
+
+    def _load_model(self, camera_started, load_cascade=False):
+        """Nạp model (và classifier của cascade nếu load_cascade) trong lúc camera ổn định, thay vì sleep rồi mới nạp."""
+        from ultralytics import YOLO
+        self.model = YOLO(self.model_path, task="detect")
+        self._sync_governor(self.model_path)
+        self.init_profile["model_load"] = time.perf_counter() - camera_started
+        warmup_start = time.perf_counter()
+        self._warm_up(self.model, self._imgsz_for(self.model_path))
+        self.init_profile["warmup"] = time.perf_counter() - warmup_start
+        if load_cascade and self.cascade is None:
+            from cascade import CropClassifierCascade
+            classifier_start = time.perf_counter()
+            self.cascade = CropClassifierCascade()
+            self.init_profile["classifier_load"] = time.perf_counter() - classifier_start
+
+        remaining = CAMERA_SLEEP - (time.perf_counter() - camera_started)
+        if remaining > 0:
+            time.sleep(remaining)
+
+    @staticmethod
+    def _is_fixed_shape(model_path):
+        """Model export (ONNX/NCNN/OpenVINO) chỉ nhận đúng imgsz lúc export (= FRAME_WIDTH)."""
+        return not model_path.endswith(".pt")
+
+    def _imgsz_for(self, model_path):
+        """imgsz mà model_path sẽ được chạy khi đang dùng: cố định nếu là bản export, còn lại theo governor."""
+        if self.governor is None or self._is_fixed_shape(model_path):
+            return self.frame_width
+        return self.governor.imgsz
+
+    def _sync_governor(self, model_path):
+        """Khóa imgsz của governor cho model export, mở lại khi chuyển về .pt."""
+        if self.governor is None:
+            return
+        if self._is_fixed_shape(model_path):
+            self.governor.lock_imgsz(self.frame_width)
+        else:
+            self.governor.unlock_imgsz()
+
+    def _warm_up(self, model, imgsz):
+        """Chạy vài lần predict trên ảnh đen đúng imgsz để lần suy luận thật đầu tiên không bị chậm."""
+        dummy = np.zeros((self.frame_height, self.frame_width, 3), dtype=np.uint8)
+        for _ in range(WARMUP_ITERATIONS):
+            model.predict(dummy, verbose=False, imgsz=imgsz)
+
+    def request_model_swap(self, model_path=None):
+        """Nạp model ứng viên ở thread nền; trả về False nếu đang có lần nạp khác."""
+        model_path = model_path or self.model_path
+        with self._swap_lock:
+            if self.model_swap_state == "loading":
+                return False
+            self.model_swap_state = "loading"
+        threading.Thread(target=self._load_candidate, args=(model_path,),
+                         name="model-loader", daemon=True).start()
+        return True
+
+    def _load_candidate(self, model_path):
+        print(f"[MODEL] Loading candidate: {model_path}")
+        try:
+            from ultralytics import YOLO
+            candidate = YOLO(model_path, task="detect")
+            self._warm_up(candidate, self._imgsz_for(model_path))
+        except Exception as e:
+            print(f"[MODEL] Load failed, keeping current model: {e}")
+            with self._swap_lock:
+                self.model_swap_state = f"failed: {e}"
+            return
+        with self._swap_lock:
+            self._pending_model = (candidate, model_path)
+
+    def _apply_pending_model(self):
+        """Gọi ở đầu mỗi frame: thay model nguyên tử giữa 2 lần suy luận."""
+        with self._swap_lock:
+            candidate, model_path = self._pending_model
+            self._pending_model = None
+            self.model_swap_state = "idle"
+        old_model = self.model
+        self.model = candidate
+        self.model_path = model_path
+        self._sync_governor(model_path)
+        self.model_swaps_total.inc()
+        if self.tiler is not None:
+            self.tiler.reset()  # kết quả cache theo tile thuộc về model cũ
+        del old_model
+        gc.collect()
+        print(f"[MODEL] Swapped to {model_path}")
+
+    def _update_light_state(self, frame):
+        low_power = update_light_state(self, frame)
+        self.low_power_gauge.set(1 if low_power else 0)
+        return low_power
+
+    def _watch_model_file(self):
+        """Theo dõi mtime của file model; nạp lại khi file đổi và đã ghi xong (kích thước ổn định)."""
+        def stat(path):
+            try:
+                st = os.stat(path)
+                return st.st_mtime, st.st_size
+            except OSError:
+                return None
+
+        watched = self.model_path
+        last = stat(watched)
+        while True:
+            time.sleep(MODEL_WATCH_INTERVAL)
+            if self.model_path != watched:
+                # Model đã được đổi sang file khác (lệnh websocket): theo dõi file mới
+                watched = self.model_path
+                last = stat(watched)
+                continue
+            current = stat(watched)
+            if current is None or current == last:
+                continue
+            time.sleep(1.0)
+            if stat(watched) != current:
+                continue  # file vẫn đang được ghi, đợi vòng sau
+            last = current
+            print(f"[MODEL] {watched} changed on disk, reloading...")
+            self.request_model_swap(watched)
+
     def mouse_callback(self, event, x, y, flags, param):
         if event == cv2.EVENT_LBUTTONDOWN:
             if x < self.frame_width:
@@ -50,76 +276,109 @@ class YOLOCameraDetector:
             self.viewer.close_panel()
             print("[CLICK] Closed Panel")
 
+    @staticmethod
+    def _result_arrays(r):
+        """Box (xyxy), score, class của 1 kết quả ultralytics dưới dạng numpy."""
+        return r.boxes.xyxy.cpu().numpy(), r.boxes.conf.cpu().numpy(), r.boxes.cls.cpu().numpy()
+
+    def _draw_detections(self, boxes, scores, classes, names, annotated_frame, logger):
+        """Lọc box theo ngưỡng, cập nhật logger và vẽ lên annotated_frame; trả về box cho click chuột."""
+        frame_boxes_temp = []
+        boxes, scores, classes = filter_detections(boxes, scores, classes)
+        for i in range(len(boxes)):
+            score = float(scores[i])
+            cls = int(classes[i])
+            class_name = names[cls]
+            box = boxes[i]
+            x1, y1, x2, y2 = map(int, box)
+            self.detections_total.inc()
+
+            # 1. Update Logger Tracking
+            result_class_name = logger.log_first_detect(cls, class_name, score)
+            if result_class_name is not None:
+               self.latest_detection = result_class_name
+#               print("Da lu bien '{result_class_name}' vao bien chung")
+            # --- [FIXED] THIS LINE WAS MISSING ---
+            # Check if time exceeded threshold to trigger activation
+            logger.check_and_log_activation(cls, class_name)
+            # -------------------------------------
+
+            # 2. Get Time Duration
+            duration = logger.get_duration(cls)
+            minutes = int(duration // 60)
+            seconds = int(duration % 60)
+            time_str = f"{minutes}m {seconds}s"
+
+            # 3. Get Status
+            is_active = logger.is_activated(cls)
+            is_stable = logger.logged_initial.get(cls, False)
+            
+            color = CLASS_COLORS.get(cls, (255, 255, 255))
+            
+            # Draw Box
+            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
+            
+            # Create Label
+            if is_stable:
+                status_txt = "ACTIVATED " if is_active else ""
+                label = f"{class_name} | {time_str} | {status_txt}"
+                frame_boxes_temp.append((x1, y1, x2, y2, class_name))
+            else:
+                label = f"{class_name} (checking...)"
+            
+            # Draw Label
+            (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+            cv2.rectangle(annotated_frame, (x1, y1 - 20), (x1 + w, y1), color, -1)
+            cv2.putText(annotated_frame, label, (x1, y1 - 5), 
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        return frame_boxes_temp
+
     def run(self):
         window_name = "Smart Fridge System"
         cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
         cv2.setMouseCallback(window_name, self.mouse_callback)
 
+        fps = 0.0
+        frame_index = 0
         try:
             while True:
+                if self._pending_model is not None:
+                    self._apply_pending_model()
+                frame_start = time.perf_counter()
                 frame = self.picam2.capture_array()
+                if self._update_light_state(frame):
+                    self.is_ready = True
+                    # waitKey vừa giữ cửa sổ phản hồi vừa làm nhịp chụp chậm
+                    key = cv2.waitKey(int(DARK_FRAME_INTERVAL * 1000)) & 0xFF
+                    if key == ord('q'):
+                        break
+                    continue
                 frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
 
-                results = self.model.predict(frame, verbose=False, imgsz=self.frame_width)
-                r = results[0]
-                
-                frame_boxes_temp = []
-
-                boxes = r.boxes.xyxy.cpu().numpy()
-                scores = r.boxes.conf.cpu().numpy()
-                classes = r.boxes.cls.cpu().numpy()
-
-                annotated_frame = frame.copy()
-
-                for i in range(len(boxes)):
-                    score = float(scores[i])
-                    if score < CONF_THRESHOLD: continue
-                    
-                    cls = int(classes[i])
-                    if cls in IGNORE_CLASSES:
-                       continue
-                    class_name = r.names[cls]
-                    box = boxes[i]
-                    x1, y1, x2, y2 = map(int, box)
-
-                    # 1. Update Logger Tracking
-                    result_class_name = self.logger.log_first_detect(cls, class_name, score)
-                    if result_class_name is not None:
-                       self.latest_detection = result_class_name
-#                       print("Da lu bien '{result_class_name}' vao bien chung")
-                    # --- [FIXED] THIS LINE WAS MISSING ---
-                    # Check if time exceeded threshold to trigger activation
-                    self.logger.check_and_log_activation(cls, class_name)
-                    # -------------------------------------
-
-                    # 2. Get Time Duration
-                    duration = self.logger.get_duration(cls)
-                    minutes = int(duration // 60)
-                    seconds = int(duration % 60)
-                    time_str = f"{minutes}m {seconds}s"
-
-                    # 3. Get Status
-                    is_active = self.logger.is_activated(cls)
-                    is_stable = self.logger.logged_initial.get(cls, False)
-                    
-                    color = CLASS_COLORS.get(cls, (255, 255, 255))
-                    
-                    # Draw Box
-                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-                    
-                    # Create Label
-                    if is_stable:
-                        status_txt = "ACTIVATED " if is_active else ""
-                        label = f"{class_name} | {time_str} | {status_txt}"
-                        frame_boxes_temp.append((x1, y1, x2, y2, class_name))
-                    else:
-                        label = f"{class_name} (checking...)"
-                    
-                    # Draw Label
-                    (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
-                    cv2.rectangle(annotated_frame, (x1, y1 - 20), (x1 + w, y1), color, -1)
-                    cv2.putText(annotated_frame, label, (x1, y1 - 5), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+                infer_start = time.perf_counter()
+                imgsz = self.governor.imgsz if self.governor is not None else self.frame_width
+                if self.tiler is not None:
+                    boxes, scores, classes = self.tiler.predict(self.model, frame, imgsz)
+                else:
+                    boxes, scores, classes = self._result_arrays(
+                        self.model.predict(frame, verbose=False, imgsz=imgsz)[0])
+                names = self.model.names
+                if self.cascade is not None:
+                    boxes, scores, classes = self.cascade.classify(frame, boxes, scores)
+                    names = self.cascade.names
+                infer_seconds = time.perf_counter() - infer_start
+                self.inference_seconds.observe(infer_seconds)
+                if not self.is_ready:
+                    self.init_profile["first_inference"] = infer_seconds
+                    self.is_ready = True
+                frame_index += 1
+                if self.shadow is not None and frame_index % SHADOW_EVERY_N == 0:
+                    self.shadow.submit(frame, boxes, scores, classes, imgsz, infer_seconds)
+
+                # Vẽ thẳng lên ô camera trong buffer hiển thị; `frame` giữ nguyên cho shadow
+                annotated_frame = self.display.put(0, frame)
+                frame_boxes_temp = self._draw_detections(boxes, scores, classes, names,
+                                                         annotated_frame, self.logger)
 
                 self.current_boxes_ui = frame_boxes_temp
                 
@@ -127,16 +386,24 @@ class YOLOCameraDetector:
                 if result_delected_item is not None:
                    self.delected_item = result_delected_item 
                 if self.viewer.is_visible:
-                    panel = self.viewer.get_image()
-                    if panel.shape[0] != annotated_frame.shape[0]:
-                        panel = cv2.resize(panel, (int(panel.shape[1]), annotated_frame.shape[0]))
-                    final_display = np.hstack((annotated_frame, panel))
+                    final_display = self.display.with_panel(self.viewer.get_image())
                 else:
-                    final_display = annotated_frame
+                    final_display = self.display.grid
 
                 cv2.imshow(window_name, final_display)
 
-                key = cv2.waitKey(1) & 0xFF
+                frame_time = time.perf_counter() - frame_start
+                self.frame_seconds.observe(frame_time)
+                self.frames_total.inc()
+                fps = 0.9 * fps + 0.1 / frame_time if fps else 1.0 / frame_time
+                self.fps_gauge.set(fps)
+
+                # Khi governor giãn nhịp chụp, phần thời gian còn lại được chờ trong waitKey
+                wait_ms = 1
+                if self.governor is not None:
+                    self.governor.observe(frame_time)
+                    wait_ms = max(1, int((self.governor.frame_interval - frame_time) * 1000))
+                key = cv2.waitKey(wait_ms) & 0xFF
                 if key == ord('q'): 
                     break
                 if key == ord('s'):
@@ -147,6 +414,11 @@ class YOLOCameraDetector:
             self.picam2.stop()
             self.picam2.close()
             cv2.destroyAllWindows()
+            if self.cascade is not None:
+                print(f"[CASCADE] {self.cascade.stats()}")
+            if self.shadow is not None:
+                self.shadow.stop()
+                print(f"[SHADOW] {self.shadow.stats()}")
             print("[EXIT] Cleanup done.")
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+"""
+Suy luận hàng loạt trên thư mục ảnh lớn: chia danh sách file cho nhiều process (mỗi process
+1 model), ghi detection ra JSONL theo shard, chạy lại cùng lệnh thì tiếp tục từ chỗ đã dừng.
+
+    python batch_infer.py /home/rpi/project/test --weights yolo11n_v2.pt --workers 4 --no-render
+"""
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+
+MANIFEST_FILE = "manifest.json"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+PROGRESS_INTERVAL = 1.0  # giây giữa 2 lần in tiến độ / ghi manifest
+
+
+def _shard_path(out_dir, shard):
+    return os.path.join(out_dir, f"results_shard{shard:02d}.jsonl")
+
+
+def _atomic_write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_done(out_dir):
+    """
+    Đọc các file shard đã có, trả về tập ảnh đã xong. Dòng cuối bị cắt dở (process bị kill
+    giữa lúc ghi) được bỏ và file được ghi lại để lần append sau không dính vào dòng hỏng.
+    """
+    done = set()
+    for path in glob.glob(os.path.join(out_dir, "results_shard*.jsonl")):
+        valid = []
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            done.add(record["path"])
+            valid.append(line if line.endswith("\n") else line + "\n")
+        if len(valid) != len(lines) or (lines and not lines[-1].endswith("\n")):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(valid)
+            os.replace(tmp_path, path)
+    return done
+
+
+def _worker(shard, paths, folder, args, progress):
+    # Import trong process con: mỗi process 1 model, process cha không cần torch
+    import cv2
+    from ultralytics import YOLO
+    from infer import StageTimer, _decode
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+    model = YOLO(args.weights)
+    names = model.names
+    timer = StageTimer()
+    render_dir = None if args.no_render else os.path.join(args.out_dir, "render")
+    if render_dir:
+        os.makedirs(render_dir, exist_ok=True)
+
+    with open(_shard_path(args.out_dir, shard), "a", encoding="utf-8") as out:
+        for start in range(0, len(paths), args.batch_size):
+            chunk = paths[start:start + args.batch_size]
+            decoded = [(p, _decode(os.path.join(folder, p), None, timer)[1]) for p in chunk]
+            readable = [(p, img) for p, img in decoded if img is not None]
+            for p, img in decoded:
+                if img is None:
+                    out.write(json.dumps({"path": p, "error": "unreadable"}) + "\n")
+            if readable:
+                t0 = time.perf_counter()
+                results = model([img for _, img in readable], device=args.device, verbose=False,
+                                conf=args.conf, imgsz=args.imgsz)
+                per_image_ms = (time.perf_counter() - t0) * 1000 / len(readable)
+                timer.add("inference", time.perf_counter() - t0)
+                for (p, img), r in zip(readable, results):
+                    boxes = r.boxes.xyxy.cpu().numpy()
+                    scores = r.boxes.conf.cpu().numpy()
+                    classes = r.boxes.cls.cpu().numpy()
+                    out.write(json.dumps({
+                        "path": p,
+                        "width": int(img.shape[1]),
+                        "height": int(img.shape[0]),
+                        "ms": round(per_image_ms, 2),
+                        "detections": [
+                            {"cls": int(c), "name": names[int(c)], "conf": round(float(s), 4),
+                             "box": [round(float(v), 1) for v in b]}
+                            for b, s, c in zip(boxes, scores, classes)
+                        ],
+                    }) + "\n")
+                    if render_dir:
+                        t0 = time.perf_counter()
+                        plotted = r.plot()
+                        t1 = time.perf_counter()
+                        cv2.imwrite(os.path.join(render_dir, p.replace(os.sep, "__")), plotted)
+                        timer.add("plot", t1 - t0)
+                        timer.add("write", time.perf_counter() - t1)
+            # Flush theo batch: kết quả đã báo tiến độ thì chắc chắn đã nằm trên đĩa
+            out.flush()
+            os.fsync(out.fileno())
+            progress.put(("progress", shard, len(chunk)))
+    progress.put(("done", shard, timer.seconds))
+
+
+def run(args):
+    folder = os.path.abspath(args.folder)
+    os.makedirs(args.out_dir, exist_ok=True)
+    all_paths = sorted(
+        os.path.relpath(p, folder) for p in glob.glob(os.path.join(folder, "**", "*.*"), recursive=True)
+        if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    manifest_path = os.path.join(args.out_dir, MANIFEST_FILE)
+    settings = {"folder": folder, "weights": os.path.abspath(args.weights), "imgsz": args.imgsz, "conf": args.conf}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous.get("settings") != settings:
+            raise SystemExit(f"{args.out_dir} chứa kết quả của lần chạy khác cấu hình "
+                             f"({previous.get('settings')}); dùng --out-dir khác.")
+
+    done = load_done(args.out_dir)
+    todo = [p for p in all_paths if p not in done]
+    print(f"[BATCH] {len(all_paths)} images, {len(done)} already done, {len(todo)} to go, {args.workers} workers")
+    manifest = {"settings": settings, "total": len(all_paths), "done": len(done),
+                "started": time.strftime("%Y-%m-%d %H:%M:%S"), "finished": None}
+    _atomic_write_json(manifest_path, manifest)
+    if not todo:
+        manifest["finished"] = manifest["finished"] or time.strftime("%Y-%m-%d %H:%M:%S")
+        _atomic_write_json(manifest_path, manifest)
+        return
+
+    workers = max(1, min(args.workers, len(todo)))
+    if args.threads is None:
+        # Chia đều số nhân cho các process, tránh mỗi process torch dùng hết mọi nhân (tranh CPU)
+        args.threads = max(1, (os.cpu_count() or 1) // workers)
+    ctx = mp.get_context("spawn")
+    progress = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(i, todo[i::workers], folder, args, progress), daemon=True)
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+
+    t0 = time.perf_counter()
+    processed = 0
+    finished = 0
+    stages = {}
+    last_print = 0.0
+    while finished < workers:
+        try:
+            kind, shard, value = progress.get(timeout=PROGRESS_INTERVAL)
+        except queue.Empty:
+            if not any(p.is_alive() for p in procs):
+                break  # process con chết mà không báo "done": dừng, chạy lại lệnh để tiếp tục
+            kind = None
+        if kind == "progress":
+            processed += value
+        elif kind == "done":
+            finished += 1
+            for stage, seconds in value.items():
+                stages[stage] = stages.get(stage, 0.0) + seconds
+        now = time.perf_counter()
+        if now - last_print >= PROGRESS_INTERVAL or finished == workers:
+            last_print = now
+            elapsed = now - t0
+            rate = processed / elapsed if elapsed > 0 else 0.0
+            eta = (len(todo) - processed) / rate if rate > 0 else float("inf")
+            print(f"[BATCH] {len(done) + processed}/{len(all_paths)} | {rate:.2f} img/s | ETA {eta:.0f}s")
+            manifest["done"] = len(done) + processed
+            _atomic_write_json(manifest_path, manifest)
+
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - t0
+    complete = len(done) + processed >= len(all_paths)
+    if complete:
+        manifest["finished"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    _atomic_write_json(manifest_path, manifest)
+
+    print("========== Batch Inference ==========")
+    print(f"Processed: {processed} images in {elapsed:.1f} sec ({processed / elapsed:.2f} img/s)")
+    # Thời gian theo giai đoạn cộng trên mọi process
+    for stage, seconds in stages.items():
+        print(f"  {stage:<9} {seconds:8.2f} sec (all workers)")
+    print(f"Results: {args.out_dir}/results_shard*.jsonl")
+    print("Complete." if complete else "Interrupted: run the same command again to resume.")
+    print("=====================================")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suy luận hàng loạt nhiều process, có thể tiếp tục khi bị ngắt")
+    parser.add_argument("folder")
+    parser.add_argument("--weights", default="/home/rpi/project/yolo11n_v2.pt")
+    parser.add_argument("--out-dir", default="batch_output")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--threads", type=int, default=None,
+                        help="torch threads mỗi process (mặc định: số nhân / workers; 0 = mặc định của torch)")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--conf", type=float, default=0.50)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--no-render", action="store_true", help="chỉ ghi JSONL, không vẽ/ghi ảnh")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
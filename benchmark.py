@@ -0,0 +1,202 @@
+"""
+Benchmark suy luận tách khỏi I/O: ảnh được giải mã sẵn vào RAM, có warm-up, chạy lặp nhiều lần
+và báo p50/p90/p99, thông lượng, RSS đỉnh. Quét số thread, imgsz và backend; mỗi cấu hình chạy
+trong 1 process riêng để RSS đỉnh và số thread không ảnh hưởng lẫn nhau.
+
+    python benchmark.py --images /home/rpi/project/test --threads 1 2 4 --imgsz 320 640 \\
+        --backends pt onnx --out bench_2024-05-01.json --compare bench_baseline.json
+"""
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+
+from config import FRAME_WIDTH, FRAME_HEIGHT
+
+# Tên thư mục/file ultralytics tạo ra khi export, theo backend
+EXPORT_SUFFIX = {"onnx": ".onnx", "ncnn": "_ncnn_model", "openvino": "_openvino_model"}
+
+
+def artifact_path(weights, backend, imgsz):
+    """Đường dẫn model cho backend; bản export được gắn imgsz vì ONNX/NCNN/OpenVINO cố định kích thước."""
+    if backend == "pt":
+        return weights
+    stem = os.path.splitext(weights)[0]
+    return f"{stem}_{imgsz}{EXPORT_SUFFIX[backend]}"
+
+
+def ensure_artifact(weights, backend, imgsz):
+    path = artifact_path(weights, backend, imgsz)
+    if os.path.exists(path):
+        return path
+    from ultralytics import YOLO
+    print(f"[BENCH] Exporting {weights} -> {backend} @ {imgsz}...")
+    exported = YOLO(weights).export(format=backend, imgsz=imgsz)
+    os.replace(exported, path)
+    return path
+
+
+def load_inputs(folder, count):
+    """Ảnh thật (giải mã, resize về kích thước camera) hoặc ảnh nhiễu cố định nếu không có thư mục."""
+    import cv2
+    images = []
+    if folder:
+        for path in sorted(glob.glob(os.path.join(folder, "*.*")))[:count]:
+            img = cv2.imread(path)
+            if img is not None:
+                images.append(cv2.resize(img, (FRAME_WIDTH, FRAME_HEIGHT)))
+    if not images:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 256, (FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8) for _ in range(count)]
+    return images
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def _run_config(config, args, conn):
+    """Chạy trong process con: nạp model, warm-up, đo, gửi kết quả qua pipe."""
+    try:
+        import torch
+        torch.set_num_threads(config["threads"])
+        from ultralytics import YOLO
+
+        images = load_inputs(args.images, args.count)
+        model = YOLO(config["model"], task="detect")
+        for i in range(args.warmup):
+            model.predict(images[i % len(images)], verbose=False, imgsz=config["imgsz"])
+
+        latencies = []
+        t0 = time.perf_counter()
+        for _ in range(args.runs):
+            for img in images:
+                start = time.perf_counter()
+                model.predict(img, verbose=False, imgsz=config["imgsz"])
+                latencies.append(time.perf_counter() - start)
+        total = time.perf_counter() - t0
+        latencies.sort()
+        conn.send({
+            **{k: config[k] for k in ("backend", "threads", "imgsz")},
+            "samples": len(latencies),
+            "mean_ms": round(1000 * sum(latencies) / len(latencies), 2),
+            "p50_ms": round(1000 * percentile(latencies, 0.50), 2),
+            "p90_ms": round(1000 * percentile(latencies, 0.90), 2),
+            "p99_ms": round(1000 * percentile(latencies, 0.99), 2),
+            "throughput_fps": round(len(latencies) / total, 2),
+            # ru_maxrss trên Linux tính bằng KB
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        })
+    except Exception as e:
+        conn.send({**{k: config[k] for k in ("backend", "threads", "imgsz")}, "error": str(e)})
+    finally:
+        conn.close()
+
+
+def compare(results, baseline, tolerance):
+    """Trả về danh sách cấu hình chậm hơn baseline quá `tolerance` (p50 tăng hoặc thông lượng giảm)."""
+    key = lambda r: (r["backend"], r["threads"], r["imgsz"])
+    previous = {key(r): r for r in baseline.get("results", []) if "error" not in r}
+    regressions = []
+    for r in results:
+        old = previous.get(key(r))
+        if old is None or "error" in r:
+            continue
+        p50_change = r["p50_ms"] / old["p50_ms"] - 1
+        fps_change = r["throughput_fps"] / old["throughput_fps"] - 1
+        r["p50_change"] = round(p50_change, 3)
+        r["throughput_change"] = round(fps_change, 3)
+        if p50_change > tolerance or fps_change < -tolerance:
+            regressions.append(r)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suy luận: warm-up, phân vị, RSS, quét cấu hình")
+    parser.add_argument("--weights", default="/home/rpi/project/best_weights/yolo11n_3.pt")
+    parser.add_argument("--images", default=None, help="thư mục ảnh thật; bỏ trống = ảnh nhiễu cố định")
+    parser.add_argument("--count", type=int, default=20, help="số ảnh nạp sẵn vào RAM")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=5, help="số lần lặp qua toàn bộ ảnh")
+    parser.add_argument("--threads", type=int, nargs="+", default=[os.cpu_count() or 1])
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[FRAME_WIDTH])
+    parser.add_argument("--backends", nargs="+", default=["pt"], choices=["pt", *EXPORT_SUFFIX])
+    parser.add_argument("--out", default=f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    parser.add_argument("--compare", default=None, help="file JSON của lần chạy trước để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="ngưỡng coi là regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for backend in args.backends:
+        for imgsz in args.imgsz:
+            model_path = ensure_artifact(args.weights, backend, imgsz)
+            for threads in args.threads:
+                config = {"backend": backend, "imgsz": imgsz, "threads": threads, "model": model_path}
+                # Thread pool của OpenMP/ONNX Runtime đọc biến môi trường lúc process con khởi động
+                os.environ["OMP_NUM_THREADS"] = str(threads)
+                parent_conn, child_conn = ctx.Pipe(duplex=False)
+                proc = ctx.Process(target=_run_config, args=(config, args, child_conn))
+                proc.start()
+                child_conn.close()
+                try:
+                    result = parent_conn.recv()
+                except EOFError:
+                    result = {"backend": backend, "threads": threads, "imgsz": imgsz,
+                              "error": f"worker exited with code {proc.exitcode}"}
+                proc.join()
+                results.append(result)
+                print(f"[BENCH] {backend} imgsz={imgsz} threads={threads}: "
+                      + (result.get("error") or f"p50={result['p50_ms']}ms fps={result['throughput_fps']}"))
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "host": platform.node(),
+            "machine": platform.machine(),
+            "python": platform.python_version(),
+            "weights": args.weights,
+            "images": args.images or "synthetic",
+            "count": args.count,
+            "warmup": args.warmup,
+            "runs": args.runs,
+            "baseline": args.compare,
+        },
+        "results": results,
+        "regressions": [{k: r[k] for k in ("backend", "threads", "imgsz", "p50_change", "throughput_change")}
+                        for r in regressions],
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print("========== Inference Benchmark ==========")
+    print(f"{'backend':<9} {'imgsz':>5} {'thr':>3} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'fps':>7} {'RSS MB':>7}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<9} {r['imgsz']:>5} {r['threads']:>3} ERROR: {r['error']}")
+            continue
+        flag = "  <-- REGRESSION" if r in regressions else ""
+        print(f"{r['backend']:<9} {r['imgsz']:>5} {r['threads']:>3} {r['p50_ms']:>8.1f} {r['p90_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['throughput_fps']:>7.2f} {r['peak_rss_mb']:>7.1f}{flag}")
+    print(f"Saved report to: {args.out}")
+    print("=========================================")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import time
+
+import numpy as np
+
+from config import (
+    CONF_THRESHOLD, WARMUP_ITERATIONS,
+    CASCADE_CLASSIFIER_PATH, CASCADE_CLASSIFIER_IMGSZ, CASCADE_MIN_CONFIDENCE,
+    CASCADE_TRACK_IOU, CASCADE_TRACK_TTL, CASCADE_CROP_PADDING
+)
+from metrics import REGISTRY
+
+
+def _iou(box, boxes):
+    xx1 = np.maximum(box[0], boxes[:, 0])
+    yy1 = np.maximum(box[1], boxes[:, 1])
+    xx2 = np.minimum(box[2], boxes[:, 2])
+    yy2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-6)
+
+
+class _Track:
+    __slots__ = ("box", "class_id", "confidence", "last_seen")
+
+    def __init__(self, box, frame_index):
+        self.box = box
+        self.class_id = None
+        self.confidence = 0.0
+        self.last_seen = frame_index
+
+
+class CropClassifierCascade:
+    """
+    Tầng 2 của cascade: detector chỉ định vị chai, classifier nhỏ đọc nhãn trên crop.
+    Mỗi box được gắn vào 1 track (IoU với frame trước); classifier chỉ chạy cho track mới
+    hoặc track có độ tin cậy danh tính thấp, các track ổn định dùng lại danh tính đã cache.
+    """
+
+    def __init__(self, classifier_path=CASCADE_CLASSIFIER_PATH, imgsz=CASCADE_CLASSIFIER_IMGSZ,
+                 min_confidence=CASCADE_MIN_CONFIDENCE, track_iou=CASCADE_TRACK_IOU,
+                 track_ttl=CASCADE_TRACK_TTL, padding=CASCADE_CROP_PADDING):
+        from ultralytics import YOLO
+        self.classifier = YOLO(classifier_path)
+        self.names = self.classifier.names
+        self.imgsz = imgsz
+        self.min_confidence = min_confidence
+        self.track_iou = track_iou
+        self.track_ttl = track_ttl
+        self.padding = padding
+        self.tracks = []
+        self.frame_index = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self.classifier_seconds = REGISTRY.histogram("detector_classifier_seconds",
+                                                     "Thời gian classifier trên 1 batch crop (giây)")
+        self.hits_total = REGISTRY.counter("detector_identity_cache_hits_total", "Box dùng danh tính đã cache")
+        self.misses_total = REGISTRY.counter("detector_identity_cache_misses_total", "Box phải chạy classifier")
+
+        dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        for _ in range(WARMUP_ITERATIONS):
+            self.classifier.predict(dummy, verbose=False, imgsz=imgsz)
+
+    def _crop(self, frame, box):
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = box
+        pad_x, pad_y = (x2 - x1) * self.padding, (y2 - y1) * self.padding
+        x1, y1 = max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y))
+        x2, y2 = max(x1 + 1, min(w, int(x2 + pad_x))), max(y1 + 1, min(h, int(y2 + pad_y)))
+        return frame[y1:y2, x1:x2]
+
+    def _assign_tracks(self, boxes):
+        """Ghép tham lam mỗi box với track chưa dùng có IoU lớn nhất; box không ghép được -> track mới."""
+        assigned = []
+        free = list(self.tracks)
+        for box in boxes:
+            best = None
+            if free:
+                ious = _iou(box, np.array([t.box for t in free]))
+                i = int(np.argmax(ious))
+                if ious[i] >= self.track_iou:
+                    best = free.pop(i)
+            if best is None:
+                best = _Track(box, self.frame_index)
+                self.tracks.append(best)
+            best.box = box
+            best.last_seen = self.frame_index
+            assigned.append(best)
+        return assigned
+
+    def classify(self, frame, boxes, scores):
+        """
+        Nhận box/score của detector, trả về (boxes, scores, classes) với class lấy từ danh tính
+        của track. Box dưới CONF_THRESHOLD bị bỏ trước để không tốn crop.
+        """
+        self.frame_index += 1
+        mask = scores >= CONF_THRESHOLD
+        boxes, scores = boxes[mask], scores[mask]
+        tracks = self._assign_tracks(boxes)
+
+        pending = [t for t in tracks if t.class_id is None or t.confidence < self.min_confidence]
+        hits = len(tracks) - len(pending)
+        self.cache_hits += hits
+        self.cache_misses += len(pending)
+        self.hits_total.inc(hits)
+        self.misses_total.inc(len(pending))
+        if pending:
+            crops = [self._crop(frame, t.box) for t in pending]
+            t0 = time.perf_counter()
+            results = self.classifier.predict(crops, verbose=False, imgsz=self.imgsz)
+            self.classifier_seconds.observe(time.perf_counter() - t0)
+            for track, r in zip(pending, results):
+                class_id, confidence = int(r.probs.top1), float(r.probs.top1conf)
+                # Giữ danh tính cũ nếu lần đọc mới còn kém tin cậy hơn
+                if track.class_id is None or confidence >= track.confidence:
+                    track.class_id, track.confidence = class_id, confidence
+
+        self.tracks = [t for t in self.tracks if self.frame_index - t.last_seen <= self.track_ttl]
+        classes = np.array([t.class_id for t in tracks], dtype=np.float32)
+        return boxes, scores, classes
+
+    def reset(self):
+        self.tracks = []
+
+    def stats(self):
+        total = self.cache_hits + self.cache_misses
+        return {
+            "tracks": len(self.tracks),
+            "cache_hit_rate": round(self.cache_hits / total, 3) if total else 0.0,
+            "classifier_latency": self.classifier_seconds.summary(),
+        }
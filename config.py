@@ -4,11 +4,31 @@
 
 # YOLO
 MODEL_PATH = "/home/rpi/project/best_weights/yolo11n_3.pt"
+# "int8" = dùng bản lượng tử hóa do quantize.py tạo ra (imgsz cố định = FRAME_WIDTH)
+MODEL_PRECISION = "fp32"
+QUANTIZED_MODEL_PATH = "/home/rpi/project/best_weights/yolo11n_3_640_int8_openvino_model"
+if MODEL_PRECISION == "int8":
+    MODEL_PATH = QUANTIZED_MODEL_PATH
 CONF_THRESHOLD = 0.6
+WARMUP_ITERATIONS = 2     # số lần predict ảnh giả trước khi dùng model (lần đầu luôn chậm)
+MODEL_WATCH_INTERVAL = 5  # giây giữa 2 lần kiểm tra file MODEL_PATH để nạp lại; 0 = tắt
 FRAME_WIDTH = 640
 FRAME_HEIGHT = 480
 FRAME_W = 120
 FRAME_H = 120
+# GOVERNOR: tự giảm/tăng imgsz và nhịp chụp theo FPS, CPU và nhiệt độ SoC
+# Mặc định tắt: bậc imgsz thấp làm giảm độ chính xác. Chỉ bật sau khi đã đo từng bậc trong
+# GOVERNOR_IMGSZ_STEPS bằng evaluate.py (--imgsz) và bỏ các bậc mà mAP giảm quá mức chấp nhận được.
+GOVERNOR_ENABLED = False
+GOVERNOR_IMGSZ_STEPS = [320, 416, 512, 640]   # bội số của 32, bậc cao nhất = mặc định
+GOVERNOR_TARGET_FPS = 4.0
+GOVERNOR_MAX_SOC_TEMP = 75.0                  # °C, Pi bắt đầu throttle ở ~80-85°C
+GOVERNOR_TEMP_HYSTERESIS = 5.0
+GOVERNOR_MAX_CPU = 0.9                        # không tăng bậc khi CPU > 90%
+GOVERNOR_MAX_FRAME_INTERVAL = 2.0             # giây, nhịp chụp chậm nhất khi quá nhiệt
+GOVERNOR_INTERVAL = 5.0                       # giây giữa 2 lần ra quyết định
+GOVERNOR_THERMAL_PATH = "/sys/class/thermal/thermal_zone0/temp"
+GOVERNOR_PROC_STAT_PATH = "/proc/stat"
 # LOGGER
 ACTIVATE_MINUTES = 1  # sau bao nhiêu phút thì ACTIVATE
 RESET_AFTER_SECONDS = 30
@@ -16,9 +36,45 @@ STABLE_FRAME_COUNT = 5
 # CAMERA
 CAMERA_FORMAT = "RGB888"  # hoặc RGB888, RGB888_3L, ...
 CAMERA_SLEEP = 1          # delay sau khi start cam
+# NHIỀU CAMERA: số nguyên = camera_num của Picamera2, chuỗi = nguồn cv2.VideoCapture (USB/file/rtsp)
+CAMERA_SOURCES = [1]
+MULTI_CAMERA_BATCH = True  # gộp frame của mọi camera vào 1 lần model.predict
+
+# CỬA ĐÓNG -> TẠM DỪNG NHẬN DIỆN
+DARK_LUMA_THRESHOLD = 18    # độ sáng trung bình (0-255) dưới mức này coi là tối
+DARK_FRAMES_TO_SLEEP = 3    # số frame tối liên tiếp trước khi vào chế độ tiết kiệm
+DARK_FRAME_INTERVAL = 0.5   # giây giữa 2 lần chụp khi đang tiết kiệm
+LUMA_SAMPLE_STEP = 16       # lấy 1 pixel mỗi 16 hàng/cột để đo độ sáng (rất rẻ)
 
 # CUSTOM NMS
 IOU_THRESHOLD = 0.55
+
+# SUY LUẬN THEO VÙNG KỆ / TILE (chai nhỏ ở cuối kệ)
+TILED_INFERENCE = False
+SHELF_ROIS = []              # [(x1, y1, x2, y2), ...] theo pixel frame; rỗng = cả frame
+TILE_SIZE = 320              # cạnh tile (pixel frame); 0 = mỗi ROI là 1 tile
+TILE_OVERLAP = 0.2           # tỉ lệ chồng lấn giữa 2 tile liền kề
+TILE_CHANGE_THRESHOLD = 4.0  # chênh lệch độ sáng trung bình (0-255) để coi tile là đã thay đổi
+TILE_MAX_AGE = 30            # suy luận lại tile sau tối đa N frame dù không đổi
+TILE_CONTAIN_THRESHOLD = 0.8 # NMS: bỏ box nằm gần trọn trong box cùng class có score cao hơn
+
+# CASCADE: detector nhỏ chỉ tìm chai mỗi frame + classifier nhận diện nhãn chỉ khi cần
+# (class id của classifier phải trùng với model đầy đủ để CLASS_COLORS / IGNORE_CLASSES / data.json vẫn đúng)
+CASCADE_ENABLED = False
+CASCADE_DETECTOR_PATH = "/home/rpi/project/best_weights/bottle_detector.pt"
+CASCADE_CLASSIFIER_PATH = "/home/rpi/project/best_weights/wine_classifier.pt"
+CASCADE_CLASSIFIER_IMGSZ = 160
+CASCADE_MIN_CONFIDENCE = 0.7  # dưới mức này thì phân loại lại ở frame sau
+CASCADE_TRACK_IOU = 0.4       # IoU tối thiểu để coi box là cùng 1 vật với frame trước
+CASCADE_TRACK_TTL = 15        # số frame không thấy trước khi quên danh tính
+CASCADE_CROP_PADDING = 0.1    # nới crop ra mỗi phía theo tỉ lệ kích thước box
+
+# SHADOW: chạy thử model mới song song trên 1 phần frame thật, không ảnh hưởng kết quả
+SHADOW_MODEL_PATH = None      # đường dẫn model ứng viên; None = tắt
+SHADOW_EVERY_N = 10           # gửi 1 trên N frame cho model ứng viên
+SHADOW_CPU_BUDGET = 0.25      # tối đa 25% của 1 nhân CPU cho việc đánh giá (tính cả các thread intra-op của torch)
+SHADOW_MATCH_IOU = 0.5        # IoU để coi 2 box của 2 model là cùng 1 vật
+SHADOW_LOG_DIR = "logs/shadow"
 IGNORE_CLASSES = [3, 4]  # bỏ qua class không quan trọng
 
 # CLASS COLORS
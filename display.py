@@ -0,0 +1,145 @@
+"""
+Ghép khung hình hiển thị (lưới camera + panel thông tin) vào 1 buffer cấp phát sẵn.
+
+    python display.py --frames 200 --cameras 1    # so sánh cấp phát mỗi frame: cách cũ vs DisplayComposer
+"""
+import argparse
+import math
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from config import FRAME_WIDTH, FRAME_HEIGHT
+
+
+class DisplayComposer:
+    """
+    Buffer hiển thị cố định: các ô camera (rows x cols) bên trái, panel thông tin bên phải.
+    Mỗi frame chỉ chép ảnh camera vào view cố định của ô rồi vẽ box tại chỗ; panel chỉ được
+    chép (và resize) lại khi ShowActivate trả về ảnh khác, ô trống giữ nguyên màu đen.
+    """
+
+    def __init__(self, tile_width=FRAME_WIDTH, tile_height=FRAME_HEIGHT, rows=1, cols=1, panel_width=FRAME_WIDTH):
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.rows = rows
+        self.cols = cols
+        self.grid_width = tile_width * cols
+        self.buffer = np.zeros((tile_height * rows, self.grid_width + panel_width, 3), dtype=np.uint8)
+        # View (không sao chép) dùng khi panel đóng; cv2 vẽ/hiển thị trực tiếp trên view được
+        self.grid = self.buffer[:, :self.grid_width]
+        self.panel = self.buffer[:, self.grid_width:]
+        self._panel_source = None
+
+    def tile(self, index):
+        row, col = divmod(index, self.cols)
+        return self.buffer[row * self.tile_height:(row + 1) * self.tile_height,
+                           col * self.tile_width:(col + 1) * self.tile_width]
+
+    def put(self, index, frame):
+        """Chép frame vào ô `index` và trả về view của ô đó để vẽ annotation tại chỗ."""
+        view = self.tile(index)
+        if frame.shape == view.shape:
+            np.copyto(view, frame)
+        else:
+            # Chỉ xảy ra khi nguồn ảnh trả sai kích thước cấu hình
+            view[:] = cv2.resize(frame, (self.tile_width, self.tile_height))
+        return view
+
+    def with_panel(self, panel):
+        """Toàn bộ buffer (lưới + panel); `panel` là ảnh cache của ShowActivate.get_image()."""
+        if panel is not self._panel_source:
+            if panel.shape != self.panel.shape:
+                np.copyto(self.panel, cv2.resize(panel, (self.panel.shape[1], self.panel.shape[0])))
+            else:
+                np.copyto(self.panel, panel)
+            self._panel_source = panel
+        return self.buffer
+
+
+def _draw_boxes(img, boxes):
+    # Giống phần vẽ của YOLOCameraDetector._draw_detections (không có logger)
+    for i, (x1, y1, x2, y2) in enumerate(boxes):
+        label = f"class_{i} | 3m 12s | ACTIVATED "
+        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        cv2.rectangle(img, (x1, y1 - 20), (x1 + w, y1), (0, 255, 0), -1)
+        cv2.putText(img, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+
+def _legacy_display(frames, viewer, boxes, cols, rows):
+    """Đường hiển thị cũ: frame.copy(), vẽ lại panel mỗi frame, resize, hstack/vstack."""
+    tiles = []
+    for frame in frames:
+        annotated = frame.copy()
+        _draw_boxes(annotated, boxes)
+        tiles.append(annotated)
+    if len(tiles) > 1:
+        blank = np.zeros_like(tiles[0])
+        tiles = tiles + [blank] * (rows * cols - len(tiles))
+        grid = np.vstack([np.hstack(tiles[r * cols:(r + 1) * cols]) for r in range(rows)])
+    else:
+        grid = tiles[0]
+    panel = viewer.render_image()
+    if panel.shape[0] != grid.shape[0]:
+        panel = cv2.resize(panel, (int(panel.shape[1]), grid.shape[0]))
+    return np.hstack((grid, panel))
+
+
+def _composed_display(frames, viewer, boxes, composer):
+    for i, frame in enumerate(frames):
+        _draw_boxes(composer.put(i, frame), boxes)
+    return composer.with_panel(viewer.get_image())
+
+
+def _measure(fn, frames_count):
+    """Trả về (KB cấp phát thêm lúc đỉnh mỗi frame, trung bình ms mỗi frame) đo bằng tracemalloc."""
+    peaks, seconds = [], 0.0
+    for _ in range(frames_count):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        out = fn()
+        seconds += time.perf_counter() - t0
+        del out
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    peaks.sort()
+    return peaks[len(peaks) // 2] / 1024, peaks[-1] / 1024, seconds * 1000 / frames_count
+
+
+def main():
+    from show_activate import ShowActivate
+
+    parser = argparse.ArgumentParser(description="Cấp phát mỗi frame của đường hiển thị: cũ vs buffer cấp phát sẵn")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--cameras", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8) for _ in range(args.cameras)]
+    boxes = [(40 + 90 * i, 60 + 40 * (i % 3), 120 + 90 * i, 200 + 40 * (i % 3)) for i in range(5)]
+    cols = math.ceil(math.sqrt(args.cameras))
+    rows = math.ceil(args.cameras / cols)
+    viewer = ShowActivate()
+    viewer.show_specific_item(next(iter(viewer.db), "unknown"))
+    composer = DisplayComposer(rows=rows, cols=cols)
+
+    tracemalloc.start()
+    # 1 frame mồi: panel cache + view của composer được dựng ở đây, không tính vào trạng thái ổn định
+    _composed_display(frames, viewer, boxes, composer)
+    legacy = _measure(lambda: _legacy_display(frames, viewer, boxes, cols, rows), args.frames)
+    composed = _measure(lambda: _composed_display(frames, viewer, boxes, composer), args.frames)
+    tracemalloc.stop()
+
+    print("========== Display Allocations ==========")
+    print(f"Cameras: {args.cameras} | frames: {args.frames} | output: {composer.buffer.shape[1]}x{composer.buffer.shape[0]}")
+    print(f"{'path':<10} {'p50 KB/frame':>13} {'max KB/frame':>13} {'ms/frame':>9}")
+    for name, (p50, peak, ms) in (("legacy", legacy), ("composer", composed)):
+        print(f"{name:<10} {p50:>13.1f} {peak:>13.1f} {ms:>9.2f}")
+    print("=========================================")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Đánh giá độ chính xác + tốc độ trên tập ảnh tủ đã gán nhãn (định dạng YOLO), dùng đúng hậu xử lý
+của detector chạy thật (CONF_THRESHOLD, IGNORE_CLASSES). Mỗi lần chạy ghi 1 báo cáo JSON; có
+--baseline thì so sánh và thoát mã 1 nếu mAP/recall giảm hoặc độ trễ tăng quá ngưỡng.
+
+    python evaluate.py --data /home/rpi/project/eval --weights yolo11n_3.pt --backend onnx \\
+        --baseline reports/eval_baseline.json
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from config import FRAME_WIDTH, FRAME_HEIGHT, CONF_THRESHOLD, IGNORE_CLASSES, MODEL_PATH
+from postprocess import filter_detections
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+RECALL_POINTS = np.linspace(0, 1, 101)  # nội suy 101 điểm như COCO
+
+
+def read_yolo_labels(label_path, width, height):
+    """Nhãn YOLO (cls cx cy w h, chuẩn hóa) -> list (cls, x1, y1, x2, y2) theo pixel."""
+    labels = []
+    if not os.path.exists(label_path):
+        return labels
+    with open(label_path, "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            cls, cx, cy, w, h = int(parts[0]), *map(float, parts[1:5])
+            labels.append((cls, (cx - w / 2) * width, (cy - h / 2) * height,
+                           (cx + w / 2) * width, (cy + h / 2) * height))
+    return labels
+
+
+def find_pairs(data_dir):
+    """Hỗ trợ data/images + data/labels (kiểu ultralytics) hoặc ảnh và .txt chung 1 thư mục."""
+    image_dir = os.path.join(data_dir, "images")
+    label_dir = os.path.join(data_dir, "labels")
+    if not os.path.isdir(image_dir):
+        image_dir = label_dir = data_dir
+    pairs = []
+    for path in sorted(glob.glob(os.path.join(image_dir, "*.*"))):
+        if path.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")):
+            stem = os.path.splitext(os.path.basename(path))[0]
+            pairs.append((path, os.path.join(label_dir, stem + ".txt")))
+    return pairs
+
+
+def _iou_matrix(a, b):
+    xx1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    yy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    xx2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    yy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match_image(boxes, scores, classes, labels):
+    """
+    Đánh dấu TP cho từng detection ở mỗi ngưỡng IoU (ghép tham lam theo score, cùng class).
+    Trả về mảng bool (số detection x số ngưỡng IoU).
+    """
+    tp = np.zeros((len(boxes), len(IOU_THRESHOLDS)), dtype=bool)
+    if len(boxes) == 0 or not labels:
+        return tp
+    gt_classes = np.array([l[0] for l in labels])
+    gt_boxes = np.array([l[1:] for l in labels], dtype=np.float64)
+    ious = _iou_matrix(boxes.astype(np.float64), gt_boxes)
+    ious[classes[:, None] != gt_classes[None, :]] = 0.0
+    order = np.argsort(-scores)
+    for t, threshold in enumerate(IOU_THRESHOLDS):
+        used = np.zeros(len(labels), dtype=bool)
+        for i in order:
+            candidates = np.where(~used & (ious[i] >= threshold))[0]
+            if len(candidates):
+                j = candidates[np.argmax(ious[i, candidates])]
+                used[j] = True
+                tp[i, t] = True
+    return tp
+
+
+def average_precision(tp, scores, n_gt):
+    """AP (nội suy 101 điểm) cho 1 class ở 1 ngưỡng IoU."""
+    if n_gt == 0 or len(tp) == 0:
+        return 0.0
+    order = np.argsort(-scores)
+    tp = tp[order]
+    tp_cum = np.cumsum(tp)
+    fp_cum = np.cumsum(~tp)
+    recall = tp_cum / n_gt
+    precision = tp_cum / np.maximum(tp_cum + fp_cum, 1e-9)
+    # Đường bao precision giảm dần theo recall
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    idx = np.searchsorted(recall, RECALL_POINTS, side="left")
+    return float(np.mean([precision[i] if i < len(precision) else 0.0 for i in idx]))
+
+
+def compute_metrics(records, names):
+    """records: list (tp[n x T], scores[n], classes[n], gt_classes[m]) theo từng ảnh."""
+    all_tp = np.concatenate([r[0] for r in records]) if records else np.zeros((0, len(IOU_THRESHOLDS)), bool)
+    all_scores = np.concatenate([r[1] for r in records]) if records else np.zeros(0)
+    all_classes = np.concatenate([r[2] for r in records]) if records else np.zeros(0, int)
+    gt_classes = np.concatenate([r[3] for r in records]) if records else np.zeros(0, int)
+
+    per_class = {}
+    for cls in sorted(set(gt_classes.tolist()) | set(all_classes.tolist())):
+        if cls in IGNORE_CLASSES:
+            continue
+        mask = all_classes == cls
+        n_gt = int((gt_classes == cls).sum())
+        tp = all_tp[mask]
+        aps = [average_precision(tp[:, t], all_scores[mask], n_gt) for t in range(len(IOU_THRESHOLDS))]
+        n_tp = int(tp[:, 0].sum())
+        n_det = int(mask.sum())
+        per_class[names.get(cls, str(cls))] = {
+            "class_id": cls,
+            "labels": n_gt,
+            "detections": n_det,
+            "precision": round(n_tp / n_det, 4) if n_det else 0.0,
+            "recall": round(n_tp / n_gt, 4) if n_gt else 0.0,
+            "ap50": round(aps[0], 4),
+            "ap50_95": round(float(np.mean(aps)), 4),
+        }
+    scored = [c for c in per_class.values() if c["labels"] > 0]
+    n_tp = int(all_tp[~np.isin(all_classes, IGNORE_CLASSES), 0].sum()) if len(all_tp) else 0
+    n_det = int((~np.isin(all_classes, IGNORE_CLASSES)).sum())
+    n_gt = int((~np.isin(gt_classes, IGNORE_CLASSES)).sum())
+    overall = {
+        "map50": round(float(np.mean([c["ap50"] for c in scored])), 4) if scored else 0.0,
+        "map50_95": round(float(np.mean([c["ap50_95"] for c in scored])), 4) if scored else 0.0,
+        "precision": round(n_tp / n_det, 4) if n_det else 0.0,
+        "recall": round(n_tp / n_gt, 4) if n_gt else 0.0,
+    }
+    return overall, per_class
+
+
+def latency_stats(seconds):
+    values = sorted(seconds)
+    if not values:
+        return {}
+
+    def pct(q):
+        return round(1000 * values[min(len(values) - 1, int(round(q * (len(values) - 1))))], 2)
+
+    return {"mean_ms": round(1000 * sum(values) / len(values), 2), "p50_ms": pct(0.5),
+            "p90_ms": pct(0.9), "p99_ms": pct(0.99), "max_ms": round(1000 * values[-1], 2)}
+
+
+def find_regressions(report, baseline, max_map_drop, max_recall_drop, max_latency_increase):
+    problems = []
+    old, new = baseline["overall"], report["overall"]
+    for key, limit in (("map50", max_map_drop), ("map50_95", max_map_drop), ("recall", max_recall_drop)):
+        if new[key] < old[key] - limit:
+            problems.append(f"{key} {old[key]:.4f} -> {new[key]:.4f}")
+    for name, cls in report["per_class"].items():
+        previous = baseline["per_class"].get(name)
+        if previous and previous["labels"] and cls["recall"] < previous["recall"] - max_recall_drop:
+            problems.append(f"recall[{name}] {previous['recall']:.4f} -> {cls['recall']:.4f}")
+    old_p50, new_p50 = baseline["latency"]["inference"]["p50_ms"], report["latency"]["inference"]["p50_ms"]
+    if new_p50 > old_p50 * (1 + max_latency_increase):
+        problems.append(f"inference p50 {old_p50:.1f}ms -> {new_p50:.1f}ms")
+    return problems
+
+
+def evaluate(args):
+    import cv2
+    from ultralytics import YOLO
+    from benchmark import ensure_artifact
+
+    pairs = find_pairs(args.data)
+    if not pairs:
+        raise SystemExit(f"No labelled images found in {args.data}")
+    model_path = args.model or ensure_artifact(args.weights, args.backend, args.imgsz)
+    model = YOLO(model_path, task="detect")
+    names = model.names if isinstance(model.names, dict) else dict(enumerate(model.names))
+
+    # Ảnh được đưa về kích thước camera như frame thật; warm-up để lần gọi đầu không vào thống kê
+    warm = cv2.resize(cv2.imread(pairs[0][0]), (FRAME_WIDTH, FRAME_HEIGHT))
+    for _ in range(args.warmup):
+        model.predict(warm, verbose=False, imgsz=args.imgsz)
+
+    records, inference_s, post_s = [], [], []
+    for image_path, label_path in pairs:
+        img = cv2.imread(image_path)
+        if img is None:
+            print(f"[EVAL] Skip unreadable {image_path}")
+            continue
+        frame = cv2.resize(img, (FRAME_WIDTH, FRAME_HEIGHT))
+        t0 = time.perf_counter()
+        r = model.predict(frame, verbose=False, imgsz=args.imgsz)[0]
+        t1 = time.perf_counter()
+        boxes, scores, classes = filter_detections(r.boxes.xyxy.cpu().numpy(), r.boxes.conf.cpu().numpy(),
+                                                   r.boxes.cls.cpu().numpy())
+        post_s.append(time.perf_counter() - t1)
+        inference_s.append(t1 - t0)
+        labels = read_yolo_labels(label_path, FRAME_WIDTH, FRAME_HEIGHT)
+        records.append((match_image(boxes, scores, classes, labels), scores, classes,
+                        np.array([l[0] for l in labels], dtype=int)))
+
+    overall, per_class = compute_metrics(records, names)
+    report = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "config": {
+            "weights": args.weights, "backend": args.backend, "model": model_path, "imgsz": args.imgsz,
+            "conf_threshold": CONF_THRESHOLD, "ignore_classes": list(IGNORE_CLASSES),
+            "frame_size": [FRAME_WIDTH, FRAME_HEIGHT], "data": os.path.abspath(args.data), "images": len(records),
+        },
+        "overall": overall,
+        "per_class": per_class,
+        "latency": {"inference": latency_stats(inference_s), "postprocess": latency_stats(post_s)},
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đánh giá mAP/precision/recall + độ trễ trên tập có nhãn")
+    parser.add_argument("--data", required=True, help="thư mục có images/ + labels/ hoặc ảnh + .txt cùng chỗ")
+    parser.add_argument("--weights", default=MODEL_PATH)
+    parser.add_argument("--backend", default="pt", choices=["pt", "onnx", "ncnn", "openvino"])
+    parser.add_argument("--model", default=None, help="artifact có sẵn (vd. bản INT8), bỏ qua bước export")
+    parser.add_argument("--imgsz", type=int, default=FRAME_WIDTH)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--report-dir", default="reports")
+    parser.add_argument("--baseline", default=None, help="báo cáo JSON trước đó để phát hiện regression")
+    parser.add_argument("--max-map-drop", type=float, default=0.01)
+    parser.add_argument("--max-recall-drop", type=float, default=0.02)
+    parser.add_argument("--max-latency-increase", type=float, default=0.10)
+    args = parser.parse_args()
+
+    report = evaluate(args)
+    problems = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = find_regressions(report, baseline, args.max_map_drop, args.max_recall_drop,
+                                    args.max_latency_increase)
+        report["baseline"] = args.baseline
+        report["regressions"] = problems
+
+    os.makedirs(args.report_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename((args.model or args.weights).rstrip("/")))[0]
+    report_path = os.path.join(args.report_dir,
+                               f"eval_{stem}_{args.backend}_{args.imgsz}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    o, lat = report["overall"], report["latency"]["inference"]
+    print("========== Accuracy + Speed Evaluation ==========")
+    print(f"Model: {report['config']['model']} | imgsz: {args.imgsz} | images: {report['config']['images']}")
+    print(f"CONF_THRESHOLD={CONF_THRESHOLD} IGNORE_CLASSES={list(IGNORE_CLASSES)}")
+    print(f"{'class':<24} {'labels':>6} {'P':>6} {'R':>6} {'AP50':>6} {'AP50-95':>8}")
+    for name, c in report["per_class"].items():
+        print(f"{name[:24]:<24} {c['labels']:>6} {c['precision']:>6.3f} {c['recall']:>6.3f} "
+              f"{c['ap50']:>6.3f} {c['ap50_95']:>8.3f}")
+    print(f"{'all':<24} {'':>6} {o['precision']:>6.3f} {o['recall']:>6.3f} {o['map50']:>6.3f} {o['map50_95']:>8.3f}")
+    print(f"Inference: mean {lat['mean_ms']}ms | p50 {lat['p50_ms']}ms | p90 {lat['p90_ms']}ms | p99 {lat['p99_ms']}ms")
+    print(f"Report: {report_path}")
+    print("=================================================")
+    if problems:
+        print("!!!!!!!!!! REGRESSION vs " + args.baseline + " !!!!!!!!!!")
+        for p in problems:
+            print(f"  - {p}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Đo chi phí ghi log mỗi tick trong luồng gọi: handler ghi trực tiếp (như trước)
+so với pipeline hàng đợi của log_pipeline.setup_logging. Cả hai dùng cùng RateLimitFilter
+để phần burst chỉ so sánh chi phí ghi, không so sánh số bản ghi bị chặn.
+
+    python bench_logging.py --ticks 2000 --burst 500
+"""
+import argparse
+import io
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from log_pipeline import LOG_FORMAT, RateLimitFilter, setup_logging
+
+
+def _direct_setup(log_dir, rate_limit_seconds):
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.setLevel(logging.INFO)
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = logging.FileHandler(os.path.join(log_dir, "direct.log"), encoding="utf-8")
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler(io.StringIO())
+    console_handler.setFormatter(formatter)
+    root_logger.addHandler(file_handler)
+    root_logger.addHandler(console_handler)
+    # Gắn ở logger (lọc 1 lần cho mọi handler), tương đương filter trên QueueHandler duy nhất
+    rate_limit = RateLimitFilter(rate_limit_seconds) if rate_limit_seconds > 0 else None
+    if rate_limit:
+        root_logger.addFilter(rate_limit)
+    return rate_limit
+
+
+def _measure(ticks, burst):
+    per_tick = []
+    for i in range(ticks):
+        t0 = time.perf_counter()
+        logging.info(f"Mode: MAINTAINING, Temp={12.25 + (i % 7) * 0.25:.2f}°C, Target=12.0°C, "
+                     f"Block=ON, Fan=OFF, humidity=71.2%, Power=84.3W")
+        per_tick.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    for i in range(burst):
+        logging.warning(f"BỎ QUA LỆNH BẬT BLOCK: Đang trong thời gian nghỉ. Còn lại {300 - i}s")
+    burst_total = time.perf_counter() - t0
+    per_tick.sort()
+    return {
+        "p50_us": statistics.median(per_tick) * 1e6,
+        "p99_us": per_tick[int(len(per_tick) * 0.99) - 1] * 1e6,
+        "max_us": per_tick[-1] * 1e6,
+        "burst_ms": burst_total * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chi phí log mỗi tick")
+    parser.add_argument("--ticks", type=int, default=2000)
+    parser.add_argument("--burst", type=int, default=500)
+    parser.add_argument("--rate-limit", type=float, default=60.0, help="giây, 0 = tắt RateLimitFilter ở cả hai")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        rate_limit = _direct_setup(log_dir, args.rate_limit)
+        direct = _measure(args.ticks, args.burst)
+        if rate_limit:
+            logging.getLogger().removeFilter(rate_limit)
+
+        listener = setup_logging(log_dir, "queued.log", rate_limit_seconds=args.rate_limit, console=False)
+        queued = _measure(args.ticks, args.burst)
+        listener.stop()
+
+    print("========== Logging Benchmark (chi phí trong luồng gọi) ==========")
+    print(f"{'pipeline':<10} {'p50 (us)':>10} {'p99 (us)':>10} {'max (us)':>10} {'burst (ms)':>11}")
+    for name, r in (("direct", direct), ("queue", queued)):
+        print(f"{name:<10} {r['p50_us']:>10.1f} {r['p99_us']:>10.1f} {r['max_us']:>10.1f} {r['burst_ms']:>11.2f}")
+    print("=================================================================")
+
+
+if __name__ == "__main__":
+    main()
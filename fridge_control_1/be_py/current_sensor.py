@@ -0,0 +1,31 @@
+CURRENT_SENSOR_SENSITIVITY = 0.100 # V/A (100mV/A)
+
+
+def get_rms_current(chan, samples=200, sensitivity=CURRENT_SENSOR_SENSITIVITY):
+    """
+    Đo và tính toán dòng điện hiệu dụng (RMS). `chan` là kênh AnalogIn của ADS1115
+    hoặc bất kỳ đối tượng nào có thuộc tính `voltage` (ADC giả trong microbench.py).
+    """
+    if not chan:
+        return 0.0
+
+    # Tính điện áp offset (điểm 0 của cảm biến)
+    offset_voltage = 0
+    try:
+        for _ in range(samples):
+            offset_voltage += chan.voltage
+        offset_voltage /= samples
+
+        sum_sq_current = 0
+        for _ in range(samples):
+            sensor_voltage = chan.voltage
+            # Chuyển đổi điện áp đọc được sang dòng điện tức thời
+            instant_current = (sensor_voltage - offset_voltage) / sensitivity
+            sum_sq_current += instant_current ** 2
+
+        mean_sq_current = sum_sq_current / samples
+        rms_current = mean_sq_current ** 0.5
+        return rms_current
+    except Exception as e:
+        # logging.warning(f"Lỗi khi đọc cảm biến dòng điện: {e}")
+        return 0.0
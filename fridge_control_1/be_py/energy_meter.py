@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+
+def _hour_key(wall: float) -> str:
+    return time.strftime("%Y-%m-%d %H", time.localtime(wall))
+
+
+def _day_key(wall: float) -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(wall))
+
+
+class _Window:
+    """Bộ đếm cho 1 khung thời gian (giờ hoặc ngày hiện tại)."""
+
+    def __init__(self, key: str = ""):
+        self.key = key
+        self.observed_seconds = 0.0
+        self.on_seconds: Dict[str, float] = {}
+        self.starts: Dict[str, int] = {}
+        self.energy_wh = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "observed_seconds": self.observed_seconds,
+            "on_seconds": self.on_seconds,
+            "starts": self.starts,
+            "energy_wh": self.energy_wh,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "_Window":
+        w = cls(data.get("key", ""))
+        w.observed_seconds = float(data.get("observed_seconds", 0.0))
+        w.on_seconds = {k: float(v) for k, v in data.get("on_seconds", {}).items()}
+        w.starts = {k: int(v) for k, v in data.get("starts", {}).items()}
+        w.energy_wh = float(data.get("energy_wh", 0.0))
+        return w
+
+
+class EnergyMeter:
+    """
+    Đo năng lượng bằng tích phân hình thang theo thời gian thực (monotonic),
+    thống kê thời gian bật, duty cycle và số lần khởi động của từng relay
+    theo giờ/ngày. Tổng tích lũy được lưu bền vào file JSON.
+    """
+
+    def __init__(self, state_path: Optional[str] = None, max_gap_seconds: float = 60.0):
+        self.state_path = state_path
+        self.max_gap_seconds = max_gap_seconds
+
+        self.total_wh = 0.0
+        self.on_seconds_total: Dict[str, float] = {}
+        self.starts_total: Dict[str, int] = {}
+        self.relay_on: Dict[str, bool] = {}
+
+        self._last_power_w: Optional[float] = None
+        self._last_power_t: Optional[float] = None
+        self._last_advance_t: Optional[float] = None
+
+        now_wall = time.time()
+        self.hour = _Window(_hour_key(now_wall))
+        self.day = _Window(_day_key(now_wall))
+        self.prev_hour: Optional[_Window] = None
+        self.prev_day: Optional[_Window] = None
+
+        if state_path:
+            self.load()
+
+    # --- Cập nhật trạng thái ---
+    def _roll_windows(self, now_wall: float):
+        hour_key = _hour_key(now_wall)
+        if hour_key != self.hour.key:
+            self.prev_hour = self.hour
+            self.hour = _Window(hour_key)
+        day_key = _day_key(now_wall)
+        if day_key != self.day.key:
+            self.prev_day = self.day
+            self.day = _Window(day_key)
+
+    def _advance(self, now: float):
+        """Cộng dồn thời gian bật của các relay kể từ lần gọi trước."""
+        self._roll_windows(time.time())
+        if self._last_advance_t is not None:
+            dt = now - self._last_advance_t
+            if 0 < dt <= self.max_gap_seconds:
+                for window in (self.hour, self.day):
+                    window.observed_seconds += dt
+                for name, is_on in self.relay_on.items():
+                    if not is_on:
+                        continue
+                    self.on_seconds_total[name] = self.on_seconds_total.get(name, 0.0) + dt
+                    for window in (self.hour, self.day):
+                        window.on_seconds[name] = window.on_seconds.get(name, 0.0) + dt
+        self._last_advance_t = now
+
+    def set_relay_state(self, name: str, state: bool, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self._advance(now)
+        was_on = self.relay_on.get(name, False)
+        self.relay_on[name] = state
+        if state and not was_on:
+            self.starts_total[name] = self.starts_total.get(name, 0) + 1
+            for window in (self.hour, self.day):
+                window.starts[name] = window.starts.get(name, 0) + 1
+
+    def update(self, power_w: float, now: Optional[float] = None) -> float:
+        """Ghi nhận 1 mẫu công suất, trả về năng lượng (Wh) cộng thêm."""
+        now = time.monotonic() if now is None else now
+        self._advance(now)
+        added_wh = 0.0
+        if self._last_power_t is not None:
+            dt = now - self._last_power_t
+            if 0 < dt <= self.max_gap_seconds:
+                added_wh = (self._last_power_w + power_w) / 2.0 * dt / 3600.0
+            elif dt > self.max_gap_seconds:
+                logging.warning(f"Bỏ qua tích phân năng lượng: khoảng trống {dt:.1f}s giữa 2 mẫu công suất.")
+        self._last_power_w = power_w
+        self._last_power_t = now
+        self.total_wh += added_wh
+        self.hour.energy_wh += added_wh
+        self.day.energy_wh += added_wh
+        return added_wh
+
+    # --- Báo cáo ---
+    @staticmethod
+    def _window_stats(window: Optional[_Window]) -> Optional[dict]:
+        if window is None:
+            return None
+        observed = window.observed_seconds
+        return {
+            "period": window.key,
+            "energy_wh": round(window.energy_wh, 3),
+            "starts": dict(window.starts),
+            "on_seconds": {k: round(v, 1) for k, v in window.on_seconds.items()},
+            "duty_cycle": {k: round(v / observed, 4) if observed > 0 else 0.0
+                           for k, v in window.on_seconds.items()},
+        }
+
+    def report(self) -> dict:
+        return {
+            "total_wh": round(self.total_wh, 3),
+            "on_seconds_total": {k: round(v, 1) for k, v in self.on_seconds_total.items()},
+            "starts_total": dict(self.starts_total),
+            "hour": self._window_stats(self.hour),
+            "previous_hour": self._window_stats(self.prev_hour),
+            "day": self._window_stats(self.day),
+            "previous_day": self._window_stats(self.prev_day),
+        }
+
+    # --- Lưu bền ---
+    def snapshot(self) -> dict:
+        """Chụp trạng thái hiện tại (gọi trong event loop), có thể ghi ở thread khác."""
+        self._advance(time.monotonic())
+        return json.loads(json.dumps({
+            "total_wh": self.total_wh,
+            "on_seconds_total": self.on_seconds_total,
+            "starts_total": self.starts_total,
+            "hour": self.hour.to_dict(),
+            "day": self.day.to_dict(),
+            "saved_at": time.time(),
+        }))
+
+    def save(self, state: Optional[dict] = None):
+        if not self.state_path:
+            return
+        if state is None:
+            state = self.snapshot()
+        tmp_path = self.state_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            # Ghi đè nguyên tử để không bao giờ để lại file hỏng khi mất điện
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logging.error(f"Không lưu được trạng thái năng lượng vào {self.state_path}: {e}")
+
+    def load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Không đọc được trạng thái năng lượng từ {self.state_path}: {e}")
+            return
+        self.total_wh = float(state.get("total_wh", 0.0))
+        self.on_seconds_total = {k: float(v) for k, v in state.get("on_seconds_total", {}).items()}
+        self.starts_total = {k: int(v) for k, v in state.get("starts_total", {}).items()}
+        # Chỉ khôi phục bộ đếm giờ/ngày nếu vẫn còn trong cùng khung thời gian
+        hour = _Window.from_dict(state.get("hour", {}))
+        if hour.key == self.hour.key:
+            self.hour = hour
+        day = _Window.from_dict(state.get("day", {}))
+        if day.key == self.day.key:
+            self.day = day
+        logging.info(f"Đã khôi phục tổng năng lượng: {self.total_wh:.2f} Wh")
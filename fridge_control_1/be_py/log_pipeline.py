@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Tuple
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Chặn cảnh báo (đúng mức WARNING) lặp lại từ cùng một dòng code trong `interval` giây.
+    Khóa theo vị trí gọi (file, dòng) vì message là f-string, giá trị thay đổi mỗi lần.
+    Lần được ghi tiếp theo sẽ kèm số lần đã bị bỏ qua. ERROR trở lên không bao giờ bị chặn.
+    """
+
+    def __init__(self, interval: float = 60.0, level: int = logging.WARNING):
+        super().__init__()
+        self.interval = interval
+        self.level = level
+        self._last: Dict[Tuple[str, int], Tuple[float, int]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != self.level:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        last_time, suppressed = self._last.get(key, (None, 0))
+        if last_time is not None and now - last_time < self.interval:
+            self._last[key] = (last_time, suppressed + 1)
+            return False
+        self._last[key] = (now, 0)
+        if suppressed:
+            record.msg = f"{record.msg} (đã bỏ qua {suppressed} lần lặp lại)"
+        return True
+
+
+class CompactJsonFormatter(logging.Formatter):
+    """Định dạng gọn, mỗi dòng 1 object JSON: t (epoch), l (mức), m (nội dung)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"t": round(record.created, 3), "l": record.levelname[0], "m": record.getMessage()}
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler không bao giờ chặn: khi hàng đợi đầy thì bỏ bản ghi và đếm,
+    thay vì để vòng điều khiển chờ ghi thẻ SD.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Chỉ ghép message (rẻ); định dạng đầy đủ để dành cho thread listener
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DropReportingListener(QueueListener):
+    """
+    QueueListener ghi thêm 1 dòng tóm tắt khi DroppingQueueHandler đã bỏ bản ghi kể từ lần báo
+    trước, để một đợt log bị mất (kể cả WARNING/ERROR) vẫn để lại dấu vết trong file log.
+    """
+
+    def __init__(self, queue_handler: DroppingQueueHandler, *handlers, respect_handler_level=False):
+        super().__init__(queue_handler.queue, *handlers, respect_handler_level=respect_handler_level)
+        self.queue_handler = queue_handler
+        self._reported_dropped = 0
+
+    def handle(self, record: logging.LogRecord):
+        dropped = self.queue_handler.dropped
+        if dropped > self._reported_dropped:
+            summary = logging.LogRecord(
+                "log_pipeline", logging.WARNING, __file__, 0,
+                f"{dropped - self._reported_dropped} log records dropped (hàng đợi log đầy)", None, None)
+            self._reported_dropped = dropped
+            super().handle(summary)
+        super().handle(record)
+
+
+def setup_logging(log_dir: str, log_file: str, structured: bool = False,
+                  max_bytes: int = 5 * 1024 * 1024, backup_count: int = 5,
+                  rate_limit_seconds: float = 60.0, queue_size: int = 10000,
+                  console: bool = True) -> DropReportingListener:
+    """
+    Gắn root logger vào một QueueHandler; file (có xoay vòng thật) và console
+    được ghi ở thread nền của QueueListener. Trả về listener để gọi stop() khi thoát;
+    listener.queue_handler.dropped là số bản ghi đã bỏ vì hàng đợi đầy.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    formatter = CompactJsonFormatter() if structured else logging.Formatter(LOG_FORMAT)
+
+    file_handler = RotatingFileHandler(
+        os.path.join(log_dir, log_file),
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(formatter)
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(console_handler)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    if rate_limit_seconds > 0:
+        queue_handler.addFilter(RateLimitFilter(rate_limit_seconds))
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+
+    listener = DropReportingListener(queue_handler, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -5,8 +5,12 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.abspath(os.path.join(current_dir, '../../'))
 if project_root not in sys.path:
     sys.path.append(project_root)
-from YoloDetector import YOLOCameraDetector 
-from threading import Thread
+from startup_profile import StartupProfile
+STARTUP_PROFILE = StartupProfile()
+# YoloDetector (torch/ultralytics/cv2) được import muộn trong start_detector_async,
+# để websocket và vòng điều khiển không phải chờ model.
+from metrics import REGISTRY, start_metrics_server
+from threading import Thread, get_ident
 import asyncio
 import busio
 import websockets
@@ -16,36 +20,42 @@ import time
 import board
 import adafruit_ahtx0
 from max6675 import MAX6675
+from temp_filter import OversampledTemperature
+from timeseries import TimeSeriesStore
+from energy_meter import EnergyMeter
+from current_sensor import get_rms_current
+from scheduler import DeadlineScheduler, monitor_event_loop_lag
+from thermal_model import ThermalModel, PredictiveController, bang_bang_decision
+from log_pipeline import setup_logging
+from profiler import SamplingProfiler, thread_idents
+from memory_monitor import MemoryMonitor
+from status import build_status_payload
 from typing import Set, List, Optional
-from logging.handlers import RotatingFileHandler
 from websockets.exceptions import ConnectionClosed
 from websockets.server import WebSocketServerProtocol
 import adafruit_ads1x15.ads1115 as ADS
 from adafruit_ads1x15.analog_in import AnalogIn
+STARTUP_PROFILE.mark("imports_done")
 # --- CẤU HÌNH LOG ---
 LOG_DIR = 'log'
 LOG_FILE = 'fridge_controller.log'
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
-
-log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-root_logger = logging.getLogger()
-root_logger.setLevel(logging.INFO)
-
-file_handler = logging.FileHandler(os.path.join(LOG_DIR, LOG_FILE))
-file_handler.setFormatter(log_formatter)
-root_logger.addHandler(file_handler)
-
-file_handler = RotatingFileHandler(
-    os.path.join(LOG_DIR, LOG_FILE),
-    maxBytes=(5 * 1024 * 1024),
-    backupCount=5
+ENERGY_STATE_FILE = 'energy_state.json'
+STARTUP_PROFILE_FILE = 'startup_profile.json'
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_STRUCTURED = False # True: mỗi dòng là 1 JSON gọn {"t","l","m"}
+LOG_RATE_LIMIT_SECONDS = 60 # Cảnh báo lặp lại từ cùng 1 chỗ chỉ ghi 1 lần mỗi 60s
+
+# Ghi log qua hàng đợi: vòng điều khiển chỉ put_nowait, file (xoay vòng) và console
+# được ghi ở thread nền nên một đợt log dồn dập không làm chậm event loop.
+LOG_LISTENER = setup_logging(
+    LOG_DIR, LOG_FILE,
+    structured=LOG_STRUCTURED,
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT,
+    rate_limit_seconds=LOG_RATE_LIMIT_SECONDS
 )
 
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(log_formatter)
-root_logger.addHandler(console_handler)
-
 # ----------------------
 
 # Cấu hình phần cứng
@@ -58,13 +68,20 @@ SENSOR_BUS = 1
 SENSOR_DEVICE = 0
 READ_INTERVAL = 2
 
-CURRENT_SENSOR_SENSITIVITY = 0.100 # V/A (100mV/A)
 LINE_VOLTAGE = 220.0 # Điện áp lưới (V)
 
 # Cấu hình logic điều khiển
 RELAY_COOLDOWN_SECONDS = 300 # 5 phút
 HUMIDITY_HYSTERESIS_PERCENT = 2.0
 FAN_HYSTERESIS_DEGREES = 2.5
+BLOCK_OFF_OFFSET_DEGREES = 2.0
+# 'bang_bang' (ngưỡng tức thời) hoặc 'predictive' (dùng mô hình nhiệt học online)
+CONTROLLER_MODE = 'bang_bang'
+# Điều khiển theo nhiệt độ đã lọc Kalman (False: dùng mẫu thô mới nhất, chỉ để so sánh/gỡ lỗi)
+TEMP_FILTER_ENABLED = True
+# Bang-bang tắt block sớm hơn theo tốc độ giảm nhiệt đã lọc, bù phần block còn lạnh sau khi tắt.
+# Mẫu thô nhiễu vô tình làm việc này (chạm ngưỡng sớm ~0.3°C); khi đã lọc thì phải bù rõ ràng.
+BLOCK_OFF_LEAD_SECONDS = 50.0
 
 # --- CẤU HÌNH MỚI: PHÁT HIỆN LỖI CÔNG SUẤT ---
 POWER_FAULT_TIMEFRAME_SECONDS = 180 # 3 phút
@@ -83,6 +100,7 @@ block_relay_is_on = False
 fan_relay_is_on = False
 humidity_relay_is_on = False
 sensor: Optional[MAX6675] = None
+temperature_reader: Optional[OversampledTemperature] = None # Lấy mẫu dày + lọc Kalman ở thread nền
 humidity_sensor: Optional[adafruit_ahtx0.AHTx0] = None # <-- BỔ SUNG: Biến cho cảm biến độ ẩm
 # Lưu thời điểm relay được TẮT lần cuối
 last_deactivation_time = -RELAY_COOLDOWN_SECONDS
@@ -97,36 +115,95 @@ current_target_temp: Optional[float] = current_temp
 current_target_humidity: Optional[float] = 75.0
 system_mode = 'IDLE'
 
+# --- ĐỒNG HỒ ĐIỆN NĂNG (TÍCH PHÂN THEO THỜI GIAN THỰC, LƯU BỀN) ---
+ENERGY_REPORT_INTERVAL = 300 # 5 phút
+ENERGY_METER = EnergyMeter(os.path.join(LOG_DIR, ENERGY_STATE_FILE), max_gap_seconds=10 * READ_INTERVAL)
+total_energy_wh = ENERGY_METER.total_wh
+
+# --- MÔ HÌNH NHIỆT (LUÔN HỌC, CHỈ DÙNG KHI CONTROLLER_MODE = 'predictive') ---
+THERMAL_MODEL = ThermalModel()
+PREDICTIVE_CONTROLLER = PredictiveController(
+    THERMAL_MODEL, band_below=BLOCK_OFF_OFFSET_DEGREES, band_above=FAN_HYSTERESIS_DEGREES
+)
+
+# --- LẬP LỊCH THEO MỐC TUYỆT ĐỐI VÀ ĐO JITTER ---
+LOOP_LATENESS_HELP = "Độ trễ thức dậy so với mốc lập lịch (giây)"
+CONTROL_SCHEDULER = DeadlineScheduler(READ_INTERVAL, "control", lateness=REGISTRY.histogram(
+    "fridge_loop_lateness_seconds", LOOP_LATENESS_HELP, loop="control"))
+POWER_SCHEDULER = DeadlineScheduler(READ_INTERVAL, "power", lateness=REGISTRY.histogram(
+    "fridge_loop_lateness_seconds", LOOP_LATENESS_HELP, loop="power"))
+EVENT_LOOP_LAG = REGISTRY.histogram("fridge_event_loop_lag_seconds", "Độ trễ của asyncio event loop (giây)")
+broadcast_task: Optional[asyncio.Task] = None
+broadcasts_skipped = 0
+
+# --- METRICS (PROMETHEUS, CHỈ NGHE TRÊN LOCALHOST) ---
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9101
+RELAY_TOGGLES = {
+    relay: REGISTRY.counter("fridge_relay_toggles_total", "Số lần đổi trạng thái relay", relay=relay)
+    for relay in ("block", "fan", "humidity")
+}
+ADC_SAMPLE_SECONDS = REGISTRY.histogram("fridge_adc_sample_seconds", "Thời gian 1 lần đo dòng RMS qua ADS1115 (giây)")
+BROADCAST_SECONDS = REGISTRY.histogram("fridge_broadcast_seconds", "Thời gian gửi status tới mọi client (giây)")
+REGISTRY.gauge("fridge_websocket_clients", "Số client websocket đang kết nối", lambda: len(CONNECTED_MONITORS))
+REGISTRY.gauge("fridge_loop_overruns", "Số vòng điều khiển chạy quá chu kỳ", lambda: CONTROL_SCHEDULER.overruns)
+REGISTRY.gauge("log_records_dropped_total", "Số bản ghi log bị bỏ vì hàng đợi log đầy",
+               lambda: LOG_LISTENER.queue_handler.dropped)
+REGISTRY.gauge("fridge_broadcasts_skipped", "Số lần bỏ broadcast vì lần trước chưa xong", lambda: broadcasts_skipped)
+REGISTRY.gauge("fridge_power_watts", "Công suất đo gần nhất (W)", lambda: last_measured_power_w)
+REGISTRY.gauge("fridge_energy_wh_total", "Tổng năng lượng tiêu thụ (Wh)", lambda: ENERGY_METER.total_wh)
+REGISTRY.gauge("fridge_temperature_celsius", "Nhiệt độ đã lọc (°C)",
+               lambda: temperature_reader.value if temperature_reader and temperature_reader.value is not None
+               else float("nan"))
+
+# --- LỊCH SỬ TÍN HIỆU (RING BUFFER TRONG BỘ NHỚ) ---
+HISTORY_SIGNALS = (
+    "temp_celsius", "humidity_percent", "target_temp_celsius", "target_humidity_percent",
+    "power_watts", "total_energy_wh", "block_relay_on", "fan_relay_on", "humidity_relay_on",
+)
+HISTORY = TimeSeriesStore(HISTORY_SIGNALS)
+
+# --- THEO DÕI TĂNG BỘ NHỚ KHI CHẠY DÀI NGÀY ---
+MEMORY_SAMPLE_INTERVAL = 300 # 5 phút
+MEMORY_WARMUP_SECONDS = 900 # Mốc so sánh lấy sau khi model/camera đã nạp xong
+MEMORY_GROWTH_ALERT_MB = 150
+# 0: chỉ đo RSS (mặc định, tracemalloc làm chậm mỗi lần cấp phát và tăng thời gian khởi động).
+# Khi nghi rò rỉ: đặt biến môi trường FRIDGE_TRACEMALLOC_FRAMES=1 (ghi vết từ lúc khởi động)
+# hoặc bật/tắt lúc đang chạy bằng lệnh websocket {"memory_trace": 1} / {"memory_trace": 0}
+MEMORY_TRACEMALLOC_FRAMES = int(os.environ.get("FRIDGE_TRACEMALLOC_FRAMES", "0"))
+MEMORY_MONITOR = MemoryMonitor(MEMORY_WARMUP_SECONDS, MEMORY_GROWTH_ALERT_MB,
+                               tracemalloc_frames=MEMORY_TRACEMALLOC_FRAMES)
+# Bật trước khi import detector để cấp phát của torch/ultralytics/numpy về sau đều có vết
+MEMORY_MONITOR.start_tracing()
+REGISTRY.gauge("fridge_process_rss_bytes", "RSS của tiến trình controller + detector (byte)",
+               lambda: MEMORY_MONITOR.history[-1][1] if MEMORY_MONITOR.history else float("nan"))
+REGISTRY.gauge("fridge_memory_growth_bytes", "RSS tăng so với mốc sau warm-up (byte)",
+               lambda: MEMORY_MONITOR.growth_bytes if MEMORY_MONITOR.growth_bytes is not None else float("nan"))
+REGISTRY.gauge("fridge_tracemalloc_traced_bytes", "Bộ nhớ Python đang được tracemalloc ghi vết (byte)",
+               lambda: MEMORY_MONITOR.traced_bytes)
+REGISTRY.gauge("fridge_memory_alert", "1 khi RSS tăng quá MEMORY_GROWTH_ALERT_MB", lambda: int(MEMORY_MONITOR.alert))
+
+# --- TRẠNG THÁI SẴN SÀNG ---
+# detector_state: 'not_started' -> 'warming' (đang import/nạp model/mở camera) -> 'ready' | 'failed'
+detector = None
+detector_thread: Optional[Thread] = None
+detector_state = 'not_started'
+control_ready = False
+
+# --- PROFILER THEO YÊU CẦU (LỆNH "profile" QUA WEBSOCKET) ---
+PROFILE_DIR = os.path.join(LOG_DIR, 'profiles')
+PROFILE_MAX_SECONDS = 60
+PROFILER = SamplingProfiler(PROFILE_DIR)
+PROFILE_MIN_INTERVAL_MS = 1 # Nhỏ hơn thì thread lấy mẫu chiếm gần hết GIL
+profile_task: Optional[asyncio.Task] = None # Giữ tham chiếu để task không bị GC giữa chừng
+# Event loop chỉ giữ weak reference tới task: các task chạy nền suốt đời tiến trình phải được giữ ở đây
+background_tasks: Set[asyncio.Task] = set()
+
 # Cau hinh YOLO detection
 #last_ai_check_time = 0
 #AI_CHECK_INTERVAL = 10.0 # Kiểm tra camera mỗi 10 giây
 
-def get_rms_current(chan: AnalogIn, samples=200):
-    """Đo và tính toán dòng điện hiệu dụng (RMS)."""
-    if not chan:
-        return 0.0
-
-    # Tính điện áp offset (điểm 0 của cảm biến)
-    offset_voltage = 0
-    try:
-        for _ in range(samples):
-            offset_voltage += chan.voltage
-        offset_voltage /= samples
-
-        sum_sq_current = 0
-        for _ in range(samples):
-            sensor_voltage = chan.voltage
-            # Chuyển đổi điện áp đọc được sang dòng điện tức thời
-            instant_current = (sensor_voltage - offset_voltage) / CURRENT_SENSOR_SENSITIVITY
-            sum_sq_current += instant_current ** 2
-            
-        mean_sq_current = sum_sq_current / samples
-        rms_current = mean_sq_current ** 0.5
-        return rms_current
-    except Exception as e:
-        # logging.warning(f"Lỗi khi đọc cảm biến dòng điện: {e}")
-        return 0.0
-
 def calculate_power(current_rms: float, line_voltage: float = LINE_VOLTAGE):
     """Ước tính công suất từ dòng RMS."""
     return line_voltage * current_rms
@@ -145,22 +222,53 @@ async def run_gpioset_async(chip: str, line: int, value: int):
     except Exception as e:
         logging.error(f"[GPIO EXCEPTION] Lỗi khi chạy gpioset: {e}")
         
-async def energy_reporting_task():
-    """Tác vụ này chạy nền và báo cáo tổng năng lượng tiêu thụ mỗi 5 phút."""
-    reporting_interval_seconds = 300 # 5 phút = 300 giây
+async def send_energy_report_async(report: dict):
+    """Gửi một tin nhắn báo cáo năng lượng đến Go service."""
+    if not CONNECTED_MONITORS:
+        logging.warning("Không thể gửi báo cáo năng lượng: không có client nào được kết nối.")
+        return
+
+    report_payload = {"type": "energy_report", **report}
+    message = json.dumps(report_payload)
+    logging.info(f"==> GỬI BÁO CÁO NĂNG LƯỢNG TỚI GO SERVICE: {report['total_wh']:.2f} Wh")
+    await asyncio.gather(
+        *[client.send(message) for client in CONNECTED_MONITORS],
+        return_exceptions=True
+    )
 
+async def energy_reporting_task():
+    """Tác vụ này chạy nền, lưu và báo cáo năng lượng tiêu thụ mỗi 5 phút."""
     while True:
-        await asyncio.sleep(reporting_interval_seconds)
-        
-        # Đọc giá trị tổng năng lượng toàn cục
-        total_kwh = total_energy_wh / 1000.0
-        
+        await asyncio.sleep(ENERGY_REPORT_INTERVAL)
+
+        # Lưu tổng tích lũy xuống đĩa (ghi ở thread riêng để không chặn event loop)
+        await asyncio.to_thread(ENERGY_METER.save, ENERGY_METER.snapshot())
+        report = ENERGY_METER.report()
+        total_kwh = report["total_wh"] / 1000.0
+        today = report["day"]
+
         # In báo cáo ra log
         logging.info("="*50)
         logging.info(f"BÁO CÁO NĂNG LƯỢNG TIÊU THỤ (TỔNG CỘNG)")
-        logging.info(f"==> {total_energy_wh:.2f} Wh")
+        logging.info(f"==> {report['total_wh']:.2f} Wh")
         logging.info(f"==> {total_kwh:.4f} kWh")
+        logging.info(f"==> Hôm nay: {today['energy_wh']:.2f} Wh, "
+                     f"block khởi động {today['starts'].get('block', 0)} lần, "
+                     f"duty cycle {today['duty_cycle'].get('block', 0.0) * 100:.1f}%")
         logging.info("="*50)
+        await send_energy_report_async(report)
+
+async def memory_monitor_task():
+    """Lấy mẫu RSS + tracemalloc định kỳ ở thread riêng, báo lỗi 1 lần khi RSS tăng quá ngưỡng."""
+    while True:
+        newly_alerted = await asyncio.to_thread(MEMORY_MONITOR.sample)
+        if newly_alerted:
+            stats = MEMORY_MONITOR.stats()
+            sites = ", ".join(f"{s['site']} +{s['size_diff_kb']:.0f}KB" for s in stats["top_since_baseline"])
+            logging.warning(f"BỘ NHỚ TĂNG {stats['growth_mb']} MB so với mốc "
+                            f"({stats['growth_mb_per_hour']} MB/giờ). Tăng nhiều nhất: {sites or 'N/A'}")
+            await send_error_report_async(f"memory_growth: RSS +{stats['growth_mb']} MB")
+        await asyncio.sleep(MEMORY_SAMPLE_INTERVAL)
 
 # --- THAY ĐỔI: HÀM ĐIỀU KHIỂN BLOCK (CÓ COOLDOWN) ---
 async def set_block_relay_state(state: bool):
@@ -185,6 +293,8 @@ async def set_block_relay_state(state: bool):
     value_to_set = 1 if state else 0
     await run_gpioset_async(CHIP_NAME, BLOCK_RELAY_PIN, value_to_set)
     block_relay_is_on = state
+    ENERGY_METER.set_relay_state("block", state)
+    RELAY_TOGGLES["block"].inc()
 
 # --- THAY ĐỔI: HÀM ĐIỀU KHIỂN QUẠT (KHÔNG CÓ COOLDOWN) ---
 async def set_fan_relay_state(state: bool):
@@ -198,6 +308,8 @@ async def set_fan_relay_state(state: bool):
     value_to_set = 1 if state else 0
     await run_gpioset_async(CHIP_NAME, FAN_RELAY_PIN, value_to_set)
     fan_relay_is_on = state
+    ENERGY_METER.set_relay_state("fan", state)
+    RELAY_TOGGLES["fan"].inc()
 
 async def set_humidity_relay_state(state: bool):
     global humidity_relay_is_on
@@ -209,13 +321,14 @@ async def set_humidity_relay_state(state: bool):
     value_to_set = 1 if state else 0
     await run_gpioset_async(CHIP_NAME, HUMIDITY_RELAY_PIN, value_to_set)
     humidity_relay_is_on = state
+    ENERGY_METER.set_relay_state("humidity", state)
+    RELAY_TOGGLES["humidity"].inc()
 
 # --- HÀM GỬI TRẠNG THÁI ---
 async def broadcast_status():
     if not CONNECTED_MONITORS:
         return
 
-    physical_temp = sensor.read_temperature() if sensor else None
     humidity = None
     if humidity_sensor:
         try:
@@ -224,19 +337,23 @@ async def broadcast_status():
             logging.warning(f"Không đọc được độ ẩm từ AHT20: {e}")
 
     # --- THAY ĐỔI: CẬP NHẬT TRẠNG THÁI RELAY MỚI ---
-    status_payload = {
-        "type": "status_update",
-        "physical_temp_celsius": round(physical_temp, 2) if physical_temp else None,
-        "humidity_percent": round(humidity, 2) if humidity is not None else None,
-        "target_temp_celsius": current_target_temp,
-        "target_humidity_percent": current_target_humidity,
-        "system_mode": system_mode,
-        "block_relay_on": block_relay_is_on, # <-- Đã sửa
-        "fan_relay_on": fan_relay_is_on,     # <-- Đã thêm
-        "humidity_relay_on": humidity_relay_is_on,
-        "power_consumption_watts": round(last_measured_power_w, 2),
-        "cooldown_seconds_remaining": round(max(0, RELAY_COOLDOWN_SECONDS - (time.monotonic() - last_deactivation_time)))
-    }
+    status_payload = build_status_payload(
+        temperature_reader=temperature_reader,
+        humidity=humidity,
+        target_temp=current_target_temp,
+        target_humidity=current_target_humidity,
+        system_mode=system_mode,
+        block_relay_on=block_relay_is_on, # <-- Đã sửa
+        fan_relay_on=fan_relay_is_on,     # <-- Đã thêm
+        humidity_relay_on=humidity_relay_is_on,
+        power_watts=last_measured_power_w,
+        cooldown_seconds_remaining=RELAY_COOLDOWN_SECONDS - (time.monotonic() - last_deactivation_time),
+        controller_mode=CONTROLLER_MODE,
+        thermal_model=THERMAL_MODEL,
+        loop_timing=loop_timing_stats(),
+        readiness=readiness_state(),
+        memory_monitor=MEMORY_MONITOR,
+    )
     # --- KẾT THÚC THAY ĐỔI ---
     message = json.dumps(status_payload)
     await asyncio.gather(
@@ -244,6 +361,116 @@ async def broadcast_status():
         return_exceptions=True
     )
 
+def loop_timing_stats() -> dict:
+    return {
+        "control": CONTROL_SCHEDULER.stats(),
+        "power": POWER_SCHEDULER.stats(),
+        "event_loop_lag_seconds": EVENT_LOOP_LAG.summary(),
+        "broadcasts_skipped": broadcasts_skipped,
+    }
+
+def schedule_broadcast():
+    """Gửi trạng thái ở task nền để client chậm không đẩy lùi quyết định điều khiển tiếp theo."""
+    global broadcast_task, broadcasts_skipped
+    if broadcast_task is not None and not broadcast_task.done():
+        broadcasts_skipped += 1
+        return
+    broadcast_task = asyncio.create_task(timed_broadcast())
+
+async def timed_broadcast():
+    if not CONNECTED_MONITORS:
+        return
+    start = time.perf_counter()
+    await broadcast_status()
+    BROADCAST_SECONDS.observe(time.perf_counter() - start)
+
+def readiness_state() -> dict:
+    return {"control_ready": control_ready, "detector": detector_state}
+
+async def broadcast_readiness():
+    if not CONNECTED_MONITORS:
+        return
+    message = json.dumps({"type": "readiness", **readiness_state()})
+    await asyncio.gather(
+        *[client.send(message) for client in CONNECTED_MONITORS],
+        return_exceptions=True
+    )
+
+def _background_task_done(task: asyncio.Task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Task nền {task.get_name()} dừng vì lỗi: {task.exception()!r}")
+
+def start_background_task(coro) -> asyncio.Task:
+    """create_task + giữ tham chiếu tới khi task kết thúc; lỗi của task được ghi log thay vì mất."""
+    task = asyncio.create_task(coro, name=coro.__name__)
+    background_tasks.add(task)
+    task.add_done_callback(_background_task_done)
+    return task
+
+async def write_startup_profile():
+    await asyncio.to_thread(STARTUP_PROFILE.write, os.path.join(LOG_DIR, STARTUP_PROFILE_FILE))
+
+async def start_detector_async():
+    """
+    Import + khởi tạo YOLOCameraDetector ở thread riêng, song song với việc khởi tạo
+    cảm biến và websocket. Vòng điều khiển chạy bình thường trong lúc model đang nạp.
+    """
+    global detector, detector_state, detector_thread
+    detector_state = 'warming'
+    await broadcast_readiness()
+
+    def create_detector():
+        t0 = time.perf_counter()
+        from config import CAMERA_SOURCES
+        if len(CAMERA_SOURCES) > 1 or not isinstance(CAMERA_SOURCES[0], int):
+            # Nhiều camera (hoặc nguồn cv2): 1 model dùng chung, suy luận gộp batch
+            from multi_camera_detector import MultiCameraDetector as Detector
+        else:
+            from YoloDetector import YOLOCameraDetector as Detector
+        import_seconds = time.perf_counter() - t0
+        return Detector(), import_seconds
+
+    try:
+        new_detector, import_seconds = await asyncio.to_thread(create_detector)
+    except Exception as e:
+        logging.error(f"KHÔNG THỂ KHỞI TẠO AI CAMERA: {e}. Hệ thống tiếp tục chạy không có nhận diện.")
+        detector_state = 'failed'
+        STARTUP_PROFILE.mark("detector_failed")
+        await broadcast_readiness()
+        # Báo cáo dở dang vẫn cho biết hỏng ở đâu và sau bao lâu
+        await write_startup_profile()
+        return
+    STARTUP_PROFILE.add_durations("detector", {"import": import_seconds, **new_detector.init_profile})
+    STARTUP_PROFILE.mark("detector_initialized")
+
+    detector = new_detector
+    # daemon=True: luồng AI tự tắt khi chương trình chính tắt
+    ai_thread = Thread(target=detector.run, args=(), name="ai-camera", daemon=True)
+    logging.info("Đang khởi động luồng AI Camera...")
+    ai_thread.start()
+    detector_thread = ai_thread
+
+    # Chờ frame đầu tiên được suy luận (lần predict đầu luôn chậm hơn)
+    while not detector.is_ready:
+        if not ai_thread.is_alive():
+            logging.error("Luồng AI Camera đã dừng trước khi sẵn sàng.")
+            detector_state = 'failed'
+            STARTUP_PROFILE.mark("detector_failed")
+            await broadcast_readiness()
+            await write_startup_profile()
+            return
+        await asyncio.sleep(0.2)
+    detector_state = 'ready'
+    # MultiCameraDetector có 1 TimeStepLogger mỗi camera: cộng tất cả
+    loggers = [slot.logger for slot in getattr(detector, "slots", [])] or [detector.logger]
+    MEMORY_MONITOR.watch("timestep_logger_ids", lambda: sum(len(logger.last_seen_time) for logger in loggers))
+    STARTUP_PROFILE.mark("detector_ready")
+    STARTUP_PROFILE.add_durations("detector", {"first_inference": detector.init_profile.get("first_inference", 0.0)})
+    logging.info("AI Camera đã sẵn sàng.")
+    await broadcast_readiness()
+    await write_startup_profile()
+
 # --- HÀM MỚI: GỬI BÁO CÁO LỖI ---
 async def send_error_report_async(reason: str):
     """Gửi một tin nhắn báo lỗi đến Go service."""
@@ -351,7 +578,7 @@ def update_temp_from_class_name(class_name):
         return False
 async def control_loop_task():
     # THAY ĐỔI: Bỏ biến `power_fault_reported` khỏi danh sách global
-    global system_mode, last_measured_power_w, total_energy_wh
+    global system_mode, control_ready
     global power_fault_check_start_time
     global current_target_temp
     last_ai_check_time = 0
@@ -367,9 +594,9 @@ async def control_loop_task():
 #           if delected_name:
 #             current_target_temp = delected_name
            last_ai_check_time = current_time
-        await asyncio.sleep(READ_INTERVAL)
+        await CONTROL_SCHEDULER.wait_next()
 
-        if current_target_temp is None or sensor is None:
+        if current_target_temp is None or temperature_reader is None:
             if system_mode != 'IDLE':
                 logging.info("Chưa có nhiệt độ mục tiêu. Chuyển sang chế độ IDLE.")
                 system_mode = 'IDLE'
@@ -377,9 +604,12 @@ async def control_loop_task():
                 await set_fan_relay_state(False)
             continue
 
-        physical_temp = sensor.read_temperature()
+        # Giá trị đã lọc (median + Kalman) thay vì 1 mẫu thô, tránh relay bật/tắt do nhiễu quanh ngưỡng
+        physical_temp = temperature_reader.value
+        temp_rate = temperature_reader.rate
         if physical_temp is None:
-            logging.warning("Không đọc được nhiệt độ từ cảm biến.")
+            reason = "lỗi cảm biến" if temperature_reader.fault else "chưa có mẫu"
+            logging.warning(f"Không đọc được nhiệt độ từ cảm biến ({reason}).")
             continue
             
         humidity = None
@@ -389,27 +619,22 @@ async def control_loop_task():
             except Exception:
                 pass
 
-        # --- Logic điều khiển nhiệt độ (giữ nguyên) ---
+        # --- Logic điều khiển nhiệt độ ---
+        THERMAL_MODEL.observe(time.monotonic(), physical_temp, block_relay_is_on, fan_relay_is_on)
         if current_target_temp is not None:
-            fan_on_threshold = current_target_temp + FAN_HYSTERESIS_DEGREES
-            fan_off_threshold = current_target_temp
-            block_off_threshold = current_target_temp - 2.0
-
-            if physical_temp > fan_on_threshold and not fan_relay_is_on:
-                system_mode = 'FAST_COOLING'
-                await set_fan_relay_state(True)
-            elif physical_temp <= fan_off_threshold and fan_relay_is_on:
-                system_mode = 'MAINTAINING'
-                await set_fan_relay_state(False)
-
-            if fan_relay_is_on and not block_relay_is_on:
-                await set_block_relay_state(True)
-            elif physical_temp <= block_off_threshold and block_relay_is_on:
-                system_mode = 'IDLE_COLD'
-                await set_block_relay_state(False)
-            elif not fan_relay_is_on and not block_relay_is_on and physical_temp > block_off_threshold:
-                system_mode = 'MAINTAINING'
-                await set_block_relay_state(True)
+            if CONTROLLER_MODE == 'predictive' and THERMAL_MODEL.ready:
+                new_mode, want_block, want_fan = PREDICTIVE_CONTROLLER.decide(
+                    physical_temp, current_target_temp, block_relay_is_on, fan_relay_is_on)
+            else:
+                # Mô hình chưa học đủ thì dùng logic ngưỡng cũ
+                new_mode, want_block, want_fan = bang_bang_decision(
+                    physical_temp, current_target_temp, block_relay_is_on, fan_relay_is_on,
+                    FAN_HYSTERESIS_DEGREES, BLOCK_OFF_OFFSET_DEGREES,
+                    rate=temp_rate, block_off_lead=BLOCK_OFF_LEAD_SECONDS)
+            if new_mode is not None:
+                system_mode = new_mode
+            await set_fan_relay_state(want_fan)
+            await set_block_relay_state(want_block)
 
         # --- Logic độ ẩm (giữ nguyên) ---
         if humidity is not None and current_target_humidity is not None:
@@ -420,14 +645,7 @@ async def control_loop_task():
             elif humidity >= turn_off_threshold_humidity and humidity_relay_is_on:
                 await set_humidity_relay_state(False)
 
-        # --- Logic đo công suất (giữ nguyên) ---
-        if block_relay_is_on and power_sensor_channel:
-            current_rms = get_rms_current(power_sensor_channel)
-            last_measured_power_w = calculate_power(current_rms)
-            energy_this_interval_wh = (last_measured_power_w * READ_INTERVAL) / 3600.0
-            total_energy_wh += energy_this_interval_wh
-        else:
-            last_measured_power_w = 0.0
+        # --- Công suất được đo ở power_sampling_task, ở đây chỉ dùng giá trị mới nhất ---
 
         # --- CẬP NHẬT LOGIC KIỂM TRA LỖI CÔNG SUẤT ---
         if block_relay_is_on and last_measured_power_w < 20.0:
@@ -460,13 +678,64 @@ async def control_loop_task():
         if block_relay_is_on:
             log_message += f", Power={last_measured_power_w:.1f}W"
         logging.info(log_message)
+
+        HISTORY.append(time.time(), {
+            "temp_celsius": physical_temp,
+            "humidity_percent": humidity,
+            "target_temp_celsius": current_target_temp,
+            "target_humidity_percent": current_target_humidity,
+            "power_watts": last_measured_power_w,
+            "total_energy_wh": total_energy_wh,
+            "block_relay_on": block_relay_is_on,
+            "fan_relay_on": fan_relay_is_on,
+            "humidity_relay_on": humidity_relay_is_on,
+        })
         
-        await broadcast_status()
+        if not control_ready:
+            control_ready = True
+            STARTUP_PROFILE.mark("control_ready")
+            logging.info("Vòng điều khiển đã sẵn sàng.")
+            await broadcast_readiness()
+
+        schedule_broadcast()
+
+async def power_sampling_task():
+    """Đo công suất song song với vòng điều khiển; ADC đọc chặn nên chạy ở thread riêng."""
+    global last_measured_power_w, total_energy_wh
+    while True:
+        await POWER_SCHEDULER.wait_next()
+        if block_relay_is_on and power_sensor_channel:
+            start = time.perf_counter()
+            current_rms = await asyncio.to_thread(get_rms_current, power_sensor_channel)
+            ADC_SAMPLE_SECONDS.observe(time.perf_counter() - start)
+            last_measured_power_w = calculate_power(current_rms)
+        else:
+            last_measured_power_w = 0.0
+        # Tích phân hình thang theo thời điểm đo thực tế, không giả định mỗi vòng đúng READ_INTERVAL
+        ENERGY_METER.update(last_measured_power_w)
+        total_energy_wh = ENERGY_METER.total_wh
+
+# --- PROFILING THEO YÊU CẦU ---
+async def run_profile_session(websocket: WebSocketServerProtocol, threads: dict, seconds: float,
+                              interval: float, top: int):
+    """Lấy mẫu ở thread nền rồi gửi tóm tắt top-N cho client đã yêu cầu."""
+    logging.info(f"Bắt đầu profile {seconds}s các thread: {', '.join(threads)}")
+    try:
+        report = await asyncio.to_thread(PROFILER.run, threads, seconds, interval, top)
+        response = {"type": "profile", "status": "success", **report}
+        logging.info(f"Profile đã ghi vào {report['file']}")
+    except Exception as e:
+        logging.error(f"Lỗi khi profile: {e}")
+        response = {"type": "profile", "status": "error", "message": str(e)}
+    try:
+        await websocket.send(json.dumps(response))
+    except ConnectionClosed:
+        logging.warning("Client đã ngắt kết nối trước khi nhận kết quả profile.")
 
 # --- BỘ XỬ LÝ KẾT NỐI WEBSOCKET ---
 async def handler(websocket: WebSocketServerProtocol):
     # (Hàm này giữ nguyên)
-    global current_target_temp ,current_target_humidity 
+    global current_target_temp ,current_target_humidity, CONTROLLER_MODE, profile_task
 
     logging.info(f"Client đã kết nối từ {websocket.remote_address}")
     CONNECTED_MONITORS.add(websocket)
@@ -491,7 +760,82 @@ async def handler(websocket: WebSocketServerProtocol):
                     response = {"status": "success", "message": f"Target humidity updated to {new_target_h}"}
                     await websocket.send(json.dumps(response))
 
-            except (json.JSONDecodeError, ValueError) as e:
+                if "controller_mode" in data:
+                    new_mode = str(data["controller_mode"])
+                    if new_mode not in ('bang_bang', 'predictive'):
+                        raise ValueError(f"controller_mode không hợp lệ: {new_mode}")
+                    logging.info(f"==> ĐỔI CHẾ ĐỘ ĐIỀU KHIỂN: {CONTROLLER_MODE} -> {new_mode} <==")
+                    CONTROLLER_MODE = new_mode
+                    response = {"status": "success", "message": f"Controller mode set to {new_mode}",
+                                "model_ready": THERMAL_MODEL.ready}
+                    await websocket.send(json.dumps(response))
+
+                if "reload_model" in data:
+                    # {"reload_model": true} nạp lại MODEL_PATH, {"reload_model": "/path/model.pt"} đổi sang file khác
+                    if detector is None:
+                        response = {"status": "error", "message": f"Detector chưa sẵn sàng ({detector_state})"}
+                    else:
+                        path = data["reload_model"] if isinstance(data["reload_model"], str) else None
+                        if path is not None and not os.path.exists(path):
+                            raise ValueError(f"Không tìm thấy file model: {path}")
+                        started = detector.request_model_swap(path)
+                        response = {"status": "success" if started else "busy",
+                                    "message": f"Loading model {path or detector.model_path} in background"
+                                    if started else "Another model is still loading",
+                                    "model_swap_state": detector.model_swap_state}
+                    await websocket.send(json.dumps(response))
+
+                if "history" in data:
+                    # {"history": {"start": epoch, "end": epoch, "resolution": "raw|1m|15m|auto", "signals": [...]}}
+                    query = data["history"] or {}
+                    if not isinstance(query, dict):
+                        raise ValueError(f"history phải là object, nhận được: {query!r}")
+                    signals = query.get("signals")
+                    if signals is not None and not isinstance(signals, list):
+                        raise ValueError(f"history.signals phải là list, nhận được: {signals!r}")
+                    end = float(query.get("end", time.time()))
+                    start = float(query.get("start", end - 3600))
+                    result = HISTORY.query(start, end, query.get("resolution"), signals)
+                    response = {"type": "history", **result}
+                    await websocket.send(json.dumps(response))
+
+                if "memory_trace" in data:
+                    # {"memory_trace": N} bật tracemalloc với N frame mỗi traceback, {"memory_trace": 0} tắt
+                    frames = int(data["memory_trace"])
+                    if frames < 0:
+                        raise ValueError(f"memory_trace phải >= 0, nhận được: {frames}")
+                    if frames > 0:
+                        await asyncio.to_thread(MEMORY_MONITOR.start_tracing, frames)
+                    else:
+                        await asyncio.to_thread(MEMORY_MONITOR.stop_tracing)
+                    logging.info(f"==> TRACEMALLOC: {'BẬT (' + str(frames) + ' frame)' if frames else 'TẮT'} <==")
+                    response = {"type": "memory", "status": "success", **MEMORY_MONITOR.stats()}
+                    await websocket.send(json.dumps(response))
+
+                if "profile" in data:
+                    # {"profile": {"seconds": 10, "top": 15, "interval_ms": 5, "all_threads": false}}
+                    # Mặc định lấy mẫu event loop (thread này) và luồng AI Camera
+                    options = data["profile"] if isinstance(data["profile"], dict) else {}
+                    seconds = float(options.get("seconds", 10))
+                    interval = max(PROFILE_MIN_INTERVAL_MS, float(options.get("interval_ms", 5))) / 1000.0
+                    top = max(1, int(options.get("top", 15)))
+                    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+                        raise ValueError(f"profile: seconds phải trong (0, {PROFILE_MAX_SECONDS}]")
+                    if not PROFILER.try_start():
+                        response = {"status": "busy", "message": "Another profiling session is running"}
+                    else:
+                        if options.get("all_threads"):
+                            threads = thread_idents()
+                        else:
+                            threads = {"asyncio": get_ident()}
+                            if detector_thread is not None and detector_thread.is_alive():
+                                threads["detector"] = detector_thread.ident
+                        profile_task = asyncio.create_task(run_profile_session(websocket, threads, seconds, interval, top))
+                        response = {"status": "success", "message": f"Profiling {', '.join(threads)} for {seconds}s",
+                                    "threads": list(threads)}
+                    await websocket.send(json.dumps(response))
+
+            except (json.JSONDecodeError, ValueError, TypeError) as e:
                 logging.error(f"Lỗi xử lý message: {e}")
 
     except ConnectionClosed:
@@ -505,13 +849,18 @@ async def main():
     **HÀM ĐÃ ĐƯỢC BỔ SUNG**
     Bổ sung việc khởi tạo cảm biến độ ẩm AHT20.
     """
-    global sensor, humidity_sensor, power_sensor_channel # <-- BỔ SUNG
+    global sensor, temperature_reader, humidity_sensor, power_sensor_channel # <-- BỔ SUNG
     host = "0.0.0.0"
     port = 8765
 
+    # Nạp model/camera chạy song song với phần khởi tạo cảm biến bên dưới
+    start_background_task(start_detector_async())
+
     # --- KHỞI TẠO CẢM BIẾN NHIỆT ĐỘ MAX6675 ---
     try:
         sensor = MAX6675(bus=SENSOR_BUS, device=SENSOR_DEVICE)
+        temperature_reader = OversampledTemperature(sensor, use_filter=TEMP_FILTER_ENABLED)
+        temperature_reader.start()
         logging.info(f"Khởi tạo cảm biến MAX6675 thành công.")
     except Exception as e:
         logging.error(f"KHÔNG THỂ KHỞI TẠO CẢM BIẾN MAX6675: {e}. Vòng lặp điều khiển sẽ không hoạt động.")
@@ -541,6 +890,7 @@ async def main():
     except Exception as e:
         logging.error(f"KHÔNG THỂ KHỞI TẠO CẢM BIẾN ADS1115: {e}. Dữ liệu công suất sẽ không có sẵn.")
         power_sensor_channel = None
+    STARTUP_PROFILE.mark("sensors_ready")
 
     await set_fan_relay_state(False)
     await set_humidity_relay_state(False)
@@ -548,11 +898,22 @@ async def main():
     logging.info("KHỞI CHẠY HỆ THỐNG: Bật block (cục lạnh).")
     await set_block_relay_state(True)
     
-    asyncio.create_task(control_loop_task())
-    asyncio.create_task(energy_reporting_task())
+    start_background_task(control_loop_task())
+    start_background_task(power_sampling_task())
+    start_background_task(energy_reporting_task())
+    start_background_task(monitor_event_loop_lag(EVENT_LOOP_LAG))
+    start_background_task(memory_monitor_task())
+
+    if METRICS_ENABLED:
+        try:
+            await start_metrics_server(METRICS_HOST, METRICS_PORT)
+            logging.info(f"Metrics endpoint: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        except OSError as e:
+            logging.error(f"KHÔNG THỂ MỞ METRICS ENDPOINT: {e}")
 
     async with websockets.serve(handler, host, port):
         logging.info(f"WebSocket server đang lắng nghe Go Service trên ws://{host}:{port}")
+        STARTUP_PROFILE.mark("websocket_listening")
         await asyncio.Future()
 
 async def cleanup():
@@ -561,28 +922,19 @@ async def cleanup():
     await set_block_relay_state(False)
     await set_fan_relay_state(False)
     await set_humidity_relay_state(False)
+    ENERGY_METER.save()
+    if temperature_reader:
+        temperature_reader.stop()
     if sensor:
         sensor.close()
     logging.info("Tất cả các relay đã được tắt. Tạm biệt!")
 
 if __name__ == "__main__":
-    # 1. Khởi tạo đối tượng Detector
-    # Lưu ý: Đảm bảo bạn đã import đúng như hướng dẫn trước
-    detector = YOLOCameraDetector()
-
-    # 2. Tạo một Luồng (Thread) riêng để chạy Camera AI
-    # target=detector.run: Chỉ định hàm cần chạy
-    # daemon=True: Quan trọng! Giúp luồng này tự tắt khi chương trình chính tắt
-    ai_thread = Thread(target=detector.run, args=(), daemon=True)
-    
-    # 3. Bắt đầu chạy luồng AI (Nó sẽ chạy song song ngay lập tức)
-    logging.info("Đang khởi động luồng AI Camera...")
-    ai_thread.start()
-
-    # 4. Chạy vòng lặp điều khiển chính (Asyncio) ở luồng chính
+    # Detector được khởi tạo bên trong main() (start_detector_async), không chặn khởi động
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logging.info("Đã nhận tín hiệu dừng (Ctrl+C).")
     finally:
         asyncio.run(cleanup())
+        LOG_LISTENER.stop()
@@ -0,0 +1,194 @@
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+# Bỏ qua cấp phát của chính tracemalloc và của bộ import khi thống kê
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def read_rss_bytes() -> Optional[int]:
+    """RSS hiện tại của tiến trình (Linux, đọc /proc/self/statm), None nếu không đọc được."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _site(frame) -> str:
+    # 2 cấp thư mục cuối là đủ phân biệt (vd. ultralytics/engine/predictor.py) mà vẫn gọn
+    parts = frame.filename.replace("\\", "/").split("/")
+    return f"{'/'.join(parts[-3:])}:{frame.lineno}"
+
+
+class MemoryMonitor:
+    """
+    Theo dõi tăng bộ nhớ khi chạy dài ngày: RSS mỗi lần sample, và nếu bật tracemalloc thì
+    thống kê cấp phát theo dòng code để so với mốc (baseline, lấy sau warm-up) và lần trước.
+    Chỉ giữ bảng {dòng code: (bytes, số block)} chứ không giữ cả snapshot, nên tốn ít RAM.
+    """
+
+    def __init__(self, warmup_seconds: float = 600.0, growth_threshold_mb: float = 150.0,
+                 top: int = 5, tracemalloc_frames: int = 0, history: int = 288):
+        self.warmup_seconds = warmup_seconds
+        self.growth_threshold = growth_threshold_mb * 1024 * 1024
+        self.top = top
+        self.tracemalloc_frames = tracemalloc_frames
+        self.history = deque(maxlen=history)  # (time.time(), rss)
+        self.samples = 0
+        self.alert = False
+        self.baseline_rss: Optional[int] = None
+        self.baseline_time: Optional[float] = None
+        self.traced_bytes = 0
+        self.top_since_baseline = []
+        self.top_since_last = []
+        self.watched: Dict[str, int] = {}
+        self._watches: Dict[str, Callable[[], int]] = {}
+        self._started = time.monotonic()
+        self._baseline_sites: Optional[Dict[str, Tuple[int, int]]] = None
+        self._last_sites: Optional[Dict[str, Tuple[int, int]]] = None
+        self._trace_lock = threading.Lock()  # bật/tắt không chen vào giữa lúc sample() chụp snapshot
+
+    def start_tracing(self, frames: Optional[int] = None):
+        """
+        Bật tracemalloc (tracemalloc_frames=0: chỉ đo RSS). Bật lúc khởi động thì thấy được cả cấp phát
+        khi import; bật giữa chừng (lệnh websocket) thì mốc so sánh là lần sample đầu tiên sau khi bật.
+        Đang trace mà số frame khác thì trace lại từ đầu, để stats() luôn báo đúng độ sâu đang dùng.
+        """
+        with self._trace_lock:
+            if frames is not None:
+                self.tracemalloc_frames = frames
+            if self.tracemalloc_frames <= 0:
+                if tracemalloc.is_tracing():
+                    tracemalloc.stop()
+                    self._reset_sites()
+                return
+            if tracemalloc.is_tracing():
+                if tracemalloc.get_traceback_limit() == self.tracemalloc_frames:
+                    return
+                tracemalloc.stop()
+            tracemalloc.start(self.tracemalloc_frames)
+            self._reset_sites()
+
+    def stop_tracing(self):
+        """Tắt tracemalloc và bỏ thống kê theo dòng code (mỗi lần cấp phát lại không tốn thêm gì)."""
+        with self._trace_lock:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self._reset_sites()
+
+    def _reset_sites(self):
+        # Thống kê của phiên trace trước không so được với phiên mới
+        self._baseline_sites = None
+        self._last_sites = None
+        self.top_since_baseline = []
+        self.top_since_last = []
+        self.traced_bytes = 0
+
+    def watch(self, name: str, fn: Callable[[], int]):
+        """Theo dõi thêm kích thước 1 cấu trúc (vd. số ID trong TimeStepLogger) ở mỗi lần sample."""
+        self._watches[name] = fn
+
+    @property
+    def growth_bytes(self) -> Optional[int]:
+        if self.baseline_rss is None or not self.history:
+            return None
+        return self.history[-1][1] - self.baseline_rss
+
+    def _sites(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+        return {_site(stat.traceback[0]): (stat.size, stat.count) for stat in snapshot.statistics("lineno")}
+
+    def _top_growth(self, sites, reference):
+        growth = []
+        for site, (size, count) in sites.items():
+            old_size, old_count = reference.get(site, (0, 0))
+            if size > old_size:
+                growth.append((size - old_size, count - old_count, size, site))
+        growth.sort(reverse=True)
+        return [{"site": site, "size_diff_kb": round(diff / 1024, 1), "count_diff": count_diff,
+                 "size_kb": round(size / 1024, 1)} for diff, count_diff, size, site in growth[:self.top]]
+
+    def sample(self) -> bool:
+        """
+        Lấy 1 mẫu (chặn vài chục-trăm ms khi bật tracemalloc, gọi qua asyncio.to_thread).
+        Trả về True đúng lần mức tăng RSS so với baseline vừa vượt ngưỡng.
+        """
+        now = time.time()
+        rss = read_rss_bytes()
+        if rss is None:
+            return False
+        self.history.append((now, rss))
+        self.samples += 1
+        for name, fn in self._watches.items():
+            try:
+                self.watched[name] = int(fn())
+            except Exception as e:
+                logging.warning(f"Không đọc được '{name}' khi theo dõi bộ nhớ: {e}")
+
+        sites = None
+        with self._trace_lock:
+            if tracemalloc.is_tracing():
+                self.traced_bytes = tracemalloc.get_traced_memory()[0]
+                sites = self._sites()
+                if self._last_sites is not None:
+                    self.top_since_last = self._top_growth(sites, self._last_sites)
+                self._last_sites = sites
+
+        if self.baseline_rss is None:
+            if time.monotonic() - self._started >= self.warmup_seconds:
+                # Sau warm-up (model đã nạp, cache đã đầy): mọi mức tăng từ đây mới đáng ngờ
+                self.baseline_rss, self.baseline_time = rss, now
+                self._baseline_sites = sites
+            return False
+        if sites is not None:
+            if self._baseline_sites is None:
+                self._baseline_sites = sites  # tracemalloc được bật sau warm-up
+            self.top_since_baseline = self._top_growth(sites, self._baseline_sites)
+
+        was_alert = self.alert
+        self.alert = rss - self.baseline_rss > self.growth_threshold
+        return self.alert and not was_alert
+
+    def growth_rate_mb_per_hour(self) -> Optional[float]:
+        """Độ dốc RSS (bình phương tối thiểu) trên các mẫu từ baseline trở đi."""
+        if self.baseline_time is None:
+            return None
+        points = [(t, rss) for t, rss in self.history if t >= self.baseline_time]
+        if len(points) < 2:
+            return None
+        mean_t = sum(t for t, _ in points) / len(points)
+        mean_r = sum(r for _, r in points) / len(points)
+        var_t = sum((t - mean_t) ** 2 for t, _ in points)
+        if var_t <= 0:
+            return None
+        slope = sum((t - mean_t) * (r - mean_r) for t, r in points) / var_t
+        return slope * 3600 / (1024 * 1024)
+
+    def stats(self) -> dict:
+        growth = self.growth_bytes
+        rate = self.growth_rate_mb_per_hour()
+        return {
+            "rss_mb": round(self.history[-1][1] / (1024 * 1024), 1) if self.history else None,
+            "baseline_rss_mb": round(self.baseline_rss / (1024 * 1024), 1) if self.baseline_rss else None,
+            "growth_mb": round(growth / (1024 * 1024), 1) if growth is not None else None,
+            "growth_mb_per_hour": round(rate, 2) if rate is not None else None,
+            "alert": self.alert,
+            "threshold_mb": round(self.growth_threshold / (1024 * 1024), 1),
+            "tracemalloc": tracemalloc.is_tracing(),
+            "traced_mb": round(self.traced_bytes / (1024 * 1024), 1),
+            "samples": self.samples,
+            "watched": dict(self.watched),
+            "top_since_baseline": self.top_since_baseline,
+            "top_since_last": self.top_since_last,
+        }
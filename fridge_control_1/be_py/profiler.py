@@ -0,0 +1,118 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+
+def _label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}:{code.co_firstlineno}"
+
+
+class SamplingProfiler:
+    """
+    Profiler lấy mẫu stack theo chu kỳ (sys._current_frames) cho các thread chỉ định, dùng được
+    cho cả event loop lẫn luồng AI đang chạy sẵn (cProfile chỉ đo được thread gọi nó).
+    Không cài hook nào vào interpreter: ngoài phiên đo thì không tốn gì, trong phiên đo chỉ có
+    1 thread nền thức dậy mỗi `interval` giây để chụp stack.
+    """
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.sessions = 0
+        self._active = False
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    def try_start(self) -> bool:
+        """Giữ chỗ cho 1 phiên đo; False nếu đang có phiên khác. run() nhả chỗ khi xong."""
+        with self._lock:
+            if self._active:
+                return False
+            self._active = True
+            return True
+
+    def run(self, threads: Dict[str, int], seconds: float, interval: float = 0.005, top: int = 15) -> dict:
+        """
+        Lấy mẫu `threads` ({tên: thread ident}) trong `seconds` giây (chặn, gọi qua asyncio.to_thread).
+        Ghi stack gộp dạng "folded" (flamegraph.pl / speedscope đọc được) và trả về tóm tắt top-N.
+        """
+        try:
+            own_ident = threading.get_ident()
+            stacks = {name: Counter() for name, ident in threads.items() if ident != own_ident}
+            idents = {name: threads[name] for name in stacks}
+            sampling_seconds = 0.0
+            started = time.monotonic()
+            next_t = started
+            while next_t < started + seconds:
+                t0 = time.perf_counter()
+                frames = sys._current_frames()
+                for name, ident in idents.items():
+                    frame = frames.get(ident)
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame.f_code)
+                        frame = frame.f_back
+                    if stack:
+                        stacks[name][tuple(stack)] += 1
+                del frames
+                sampling_seconds += time.perf_counter() - t0
+                next_t += interval
+                time.sleep(max(0.0, next_t - time.monotonic()))
+            duration = time.monotonic() - started
+            return self._report(stacks, duration, interval, sampling_seconds, top)
+        finally:
+            with self._lock:
+                self._active = False
+
+    def _report(self, stacks, duration, interval, sampling_seconds, top) -> dict:
+        self.sessions += 1
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"profile_{time.strftime('%Y%m%d_%H%M%S')}.folded")
+        labels = {}
+
+        def label(code):
+            if code not in labels:
+                labels[code] = _label(code)
+            return labels[code]
+
+        summary = {}
+        with open(path, "w", encoding="utf-8") as f:
+            for name, counter in stacks.items():
+                total = sum(counter.values())
+                self_counts, cumulative = Counter(), Counter()
+                for stack, count in counter.items():
+                    # stack lưu từ lá lên gốc; file folded ghi từ gốc xuống lá
+                    f.write(f"{name};{';'.join(label(c) for c in reversed(stack))} {count}\n")
+                    self_counts[stack[0]] += count
+                    for code in set(stack):
+                        cumulative[code] += count
+
+                def rows(counts):
+                    return [{"function": label(code), "samples": n, "percent": round(100.0 * n / total, 1)}
+                            for code, n in counts.most_common(top)]
+
+                summary[name] = {"samples": total, "top_self": rows(self_counts) if total else [],
+                                 "top_cumulative": rows(cumulative) if total else []}
+
+        report = {
+            "file": path,
+            "duration_seconds": round(duration, 2),
+            "interval_ms": round(interval * 1000, 2),
+            "sampler_overhead_percent": round(100.0 * sampling_seconds / max(duration, 1e-9), 2),
+            "threads": summary,
+        }
+        with open(os.path.splitext(path)[0] + ".json", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+
+def thread_idents(names: Optional[list] = None) -> Dict[str, int]:
+    """Ident của các thread đang chạy theo tên (tất cả nếu names=None)."""
+    return {t.name: t.ident for t in threading.enumerate()
+            if t.ident is not None and (names is None or t.name in names)}
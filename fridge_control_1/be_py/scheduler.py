@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from typing import Optional
+
+from metrics import Histogram
+
+
+class DeadlineScheduler:
+    """
+    Đánh thức theo mốc tuyệt đối start + k*period thay vì sleep(period)
+    sau mỗi vòng, nên chu kỳ thực không bị trôi theo thời gian xử lý.
+    """
+
+    def __init__(self, period: float, name: str = "loop", lateness: Optional[Histogram] = None):
+        self.period = period
+        self.name = name
+        self.lateness = lateness if lateness is not None else Histogram()
+        self.overruns = 0
+        self.skipped_periods = 0
+        self.ticks = 0
+        self._next_deadline: Optional[float] = None
+
+    async def wait_next(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._next_deadline is None:
+            self._next_deadline = now + self.period
+        elif now > self._next_deadline:
+            # Vòng trước chạy quá chu kỳ: bỏ qua các mốc đã lỡ, không chạy dồn
+            missed = int((now - self._next_deadline) // self.period) + 1
+            self.overruns += 1
+            self.skipped_periods += missed - 1
+            logging.warning(f"[{self.name}] Vòng lặp chạy quá chu kỳ {self.period}s "
+                            f"(trễ {now - self._next_deadline:.3f}s, bỏ {missed - 1} chu kỳ).")
+            self._next_deadline += missed * self.period
+
+        await asyncio.sleep(max(0.0, self._next_deadline - loop.time()))
+        self.lateness.observe(max(0.0, loop.time() - self._next_deadline))
+        self._next_deadline += self.period
+        self.ticks += 1
+
+    def stats(self) -> dict:
+        return {
+            "period": self.period,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped_periods": self.skipped_periods,
+            "lateness_seconds": self.lateness.summary(),
+        }
+
+
+async def monitor_event_loop_lag(histogram: Histogram, interval: float = 0.5):
+    """Đo độ trễ của event loop: thời gian ngủ thực tế vượt quá thời gian yêu cầu."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        histogram.observe(max(0.0, loop.time() - start - interval))
@@ -0,0 +1,55 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+
+def process_age_seconds() -> Optional[float]:
+    """Số giây từ lúc tiến trình được tạo (Linux, đọc /proc), None nếu không đọc được."""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # Trường 22 (starttime) tính bằng clock tick kể từ lúc boot; bỏ qua phần "(comm)" có thể chứa dấu cách
+            fields = f.read().rsplit(")", 1)[1].split()
+        start_ticks = int(fields[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfile:
+    """Ghi mốc thời gian các giai đoạn khởi động, tính từ lúc tiến trình được tạo."""
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        # Phần thời gian trước khi module này chạy (interpreter + import trước đó)
+        self._offset = process_age_seconds() or 0.0
+        self.marks: Dict[str, float] = {}
+        self.durations: Dict[str, float] = {}
+
+    def now(self) -> float:
+        return self._offset + time.perf_counter() - self._t0
+
+    def mark(self, name: str):
+        if name not in self.marks:
+            self.marks[name] = round(self.now(), 3)
+
+    def add_durations(self, prefix: str, durations: Dict[str, float]):
+        for name, seconds in durations.items():
+            self.durations[f"{prefix}.{name}"] = round(seconds, 3)
+
+    def report(self) -> dict:
+        return {"marks": dict(sorted(self.marks.items(), key=lambda kv: kv[1])),
+                "durations": dict(self.durations)}
+
+    def write(self, path: str):
+        report = self.report()
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            logging.error(f"Không ghi được báo cáo khởi động {path}: {e}")
+        logging.info("BÁO CÁO KHỞI ĐỘNG (giây kể từ khi tiến trình bắt đầu): "
+                     + ", ".join(f"{k}={v}" for k, v in report["marks"].items()))
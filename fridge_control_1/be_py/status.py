@@ -0,0 +1,32 @@
+from typing import Optional
+
+
+def build_status_payload(*, temperature_reader, humidity: Optional[float], target_temp: float,
+                         target_humidity: float, system_mode: str, block_relay_on: bool, fan_relay_on: bool,
+                         humidity_relay_on: bool, power_watts: float, cooldown_seconds_remaining: float,
+                         controller_mode: str, thermal_model, loop_timing: dict, readiness: dict,
+                         memory_monitor) -> dict:
+    """
+    Payload "status_update" gửi cho client websocket. Tách khỏi main.py (vốn import thư viện
+    phần cứng) để microbench.py đo đúng hàm này với các đối tượng giả.
+    """
+    physical_temp = temperature_reader.value if temperature_reader else None
+    return {
+        "type": "status_update",
+        "physical_temp_celsius": round(physical_temp, 2) if physical_temp else None,
+        "humidity_percent": round(humidity, 2) if humidity is not None else None,
+        "temp_sensor": temperature_reader.stats() if temperature_reader else None,
+        "target_temp_celsius": target_temp,
+        "target_humidity_percent": target_humidity,
+        "system_mode": system_mode,
+        "block_relay_on": block_relay_on,
+        "fan_relay_on": fan_relay_on,
+        "humidity_relay_on": humidity_relay_on,
+        "power_consumption_watts": round(power_watts, 2),
+        "cooldown_seconds_remaining": round(max(0, cooldown_seconds_remaining)),
+        "controller_mode": controller_mode,
+        "thermal_model": thermal_model.to_dict(),
+        "loop_timing": loop_timing,
+        "readiness": readiness,
+        "memory": memory_monitor.stats(),
+    }
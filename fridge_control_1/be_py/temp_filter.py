@@ -0,0 +1,178 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+# MAX6675 cần tối đa 0.22s cho mỗi lần chuyển đổi; đọc nhanh hơn sẽ ngắt
+# chuyển đổi đang chạy và trả lại giá trị cũ.
+MAX6675_CONVERSION_SECONDS = 0.22
+
+
+class TemperatureFilter:
+    """
+    Bộ lọc nhiệt độ: median-3 để loại gai, sau đó Kalman 2 trạng thái (nhiệt độ + tốc độ
+    thay đổi, mô hình vận tốc gần không đổi). Theo cả tốc độ nên không trễ pha khi nhiệt độ
+    đang lên/xuống đều, và cho luôn ước lượng dT/dt. Không phụ thuộc phần cứng để dùng lại
+    trong mô phỏng.
+    """
+
+    def __init__(self, process_noise: float = 1e-7, measurement_noise: float = 0.03,
+                 outlier_sigma: float = 5.0, max_outliers: int = 3):
+        self.q = process_noise          # °C²/s³ (nhiễu gia tốc của nhiệt độ)
+        self.r = measurement_noise      # °C² (nhiễu + lượng tử hóa 0.25°C)
+        self.outlier_sigma = outlier_sigma
+        self.max_outliers = max_outliers
+        self.value: Optional[float] = None
+        self.rate: float = 0.0          # °C/s
+        self.outliers = 0
+        self._consecutive_outliers = 0
+        self._window = deque(maxlen=3)
+        self._last_t: Optional[float] = None
+        self._p = [[float("inf"), 0.0], [0.0, float("inf")]]
+
+    @property
+    def variance(self) -> float:
+        """Phương sai của nhiệt độ ước lượng (°C²), inf khi chưa có mẫu."""
+        return self._p[0][0]
+
+    def reset(self):
+        self.value = None
+        self.rate = 0.0
+        self._p = [[float("inf"), 0.0], [0.0, float("inf")]]
+        self._consecutive_outliers = 0
+        self._window.clear()
+        self._last_t = None
+
+    def update(self, sample: float, now: float) -> float:
+        self._window.append(sample)
+        z = sorted(self._window)[len(self._window) // 2]
+
+        if self.value is None:
+            # Chưa biết tốc độ: phương sai ban đầu cỡ 0.01 °C/s (rất rộng với tủ lạnh)
+            self.value, self.rate, self._last_t = z, 0.0, now
+            self._p = [[self.r, 0.0], [0.0, 1e-4]]
+            return self.value
+
+        dt = max(0.0, now - self._last_t)
+        self._last_t = now
+        # Dự đoán: x = F x, P = F P F' + Q với F = [[1, dt], [0, 1]]
+        (p00, p01), (_, p11) = self._p
+        q = self.q
+        p00 = p00 + 2 * dt * p01 + dt * dt * p11 + q * dt ** 3 / 3
+        p01 = p01 + dt * p11 + q * dt * dt / 2
+        p11 = p11 + q * dt
+        predicted = self.value + self.rate * dt
+
+        innovation = z - predicted
+        s = p00 + self.r
+        if innovation * innovation > (self.outlier_sigma ** 2) * s \
+                and self._consecutive_outliers < self.max_outliers:
+            # Bỏ mẫu bất thường; nếu lặp lại liên tục thì coi là thay đổi thật
+            self._consecutive_outliers += 1
+            self.outliers += 1
+            self.value = predicted
+            self._p = [[p00, p01], [p01, p11]]
+            return self.value
+        self._consecutive_outliers = 0
+        k0, k1 = p00 / s, p01 / s
+        self.value = predicted + k0 * innovation
+        self.rate += k1 * innovation
+        self._p = [[(1 - k0) * p00, (1 - k0) * p01],
+                   [(1 - k0) * p01, p11 - k1 * p01]]
+        return self.value
+
+
+class OversampledTemperature:
+    """
+    Đọc MAX6675 liên tục ở thread nền (không nhanh hơn thời gian chuyển đổi của chip),
+    lọc và cung cấp giá trị đã lọc, phương sai và cờ lỗi cảm biến.
+    """
+
+    def __init__(self, sensor, sample_interval: float = 0.25, fault_timeout: float = 5.0,
+                 temp_filter: Optional[TemperatureFilter] = None, use_filter: bool = True):
+        self.sensor = sensor
+        # False: `value` là mẫu hợp lệ mới nhất (không trễ pha); bộ lọc vẫn chạy để báo trong stats()
+        self.use_filter = use_filter
+        self.last_good: Optional[float] = None
+        self.sample_interval = max(sample_interval, MAX6675_CONVERSION_SECONDS)
+        self.fault_timeout = fault_timeout
+        self.filter = temp_filter or TemperatureFilter()
+        self.samples = 0
+        self.failed_reads = 0
+        self.last_raw: Optional[float] = None
+        self._last_ok = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="max6675-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def _run(self):
+        next_t = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                raw = self.sensor.read_temperature()
+            except Exception as e:
+                logging.warning(f"Lỗi đọc MAX6675: {e}")
+                raw = None
+            now = time.monotonic()
+            with self._lock:
+                self.last_raw = raw
+                if raw is None:
+                    self.failed_reads += 1
+                else:
+                    self.samples += 1
+                    self._last_ok = now
+                    self.last_good = raw
+                    self.filter.update(raw, now)
+            next_t += self.sample_interval
+            self._stop.wait(max(0.0, next_t - time.monotonic()))
+
+    @property
+    def fault(self) -> bool:
+        """True khi không có mẫu hợp lệ nào trong fault_timeout giây."""
+        return time.monotonic() - self._last_ok > self.fault_timeout
+
+    @property
+    def value(self) -> Optional[float]:
+        with self._lock:
+            if self.fault:
+                return None
+            return self.filter.value if self.use_filter else self.last_good
+
+    @property
+    def variance(self) -> float:
+        with self._lock:
+            return self.filter.variance
+
+    @property
+    def rate(self) -> float:
+        """Tốc độ thay đổi nhiệt độ đã lọc (°C/s); 0 khi không dùng bộ lọc hoặc cảm biến lỗi."""
+        with self._lock:
+            if self.fault or not self.use_filter:
+                return 0.0
+            return self.filter.rate
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "raw": self.last_raw,
+                "filtered": None if self.filter.value is None else round(self.filter.value, 3),
+                "use_filter": self.use_filter,
+                "rate": round(self.filter.rate, 5),
+                # inf cho tới mẫu hợp lệ đầu tiên, không serialize được thành JSON hợp lệ
+                "variance": round(self.filter.variance, 5) if math.isfinite(self.filter.variance) else None,
+                "fault": self.fault,
+                "samples": self.samples,
+                "failed_reads": self.failed_reads,
+                "outliers": self.filter.outliers,
+            }
@@ -0,0 +1,34 @@
+from timeseries import RingBuffer, TimeSeriesStore
+
+T0 = 1_000_000.0
+
+
+def _fill(store, seconds, step=2):
+    for i in range(seconds // step):
+        store.append(T0 + step * i, {"temp": 4.0})
+    return T0 + seconds
+
+
+def test_long_query_after_raw_ring_wrapped_keeps_coarser_history():
+    # 2 giờ uptime với mẫu mỗi 2s: ring raw (1 giờ) đã quấn vòng, tầng 1 phút còn đủ 2 giờ
+    store = TimeSeriesStore(["temp"])
+    now = _fill(store, 2 * 3600)
+
+    result = store.query(now - 24 * 3600, now)
+
+    returned = now - result["t"][0]
+    for name, tier in store.tiers.items():
+        buf = tier if isinstance(tier, RingBuffer) else tier.buffer
+        oldest = buf.oldest()
+        if oldest is None:
+            continue
+        # Mốc của tầng thưa nằm giữa bucket nên cho phép lệch tối đa 1 bucket
+        tolerance = 0.0 if isinstance(tier, RingBuffer) else tier.bucket_seconds
+        assert returned + tolerance >= now - oldest, (result["resolution"], name)
+
+
+def test_young_store_uses_raw_tier():
+    store = TimeSeriesStore(["temp"])
+    now = _fill(store, 600)
+
+    assert store.query(now - 3600, now)["resolution"] == "raw"
@@ -0,0 +1,207 @@
+import numpy as np
+from typing import Iterator, Optional, Tuple
+
+
+def bang_bang_decision(temp: float, target: float, block_on: bool, fan_on: bool,
+                       fan_hysteresis: float, block_off_offset: float = 2.0,
+                       rate: float = 0.0, block_off_lead: float = 0.0
+                       ) -> Tuple[Optional[str], bool, bool]:
+    """
+    Logic ngưỡng hiện tại (bang-bang), tách ra hàm thuần để dùng chung cho
+    vòng điều khiển và bộ đánh giá offline.
+    `rate` (°C/s, từ bộ lọc) và `block_off_lead` (giây) cho phép tắt block sớm hơn một chút
+    khi nhiệt độ đang giảm, bù phần block còn lạnh tiếp sau khi tắt; mặc định 0 là ngưỡng tức thời.
+    Trả về (mode mới hoặc None nếu giữ nguyên, block mong muốn, quạt mong muốn).
+    """
+    mode = None
+    fan_on_threshold = target + fan_hysteresis
+    fan_off_threshold = target
+    block_off_threshold = target - block_off_offset
+
+    want_fan = fan_on
+    if temp > fan_on_threshold and not fan_on:
+        mode = 'FAST_COOLING'
+        want_fan = True
+    elif temp <= fan_off_threshold and fan_on:
+        mode = 'MAINTAINING'
+        want_fan = False
+
+    want_block = block_on
+    if want_fan and not block_on:
+        want_block = True
+    elif temp + min(rate, 0.0) * block_off_lead <= block_off_threshold and block_on:
+        mode = 'IDLE_COLD'
+        want_block = False
+    elif not want_fan and not block_on and temp > block_off_threshold:
+        mode = 'MAINTAINING'
+        want_block = True
+    return mode, want_block, want_fan
+
+
+class ThermalModel:
+    """
+    Mô hình nhiệt của tủ 2 trạng thái, học online bằng RLS (recursive least squares):
+        dT/dt = θ0 + θ1*T + θ2*c + θ3*c*fan
+        dc/dt = (block - c) / block_lag
+    c (0..1) là hiệu lực làm lạnh của block: block không lạnh ngay khi bật và còn lạnh
+    một lúc sau khi tắt. Nếu hồi quy thẳng trên trạng thái relay, phần trễ này bị gán
+    nhầm vào θ1 (dải nhiệt hẹp nên θ1 rất khó tách) và fit ra θ1 > 0.
+    θ0 + θ1*T mô tả nhiệt rò từ môi trường, θ2/θ3 là công suất làm lạnh của block/quạt.
+    Chỉ học trên các đoạn >= fit_interval giây mà relay không đổi trạng thái,
+    để nhiễu lượng tử hóa 0.25°C của cảm biến không lấn át đạo hàm.
+    """
+
+    def __init__(self, fit_interval: float = 30.0, forgetting: float = 0.998,
+                 min_samples: int = 20, block_lag: float = 90.0):
+        self.fit_interval = fit_interval
+        self.forgetting = forgetting
+        self.min_samples = min_samples
+        self.block_lag = block_lag
+        self.theta = np.zeros(4)
+        self.P = np.eye(4) * 1e3
+        self.samples = 0
+        self.samples_by_block = [0, 0]
+        self.cooling = 0.0
+        self._last_now: Optional[float] = None
+        self._seg_start: Optional[Tuple[float, float, bool, bool]] = None
+        self._seg_cooling = 0.0  # Tích phân của c trong đoạn hiện tại
+
+    @property
+    def ready(self) -> bool:
+        # Cần dữ liệu ở cả 2 trạng thái block thì mới tách được hệ số làm lạnh
+        return (self.samples >= self.min_samples and min(self.samples_by_block) >= self.min_samples // 4
+                and self.plausible)
+
+    @property
+    def plausible(self) -> bool:
+        """
+        Hệ số phải đúng vật lý: nhiệt rò kéo về môi trường (θ1 < 0) và block làm lạnh (θ2 < 0).
+        Fit sai dấu (dữ liệu ít, nhiễu, cửa mở) thì không dùng mô hình, bộ điều khiển quay về bang-bang.
+        """
+        return bool(self.theta[1] < 0 and self.theta[2] < 0)
+
+    def _advance_cooling(self, cooling: float, block_on: bool, dt: float) -> float:
+        return cooling + (float(block_on) - cooling) * min(1.0, dt / self.block_lag)
+
+    def observe(self, now: float, temp: float, block_on: bool, fan_on: bool):
+        if self._last_now is not None:
+            # Trạng thái relay đang có hiệu lực trong khoảng vừa qua là trạng thái của đoạn hiện tại
+            _, _, seg_block, _ = self._seg_start
+            dt = now - self._last_now
+            self.cooling = self._advance_cooling(self.cooling, seg_block, dt)
+            self._seg_cooling += self.cooling * dt
+        self._last_now = now
+
+        if self._seg_start is None:
+            self._seg_start = (now, temp, block_on, fan_on)
+            return
+        t0, temp0, block0, fan0 = self._seg_start
+        if (block_on, fan_on) != (block0, fan0):
+            # Relay vừa đổi: đoạn hiện tại chỉ hợp lệ nếu đủ dài, sau đó mở đoạn mới
+            if now - t0 >= self.fit_interval:
+                self._update(t0, temp0, now, temp, fan0)
+            self._start_segment(now, temp, block_on, fan_on)
+        elif now - t0 >= self.fit_interval:
+            self._update(t0, temp0, now, temp, fan0)
+            self._start_segment(now, temp, block_on, fan_on)
+
+    def _start_segment(self, now, temp, block_on, fan_on):
+        self._seg_start = (now, temp, block_on, fan_on)
+        self._seg_cooling = 0.0
+
+    def _update(self, t0, temp0, t1, temp1, fan_on):
+        cooling = self._seg_cooling / (t1 - t0)
+        x = np.array([1.0, (temp0 + temp1) / 2.0, cooling, cooling * float(fan_on)])
+        y = (temp1 - temp0) / (t1 - t0)
+        Px = self.P @ x
+        gain = Px / (self.forgetting + x @ Px)
+        self.theta = self.theta + gain * (y - x @ self.theta)
+        self.P = (self.P - np.outer(gain, Px)) / self.forgetting
+        self.samples += 1
+        # Phân loại theo hiệu lực làm lạnh thực tế thay vì trạng thái relay
+        self.samples_by_block[int(cooling >= 0.5)] += 1
+
+    def rate(self, temp: float, cooling: float, fan_on: bool) -> float:
+        """Tốc độ thay đổi nhiệt độ dự đoán (°C/s) với hiệu lực làm lạnh `cooling` (0..1)."""
+        # Quạt chỉ có thể làm lạnh thêm; θ3 > 0 là nhiễu do quạt luôn chạy cùng block
+        return float(self.theta[0] + self.theta[1] * temp
+                     + (self.theta[2] + min(self.theta[3], 0.0) * float(fan_on)) * cooling)
+
+    def trajectory(self, temp: float, block_on: bool, fan_on: bool, horizon: float,
+                   step: float = 5.0) -> Iterator[Tuple[float, float]]:
+        """Mô phỏng tiến về phía trước từ trạng thái hiện tại, sinh ra (giây, nhiệt độ)."""
+        cooling = self.cooling
+        t = 0.0
+        yield t, temp
+        while t < horizon:
+            cooling = self._advance_cooling(cooling, block_on, step / 2)
+            temp += self.rate(temp, cooling, fan_on) * step
+            cooling = self._advance_cooling(cooling, block_on, step / 2)
+            t += step
+            yield t, temp
+
+    def coast_extreme(self, temp: float, block_on: bool, fan_on: bool, horizon: float) -> float:
+        """Nhiệt độ đáy (nếu tắt block ngay) hoặc đỉnh (nếu bật block ngay) do quán tính làm lạnh."""
+        temps = [x for _, x in self.trajectory(temp, not block_on, fan_on and not block_on, horizon)]
+        return min(temps) if block_on else max(temps)
+
+    def time_to_reach(self, temp: float, level: float, block_on: bool, fan_on: bool,
+                      horizon: float, step: float = 5.0) -> Optional[float]:
+        """Số giây để chạm `level` (None nếu không trong horizon)."""
+        rising = level > temp
+        for t, x in self.trajectory(temp, block_on, fan_on, horizon, step):
+            if (rising and x >= level) or (not rising and x <= level):
+                return t
+        return None
+
+    def to_dict(self) -> dict:
+        return {"theta": [round(v, 8) for v in self.theta.tolist()],
+                "cooling": round(self.cooling, 3), "samples": self.samples,
+                "plausible": self.plausible, "ready": self.ready}
+
+
+class PredictiveController:
+    """
+    Điều khiển dự đoán: dùng mô hình nhiệt để tận dụng toàn bộ dải
+    [target - band_below, target + band_above]. Block bật khi nhiệt độ, tính cả độ trễ
+    trước khi block kịp lạnh, sẽ chạm gần biên trên, và tắt khi quán tính làm lạnh còn lại
+    sẽ kéo xuống gần biên dưới, nên mỗi chu kỳ dài hơn, ít lần khởi động hơn;
+    quạt chỉ bật khi block một mình không kéo kịp về dải.
+    """
+
+    def __init__(self, model: ThermalModel, band_below: float = 2.0, band_above: float = 2.5,
+                 margin: float = 0.5, recovery_seconds: float = 600.0):
+        self.model = model
+        self.band_below = band_below
+        self.band_above = band_above
+        self.margin = margin
+        self.recovery_seconds = recovery_seconds
+
+    def decide(self, temp: float, target: float, block_on: bool, fan_on: bool
+               ) -> Tuple[Optional[str], bool, bool]:
+        model = self.model
+        lower = target - self.band_below
+        upper = target + self.band_above
+        # Quán tính kéo dài cỡ vài lần hằng số trễ của block
+        horizon = 4 * model.block_lag
+        mode = None
+        want_block, want_fan = block_on, fan_on
+
+        if block_on:
+            # Tắt khi phần làm lạnh còn lại sau khi tắt sẽ kéo xuống sát biên dưới;
+            # đã ở dưới biên dưới thì tắt bất kể mô hình nói gì
+            if temp <= lower or model.coast_extreme(temp, True, fan_on, horizon) <= lower + self.margin:
+                mode, want_block, want_fan = 'IDLE_COLD', False, False
+        else:
+            # Bật khi đỉnh nhiệt (bật ngay bây giờ) sẽ chạm sát biên trên; đã chạm biên trên thì luôn bật
+            if temp >= upper or model.coast_extreme(temp, False, False, horizon) >= upper - self.margin:
+                mode, want_block = 'MAINTAINING', True
+
+        if want_block:
+            # Quạt chỉ cần khi block một mình không đưa nhiệt độ về dải kịp
+            if temp > upper:
+                if model.time_to_reach(temp, upper, True, False, self.recovery_seconds) is None:
+                    mode, want_fan = 'FAST_COOLING', True
+            elif fan_on and temp <= target:
+                mode, want_fan = 'MAINTAINING', False
+        return mode, want_block, want_fan
@@ -0,0 +1,167 @@
+import math
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence
+
+# Các tầng độ phân giải: (tên, độ dài bucket tính bằng giây, số mẫu giữ lại)
+# raw: 2s/mẫu x 1800 = 1 giờ, 1m x 1440 = 1 ngày, 15m x 2880 = 30 ngày
+DEFAULT_TIERS = (
+    ("raw", 0, 1800),
+    ("1m", 60, 1440),
+    ("15m", 900, 2880),
+)
+
+
+class RingBuffer:
+    """Bộ đệm vòng kích thước cố định: 1 cột thời gian + N cột tín hiệu."""
+
+    def __init__(self, capacity: int, n_fields: int):
+        self.capacity = capacity
+        self.t = np.zeros(capacity, dtype=np.float64)
+        self.v = np.full((capacity, n_fields), np.nan, dtype=np.float32)
+        self.head = 0  # Vị trí sẽ ghi tiếp theo
+        self.size = 0
+
+    def append(self, t: float, values: np.ndarray):
+        self.t[self.head] = t
+        self.v[self.head] = values
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def oldest(self) -> Optional[float]:
+        if self.size == 0:
+            return None
+        return float(self.t[(self.head - self.size) % self.capacity])
+
+    def query(self, start: float, end: float):
+        """Trả về (t, v) đã sắp theo thời gian trong khoảng [start, end]."""
+        if self.size == 0:
+            return self.t[:0], self.v[:0]
+        first = (self.head - self.size) % self.capacity
+        if first + self.size <= self.capacity:
+            t = self.t[first:first + self.size]
+            v = self.v[first:first + self.size]
+        else:
+            # Dữ liệu bị quấn vòng -> ghép 2 đoạn (chỉ khi có truy vấn)
+            t = np.concatenate((self.t[first:], self.t[:self.head]))
+            v = np.concatenate((self.v[first:], self.v[:self.head]))
+        lo = np.searchsorted(t, start, side="left")
+        hi = np.searchsorted(t, end, side="right")
+        return t[lo:hi], v[lo:hi]
+
+
+class _DownsampleTier:
+    """Gom các mẫu raw thành giá trị trung bình theo bucket cố định."""
+
+    def __init__(self, name: str, bucket_seconds: float, capacity: int, n_fields: int):
+        self.name = name
+        self.bucket_seconds = bucket_seconds
+        self.buffer = RingBuffer(capacity, n_fields)
+        self._bucket_start: Optional[float] = None
+        self._sum = np.zeros(n_fields, dtype=np.float64)
+        self._count = np.zeros(n_fields, dtype=np.int64)
+
+    def add(self, t: float, values: np.ndarray):
+        bucket_start = math.floor(t / self.bucket_seconds) * self.bucket_seconds
+        if self._bucket_start is not None and bucket_start != self._bucket_start:
+            self.flush()
+        self._bucket_start = bucket_start
+        valid = ~np.isnan(values)
+        self._sum[valid] += values[valid]
+        self._count[valid] += 1
+
+    def flush(self):
+        if self._bucket_start is None:
+            return
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(self._count > 0, self._sum / np.maximum(self._count, 1), np.nan)
+        # Gán mốc thời gian ở giữa bucket
+        self.buffer.append(self._bucket_start + self.bucket_seconds / 2, mean)
+        self._bucket_start = None
+        self._sum[:] = 0.0
+        self._count[:] = 0
+
+
+class TimeSeriesStore:
+    """
+    Lưu lịch sử của mọi tín hiệu đo/đã tính trong bộ nhớ cố định,
+    kèm các tầng lấy mẫu thưa (raw, 1 phút, 15 phút) để truy vấn nhanh.
+    """
+
+    def __init__(self, signals: Sequence[str], tiers=DEFAULT_TIERS):
+        self.signals = list(signals)
+        self._index = {name: i for i, name in enumerate(self.signals)}
+        self.raw: Optional[RingBuffer] = None
+        self.tiers: Dict[str, object] = {}
+        n = len(self.signals)
+        for name, bucket_seconds, capacity in tiers:
+            if bucket_seconds <= 0:
+                self.raw = RingBuffer(capacity, n)
+                self.tiers[name] = self.raw
+            else:
+                self.tiers[name] = _DownsampleTier(name, bucket_seconds, capacity, n)
+        self._row = np.full(n, np.nan, dtype=np.float32)
+
+    def append(self, t: float, sample: Dict[str, Optional[float]]):
+        """Ghi 1 mẫu; tín hiệu thiếu hoặc None được lưu là NaN."""
+        row = self._row
+        row.fill(np.nan)
+        for name, value in sample.items():
+            i = self._index.get(name)
+            if i is not None and value is not None:
+                row[i] = float(value)
+        for tier in self.tiers.values():
+            if isinstance(tier, RingBuffer):
+                tier.append(t, row)
+            else:
+                tier.add(t, row)
+
+    def _pick_resolution(self, start: float) -> str:
+        """
+        Chọn tầng mịn nhất vẫn còn dữ liệu từ thời điểm `start`. Nếu chưa tầng nào lùi tới
+        `start` thì chọn tầng lùi xa nhất về quá khứ (lệch trong 1 bucket vẫn ưu tiên tầng
+        mịn hơn), để truy vấn dài hơn cửa sổ raw không bị cắt còn 1 giờ cuối.
+        """
+        names = list(self.tiers)
+        coverage = []
+        for name in names:
+            tier = self.tiers[name]
+            buf = tier if isinstance(tier, RingBuffer) else tier.buffer
+            oldest = buf.oldest()
+            if oldest is None:
+                continue
+            if oldest <= start:
+                return name
+            bucket = 0.0 if isinstance(tier, RingBuffer) else tier.bucket_seconds
+            coverage.append((name, oldest, bucket))
+        if not coverage:
+            return names[0]
+        _, furthest, bucket = min(coverage, key=lambda c: c[1])
+        for name, oldest, _ in coverage:
+            if oldest <= furthest + bucket:
+                return name
+        return names[0]
+
+    def query(self, start: float, end: float, resolution: Optional[str] = None,
+              signals: Optional[Iterable[str]] = None) -> dict:
+        if resolution is None or resolution == "auto":
+            resolution = self._pick_resolution(start)
+        if resolution not in self.tiers:
+            raise ValueError(f"Độ phân giải không hợp lệ: {resolution}")
+        tier = self.tiers[resolution]
+        buf = tier if isinstance(tier, RingBuffer) else tier.buffer
+        t, v = buf.query(start, end)
+
+        names: List[str] = self.signals if signals is None else [s for s in signals if s in self._index]
+        series = {}
+        for name in names:
+            col = v[:, self._index[name]]
+            # NaN -> None để serialize ra JSON
+            series[name] = [None if math.isnan(x) else round(x, 3) for x in col.tolist()]
+        return {
+            "resolution": resolution,
+            "start": start,
+            "end": end,
+            "t": [round(x, 3) for x in t.tolist()],
+            "signals": series,
+        }
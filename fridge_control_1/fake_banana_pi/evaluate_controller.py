@@ -0,0 +1,169 @@
+"""
+Offline evaluation of the temperature controllers on a simulated cabinet.
+
+Runs the current bang-bang logic and the predictive controller against the
+same simulated fridge (same seed, same noise), each with a single raw sensor
+sample per tick and with the oversampled/filtered temperature, and reports
+energy, relay toggles and time spent outside the temperature band.
+
+    python evaluate_controller.py --hours 24 --target 12 --ambient 28
+"""
+import argparse
+import os
+import random
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+be_py_dir = os.path.abspath(os.path.join(current_dir, '../be_py'))
+if be_py_dir not in sys.path:
+    sys.path.append(be_py_dir)
+from thermal_model import ThermalModel, PredictiveController, bang_bang_decision
+from temp_filter import TemperatureFilter
+
+# Same values as be_py/main.py
+READ_INTERVAL = 2
+RELAY_COOLDOWN_SECONDS = 300
+FAN_HYSTERESIS_DEGREES = 2.5
+BLOCK_OFF_OFFSET_DEGREES = 2.0
+BLOCK_OFF_LEAD_SECONDS = 50.0
+# Same as OversampledTemperature: one MAX6675 read every 0.25 s
+SENSOR_SAMPLE_INTERVAL = 0.25
+
+
+class CabinetSimulator:
+    """
+    First-order cabinet model with a lagged cooling block, plus a sensor that
+    behaves like the MAX6675 (noise + 0.25°C quantization).
+    """
+
+    def __init__(self, ambient=28.0, start_temp=25.0, leak_per_s=1 / 3600.0,
+                 block_cooling=0.0075, fan_cooling=0.004, block_lag_s=90.0,
+                 block_power_w=85.0, fan_power_w=6.0, sensor_noise=0.15, seed=0):
+        self.ambient = ambient
+        self.temp = start_temp
+        self.leak_per_s = leak_per_s
+        self.block_cooling = block_cooling
+        self.fan_cooling = fan_cooling
+        self.block_lag_s = block_lag_s
+        self.block_power_w = block_power_w
+        self.fan_power_w = fan_power_w
+        self.sensor_noise = sensor_noise
+        self.rng = random.Random(seed)
+        self._cooling_effect = 0.0  # 0..1, the block does not cool instantly
+
+    def step(self, dt, block_on, fan_on):
+        self._cooling_effect += (float(block_on) - self._cooling_effect) * min(1.0, dt / self.block_lag_s)
+        cooling = self._cooling_effect * (self.block_cooling + (self.fan_cooling if fan_on else 0.0))
+        # Door openings: rare warm disturbances
+        disturbance = 0.5 if self.rng.random() < dt / 3600.0 else 0.0
+        self.temp += (self.leak_per_s * (self.ambient - self.temp) - cooling) * dt + disturbance
+        return (self.block_power_w * block_on + self.fan_power_w * fan_on) * dt / 3600.0
+
+    def read_sensor(self):
+        noisy = self.temp + self.rng.gauss(0.0, self.sensor_noise)
+        return round(noisy * 4) / 4.0
+
+
+def simulate(controller, hours, target, ambient, seed, use_filter=False):
+    """controller: 'bang_bang' or 'predictive'. Returns a dict of metrics."""
+    sim = CabinetSimulator(ambient=ambient, seed=seed)
+    temp_filter = TemperatureFilter()
+    sub_samples = int(READ_INTERVAL / SENSOR_SAMPLE_INTERVAL)
+    model = ThermalModel()
+    predictive = PredictiveController(model, band_below=BLOCK_OFF_OFFSET_DEGREES,
+                                      band_above=FAN_HYSTERESIS_DEGREES)
+    lower, upper = target - BLOCK_OFF_OFFSET_DEGREES, target + FAN_HYSTERESIS_DEGREES
+
+    block_on = fan_on = False
+    last_deactivation = -RELAY_COOLDOWN_SECONDS
+    energy_wh = 0.0
+    block_starts = fan_starts = 0
+    out_of_band_s = 0.0
+    settled = False
+    steps = int(hours * 3600 / READ_INTERVAL)
+
+    for k in range(steps):
+        now = k * READ_INTERVAL
+        if use_filter:
+            for i in range(sub_samples):
+                temp = temp_filter.update(sim.read_sensor(), now - (sub_samples - 1 - i) * SENSOR_SAMPLE_INTERVAL)
+            rate = temp_filter.rate
+        else:
+            temp = sim.read_sensor()
+            rate = 0.0
+        model.observe(now, temp, block_on, fan_on)
+
+        if controller == 'predictive' and model.ready:
+            _, want_block, want_fan = predictive.decide(temp, target, block_on, fan_on)
+        else:
+            _, want_block, want_fan = bang_bang_decision(
+                temp, target, block_on, fan_on, FAN_HYSTERESIS_DEGREES, BLOCK_OFF_OFFSET_DEGREES,
+                rate=rate, block_off_lead=BLOCK_OFF_LEAD_SECONDS)
+
+        if want_fan != fan_on:
+            fan_starts += want_fan
+            fan_on = want_fan
+        if want_block != block_on:
+            if want_block and now - last_deactivation < RELAY_COOLDOWN_SECONDS:
+                pass  # rejected by the compressor cooldown, as in set_block_relay_state
+            else:
+                if not want_block:
+                    last_deactivation = now
+                block_starts += want_block
+                block_on = want_block
+
+        energy_wh += sim.step(READ_INTERVAL, block_on, fan_on)
+        # Only count band violations after the initial pull-down
+        settled = settled or sim.temp <= upper
+        if settled and not (lower <= sim.temp <= upper):
+            out_of_band_s += READ_INTERVAL
+
+    return {
+        "controller": controller + ("+filter" if use_filter else ""),
+        "energy_kwh": energy_wh / 1000.0,
+        "block_starts": block_starts,
+        "fan_starts": fan_starts,
+        "toggles": 2 * (block_starts + fan_starts),
+        "out_of_band_pct": 100.0 * out_of_band_s / (steps * READ_INTERVAL),
+        "model": model.to_dict(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--target", type=float, default=12.0)
+    parser.add_argument("--ambient", type=float, default=28.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = [simulate(c, args.hours, args.target, args.ambient, args.seed, use_filter=f)
+               for c in ("bang_bang", "predictive") for f in (False, True)]
+
+    print(f"========== Controller evaluation ({args.hours:g} h, target {args.target}°C, ambient {args.ambient}°C) ==========")
+    print(f"{'controller':<19} {'kWh':>8} {'block starts':>13} {'fan starts':>11} {'toggles':>8} {'out of band':>12}")
+    for r in results:
+        print(f"{r['controller']:<19} {r['energy_kwh']:>8.3f} {r['block_starts']:>13d} "
+              f"{r['fan_starts']:>11d} {r['toggles']:>8d} {r['out_of_band_pct']:>11.2f}%")
+    by_name = {r["controller"]: r for r in results}
+
+    def delta(label, base, new):
+        # Each line changes one factor only (filter or controller) so the two effects stay separate
+        starts = (f"{100.0 * (new['block_starts'] - base['block_starts']) / base['block_starts']:+.1f}%"
+                  if base["block_starts"] else "n/a")
+        print(f"{label:<40} block starts {starts:>7}  "
+              f"energy {100.0 * (new['energy_kwh'] - base['energy_kwh']) / base['energy_kwh']:+.1f}%  "
+              f"out of band {new['out_of_band_pct'] - base['out_of_band_pct']:+.2f} pts")
+
+    print("Filter effect:")
+    for c in ("bang_bang", "predictive"):
+        delta(f"  {c}: filter vs raw", by_name[c], by_name[c + "+filter"])
+    print("Controller effect:")
+    for suffix in ("", "+filter"):
+        delta(f"  predictive vs bang_bang{' (filtered)' if suffix else ' (raw)'}",
+              by_name["bang_bang" + suffix], by_name["predictive" + suffix])
+    print(f"Learned model: {by_name['predictive']['model']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,244 @@
 from ultralytics import YOLO
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import argparse
 import cv2
 import glob
+import json
+import numpy as np
+import threading
 import time
 import os
 
-def inference_score(folder_path, weights_path, device="cpu", conf_thresh=0.50, resize_to=None, save_folder="inference_output"):
-    os.makedirs(save_folder, exist_ok=True)
 
-    model = YOLO(weights_path)
+class StageTimer:
+    """Cộng dồn thời gian từng giai đoạn, an toàn khi gọi từ nhiều thread."""
 
-    image_paths = glob.glob(folder_path + "/*.*")
-    if len(image_paths) == 0:
-        print("No images found!")
-        return
+    def __init__(self):
+        self.seconds = {"decode": 0.0, "inference": 0.0, "plot": 0.0, "write": 0.0}
+        self._lock = threading.Lock()
 
-    start_time = time.time()
+    def add(self, stage, seconds):
+        with self._lock:
+            self.seconds[stage] += seconds
+
+
+def _decode(img_path, resize_to, timer):
+    t0 = time.perf_counter()
+    img = cv2.imread(img_path)
+    if img is not None:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+        if resize_to is not None:
+            img = cv2.resize(img, resize_to)
+    timer.add("decode", time.perf_counter() - t0)
+    return img_path, img
+
+
+def _plot_and_write(result, save_path, timer):
+    t0 = time.perf_counter()
+    result_img = result.plot()
+    t1 = time.perf_counter()
+    cv2.imwrite(save_path, result_img)
+    t2 = time.perf_counter()
+    timer.add("plot", t1 - t0)
+    timer.add("write", t2 - t1)
+
+
+# Cache đầu vào đã tiền xử lý (letterbox + chuẩn hóa) dạng memmap, dùng cho benchmark lặp lại
+CACHE_INDEX_FILE = "index.json"
+CACHE_DATA_FILE = "inputs.npy"
+LETTERBOX_COLOR = 114  # giống màu viền ultralytics dùng khi letterbox
+
+
+def letterbox(img, imgsz):
+    """Resize giữ tỉ lệ vào khung imgsz x imgsz, viền xám ở giữa; trả về (ảnh, tỉ lệ, (pad_x, pad_y))."""
+    h, w = img.shape[:2]
+    ratio = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    if (new_w, new_h) != (w, h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    pad_x, pad_y = (imgsz - new_w) // 2, (imgsz - new_h) // 2
+    out = np.full((imgsz, imgsz, 3), LETTERBOX_COLOR, dtype=np.uint8)
+    out[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = img
+    return out, ratio, (pad_x, pad_y)
+
+
+def _source_signature(image_paths, imgsz, resize_to):
+    files = []
+    for path in image_paths:
+        st = os.stat(path)
+        files.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+    return {"imgsz": imgsz, "resize_to": list(resize_to) if resize_to else None, "files": files}
+
+
+def load_input_cache(image_paths, imgsz, cache_dir, resize_to=None):
+    """
+    Trả về (memmap N x 3 x imgsz x imgsz float32, danh sách path). Cache được dựng lại khi danh
+    sách file, kích thước/mtime của file nguồn, imgsz hoặc resize_to thay đổi.
+    Kích thước: N * 3 * imgsz^2 * 4 byte (~4.9 MB/ảnh ở imgsz=640).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, CACHE_INDEX_FILE)
+    data_path = os.path.join(cache_dir, CACHE_DATA_FILE)
+    signature = _source_signature(image_paths, imgsz, resize_to)
+
+    if os.path.exists(index_path) and os.path.exists(data_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("signature") == signature:
+            # mmap "c" (copy-on-write): mảng ghi được nên torch.from_numpy không cảnh báo, file không bị sửa
+            inputs = np.load(data_path, mmap_mode="c")
+            return inputs[:len(index["paths"])], index["paths"]
+        print("[CACHE] Source files or imgsz changed, rebuilding...")
 
-    for img_path in image_paths:
-        img = cv2.imread(img_path)
-        img = cv2.cvtColor(img,cv2.COLOR_RGB2BGR)
+    t0 = time.perf_counter()
+    # Ghi thẳng vào memmap từng ảnh một, không giữ cả tập trong RAM; ảnh lỗi để lại hàng thừa ở cuối
+    tmp_path = data_path + ".tmp.npy"
+    inputs = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32,
+                                       shape=(len(image_paths), 3, imgsz, imgsz))
+    paths = []
+    for path in image_paths:
+        img = cv2.imread(path)
         if img is None:
             continue
-
         if resize_to is not None:
             img = cv2.resize(img, resize_to)
+        # Giữ thứ tự kênh của ảnh đọc bằng imread: đúng thứ tự mà model nhận được ở nhánh
+        # numpy (_decode đảo kênh, ultralytics đảo lại) nên kết quả 2 nhánh khớp nhau
+        boxed, _, _ = letterbox(img, imgsz)
+        inputs[len(paths)] = boxed.transpose(2, 0, 1) / np.float32(255.0)
+        paths.append(path)
+    inputs.flush()
+    del inputs
+    os.replace(tmp_path, data_path)
+    with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"signature": signature, "paths": paths, "shape": [len(image_paths), 3, imgsz, imgsz],
+                   "dtype": "float32"}, f)
+    os.replace(index_path + ".tmp", index_path)
+    print(f"[CACHE] Built {len(paths)} inputs in {time.perf_counter() - t0:.1f}s -> {data_path}")
+    return np.load(data_path, mmap_mode="c")[:len(paths)], paths
+
+
+def _decoded_batches(image_paths, batch_size, decode_workers, resize_to, timer):
+    """Giải mã trước tối đa 2 batch bằng pool thread; trả về list (path, ảnh) theo batch."""
+    prefetch = batch_size * 2
+    with ThreadPoolExecutor(decode_workers, thread_name_prefix="decode") as decoders:
+        paths = iter(image_paths)
+        decoding = deque()
+
+        def fill():
+            while len(decoding) < prefetch:
+                path = next(paths, None)
+                if path is None:
+                    return
+                decoding.append(decoders.submit(_decode, path, resize_to, timer))
+
+        fill()
+        while decoding:
+            batch = []
+            while decoding and len(batch) < batch_size:
+                img_path, img = decoding.popleft().result()
+                fill()
+                if img is not None:
+                    batch.append((img_path, img))
+            if batch:
+                yield [p for p, _ in batch], [img for _, img in batch]
+
+
+def _cached_batches(inputs, paths, batch_size, timer):
+    """Mỗi batch là view liên tục trên memmap, torch.from_numpy không sao chép."""
+    import torch
+    for start in range(0, len(paths), batch_size):
+        t0 = time.perf_counter()
+        batch = torch.from_numpy(inputs[start:start + batch_size])
+        timer.add("decode", time.perf_counter() - t0)
+        yield paths[start:start + batch_size], batch
+
+
+def inference_score(folder_path, weights_path, device="cpu", conf_thresh=0.50, resize_to=None,
+                    save_folder="inference_output", batch_size=4, decode_workers=2, write_workers=2,
+                    imgsz=640, cache_dir=None):
+    """
+    Pipeline: pool thread đọc + giải mã ảnh trước (prefetch), model suy luận theo batch,
+    pool thread khác vẽ + mã hóa JPEG. cv2.imread/imwrite nhả GIL nên các bước chạy chồng lên nhau.
+    Có cache_dir thì đầu vào đọc từ cache memmap đã letterbox sẵn (xem load_input_cache).
+    """
+    os.makedirs(save_folder, exist_ok=True)
 
-        results = model(img, device=device, verbose=False, conf=conf_thresh)
+    model = YOLO(weights_path)
+
+    image_paths = sorted(glob.glob(folder_path + "/*.*"))
+    if len(image_paths) == 0:
+        print("No images found!")
+        return
 
-        result_img = results[0].plot()
-        filename = os.path.basename(img_path)
-        save_path = os.path.join(save_folder, filename)
-        cv2.imwrite(save_path, result_img)
+    timer = StageTimer()
+    num_imgs = 0
+    # Giới hạn số kết quả chờ ghi để RAM không phình theo kích thước thư mục
+    max_pending_writes = write_workers * 4
 
+    if cache_dir is not None:
+        inputs, cached_paths = load_input_cache(image_paths, imgsz, cache_dir, resize_to)
+        batches = _cached_batches(inputs, cached_paths, batch_size, timer)
+    else:
+        batches = _decoded_batches(image_paths, batch_size, decode_workers, resize_to, timer)
+
+    start_time = time.time()
+    with ThreadPoolExecutor(write_workers, thread_name_prefix="write") as writers:
+        writing = deque()
+        for batch_paths, batch in batches:
+            t0 = time.perf_counter()
+            results = model(batch, device=device, verbose=False, conf=conf_thresh, imgsz=imgsz)
+            timer.add("inference", time.perf_counter() - t0)
+            num_imgs += len(batch_paths)
+
+            for img_path, result in zip(batch_paths, results):
+                save_path = os.path.join(save_folder, os.path.basename(img_path))
+                writing.append(writers.submit(_plot_and_write, result, save_path, timer))
+            while len(writing) > max_pending_writes:
+                writing.popleft().result()
+        for future in writing:
+            future.result()
     end_time = time.time()
 
+    if num_imgs == 0:
+        print("No readable images!")
+        return
+
     total_time = end_time - start_time
-    num_imgs = len(image_paths)
 
     fps = num_imgs / total_time
     ms_per_image = (total_time / num_imgs) * 1000
 
     print("========== Inference Benchmark ==========")
     print(f"Total images: {num_imgs}")
+    print(f"Batch size: {batch_size} | decode workers: {decode_workers} | write workers: {write_workers}"
+          + (f" | input cache: {cache_dir}" if cache_dir else ""))
     print(f"Total time: {total_time:.3f} sec")
-    print(f"FPS: {fps:.2f}")
+    print(f"FPS (end-to-end): {fps:.2f}")
     print(f"ms per image: {ms_per_image:.2f} ms")
+    # decode/plot/write chạy song song nên tổng các giai đoạn có thể lớn hơn tổng thời gian
+    for stage, seconds in timer.seconds.items():
+        print(f"  {stage:<9} {seconds:8.3f} sec  {seconds / num_imgs * 1000:8.2f} ms/image")
+    print(f"FPS (inference only): {num_imgs / timer.seconds['inference']:.2f}")
     print(f"Saved results to: {save_folder}")
     print("=========================================")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suy luận + đo tốc độ trên thư mục ảnh")
+    parser.add_argument("--folder", default="/home/rpi/project/test")
+    parser.add_argument("--weights", default="/home/rpi/project/yolo11n_v2.pt")
+    parser.add_argument("--save-folder", default="/home/rpi/project/output")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--cache-dir", default=None, help="dùng/dựng cache memmap đầu vào đã tiền xử lý")
+    args = parser.parse_args()
     inference_score(
-        folder_path="/home/rpi/project/test",
-        weights_path="/home/rpi/project/yolo11n_v2.pt",
+        folder_path=args.folder,
+        weights_path=args.weights,
         device="cpu",
-        save_folder="/home/rpi/project/output"
+        save_folder=args.save_folder,
+        batch_size=args.batch_size,
+        imgsz=args.imgsz,
+        cache_dir=args.cache_dir,
     )
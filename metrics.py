@@ -0,0 +1,175 @@
+import asyncio
+import bisect
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# Biên các bucket (giây) mặc định cho histogram độ trễ
+DEFAULT_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+
+def _format_labels(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels.items())
+    if extra is not None:
+        items.append(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Counter:
+    """Bộ đếm tăng dần. Không khóa: ghi từ 1 thread, đọc từ thread khác là đủ an toàn."""
+    type_name = "counter"
+
+    def __init__(self, labels: Dict[str, str]):
+        self.labels = labels
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def samples(self, name: str):
+        yield name + _format_labels(self.labels), self.value
+
+
+class Gauge:
+    """Giá trị tức thời; nếu có `fn` thì giá trị được lấy khi scrape."""
+    type_name = "gauge"
+
+    def __init__(self, labels: Dict[str, str], fn: Optional[Callable[[], float]] = None):
+        self.labels = labels
+        self.fn = fn
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self, name: str):
+        value = self.fn() if self.fn is not None else self.value
+        yield name + _format_labels(self.labels), float(value)
+
+
+class Histogram:
+    """Histogram bucket cố định, O(log n) mỗi lần ghi, không cấp phát thêm."""
+    type_name = "histogram"
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, labels: Optional[Dict[str, str]] = None):
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # bucket cuối = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Ước lượng phân vị bằng biên trên của bucket chứa nó."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 6),
+        }
+
+    def samples(self, name: str):
+        cumulative = 0
+        for upper, c in zip(self.buckets, self.counts):
+            cumulative += c
+            yield name + "_bucket" + _format_labels(self.labels, ("le", repr(float(upper)))), cumulative
+        yield name + "_bucket" + _format_labels(self.labels, ("le", "+Inf")), self.count
+        yield name + "_sum" + _format_labels(self.labels), self.sum
+        yield name + "_count" + _format_labels(self.labels), self.count
+
+
+class MetricsRegistry:
+    """Tập hợp các metric theo tên, xuất ra định dạng text của Prometheus."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Tuple[str, str, list]] = {}
+
+    def _register(self, name: str, help_text: str, metric):
+        entry = self._metrics.setdefault(name, (metric.type_name, help_text, []))
+        if entry[0] != metric.type_name:
+            raise ValueError(f"Metric {name} đã được đăng ký với kiểu {entry[0]}")
+        entry[2].append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, **labels) -> Counter:
+        return self._register(name, help_text, Counter(labels))
+
+    def gauge(self, name: str, help_text: str, fn: Optional[Callable[[], float]] = None, **labels) -> Gauge:
+        return self._register(name, help_text, Gauge(labels, fn))
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS,
+                  **labels) -> Histogram:
+        return self._register(name, help_text, Histogram(buckets, labels))
+
+    def render(self) -> str:
+        lines = []
+        for name, (type_name, help_text, metrics) in self._metrics.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {type_name}")
+            for metric in metrics:
+                for sample_name, value in metric.samples(name):
+                    lines.append(f"{sample_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+MAX_HEADER_LINES = 100  # Scraper thật gửi vài dòng; nhiều hơn thì coi là request hỏng
+
+
+async def _handle_scrape(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, registry: MetricsRegistry):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+        # Bỏ qua phần header còn lại
+        for _ in range(MAX_HEADER_LINES):
+            line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            if line in (b"\r\n", b"\n", b""):
+                headers_done = True
+                break
+        else:
+            headers_done = False
+        parts = request_line.decode("latin-1").split()
+        if not headers_done:
+            status, body = "431 Request Header Fields Too Large", b"too many header lines\n"
+        elif len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", registry.render().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+        # ValueError: readline vượt giới hạn 64 KiB của stream (dòng request/header quá dài)
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str = "127.0.0.1", port: int = 9101,
+                               registry: MetricsRegistry = REGISTRY) -> asyncio.AbstractServer:
+    """Chạy endpoint /metrics trên event loop hiện tại (không cần thread hay thư viện ngoài)."""
+    return await asyncio.start_server(
+        lambda r, w: _handle_scrape(r, w, registry), host, port
+    )
@@ -0,0 +1,344 @@
+"""
+Micro-benchmark các hàm Python chạy mỗi frame / mỗi tick, không cần camera, GPU hay phần cứng:
+đầu vào cố định (seed), mỗi bench đo kiểu timeit (tắt GC, tự chọn số vòng, lặp nhiều lần, lấy
+trung vị) và in kèm "check" (dấu vân tay của kết quả) để thấy ngay khi hành vi thay đổi.
+
+    python microbench.py --save             # ghi baseline cho máy này (baselines/microbench_<arch>.json cạnh file này)
+    python microbench.py                    # so với baseline, thoát mã 1 nếu có bench chậm hơn ngưỡng, 2 nếu chưa có baseline
+    python microbench.py --only timestep --repeat 9
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+import zlib
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+be_py_dir = os.path.join(current_dir, "fridge_control_1", "be_py")
+if be_py_dir not in sys.path:
+    sys.path.append(be_py_dir)
+
+from config import FRAME_WIDTH, FRAME_HEIGHT, STABLE_FRAME_COUNT
+
+BASELINE_DIR = os.path.join(current_dir, "baselines")
+NUM_CLASSES = 80
+PRODUCT = {
+    "name": "Château Montrose Saint-Estèphe Grand Cru Classé 2015",
+    "origin": "Bordeaux, Pháp",
+    "abv": "13.5%",
+    "grape": "Cabernet Sauvignon, Merlot, Cabernet Franc, Petit Verdot",
+    "target_temp": "16-18°C",
+    "taste": "Màu đỏ ruby đậm, hương lý chua đen, mận chín, gỗ tuyết tùng và thuốc lá; tannin chắc, "
+             "cấu trúc mạnh mẽ, hậu vị dài với chút cam thảo và sô-cô-la đen. " * 2,
+    "pair": "Thăn bò nướng, sườn cừu, vịt quay, phô mai cứng lâu năm như Comté hoặc Parmigiano.",
+}
+
+
+def _quiet():
+    # TimeStepLogger/ShowActivate in thông báo ra stdout; tắt khi dựng trạng thái ban đầu
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def _primed_logger(stack):
+    """TimeStepLogger đang theo dõi NUM_CLASSES class, tất cả đã qua STABLE_FRAME_COUNT frame."""
+    from timestep_logger import TimeStepLogger
+    log_dir = stack.enter_context(tempfile.TemporaryDirectory())
+    logger = TimeStepLogger(log_dir=log_dir)
+    names = [f"class_{i:02d}" for i in range(NUM_CLASSES)]
+    with _quiet():
+        for _ in range(STABLE_FRAME_COUNT):
+            for cid, name in enumerate(names):
+                logger.log_first_detect(cid, name, 0.87)
+    return logger, names
+
+
+def bench_log_first_detect(stack):
+    logger, names = _primed_logger(stack)
+
+    def run():
+        for cid, name in enumerate(names):
+            logger.log_first_detect(cid, name, 0.87)
+        return sum(logger.logged_initial.values())
+    return run
+
+
+def bench_check_active_timeouts(stack):
+    logger, _ = _primed_logger(stack)
+
+    def run():
+        return logger.check_active_timeouts()
+    return run
+
+
+def _raw_detections(n, seed=0):
+    """Box giống đầu ra YOLO trước lọc: cụm quanh vài vị trí kệ, score trải đều, class ngẫu nhiên."""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform([40, 40], [FRAME_WIDTH - 40, FRAME_HEIGHT - 40], size=(12, 2))
+    c = centers[rng.integers(0, len(centers), n)] + rng.normal(0, 6, (n, 2))
+    wh = rng.uniform(30, 90, (n, 2))
+    boxes = np.hstack([c - wh / 2, c + wh / 2]).astype(np.float32)
+    scores = rng.uniform(0.05, 0.99, n).astype(np.float32)
+    classes = rng.integers(0, 8, n).astype(np.float32)
+    return boxes, scores, classes
+
+
+def bench_filter_detections(stack):
+    from postprocess import filter_detections
+    boxes, scores, classes = _raw_detections(300)
+
+    def run():
+        return len(filter_detections(boxes, scores, classes)[0])
+    return run
+
+
+def bench_global_nms(stack):
+    from tiled_inference import global_nms
+    boxes, scores, classes = _raw_detections(120, seed=1)
+
+    def run():
+        return global_nms(boxes, scores, classes).tolist()
+    return run
+
+
+def _show_activate():
+    from show_activate import ShowActivate
+    with _quiet():
+        panel = ShowActivate()
+    panel.db = {"wine": PRODUCT}
+    panel.show_specific_item("wine")
+    return panel
+
+
+def bench_show_activate_render(stack):
+    # get_image() trả panel đã cache; đo phần vẽ lại (PIL) chạy mỗi khi đổi món
+    panel = _show_activate()
+    return panel.render_image
+
+
+def bench_wrapped_text(stack):
+    from PIL import Image, ImageDraw
+    panel = _show_activate()
+    draw = ImageDraw.Draw(Image.new("RGB", (FRAME_WIDTH, FRAME_HEIGHT)))
+
+    def run():
+        return panel.draw_wrapped_text_pil(draw, PRODUCT["taste"], 45, 40, FRAME_WIDTH - 50, 16, (230, 230, 230))
+    return run
+
+
+class _FakeSensor:
+    def read_temperature(self):
+        return 12.25
+
+
+def bench_broadcast_status(stack):
+    """
+    Payload của be_py/main.py broadcast_status (cùng hàm status.build_status_payload, cùng đối tượng
+    thật: ThermalModel, DeadlineScheduler, Histogram, OversampledTemperature) rồi json.dumps.
+    """
+    from memory_monitor import MemoryMonitor
+    from metrics import Histogram
+    from scheduler import DeadlineScheduler
+    from status import build_status_payload
+    from temp_filter import OversampledTemperature
+    from thermal_model import ThermalModel
+
+    rng = np.random.default_rng(2)
+    model = ThermalModel()
+    temp, block = 14.0, False
+    for t in range(0, 6 * 3600, 2):
+        if t % 600 == 0:
+            block = not block
+        temp += (-0.002 if block else 0.001) * 2
+        model.observe(float(t), temp, block, False)
+    schedulers = []
+    for name in ("control", "power"):
+        sched = DeadlineScheduler(2, name)
+        for v in rng.exponential(0.002, 500):
+            sched.lateness.observe(float(v))
+        sched.ticks = 500
+        schedulers.append(sched)
+    lag = Histogram()
+    for v in rng.exponential(0.001, 500):
+        lag.observe(float(v))
+    reader = OversampledTemperature(_FakeSensor())
+    for i in range(200):
+        reader.filter.update(12.0 + 0.25 * (i % 3), i * 0.25)
+        reader.samples += 1
+    # RSS cố định để độ dài payload (và "check") không đổi giữa các lần chạy
+    memory = MemoryMonitor(tracemalloc_frames=0)
+    memory.baseline_rss, memory.baseline_time = 180 * 1024 * 1024, 0.0
+    for i in range(12):
+        memory.history.append((i * 300.0, (180 + i) * 1024 * 1024))
+
+    def run():
+        status_payload = build_status_payload(
+            temperature_reader=reader,
+            humidity=71.234,
+            target_temp=12.0,
+            target_humidity=75.0,
+            system_mode="MAINTAINING",
+            block_relay_on=True,
+            fan_relay_on=False,
+            humidity_relay_on=False,
+            power_watts=84.3172,
+            cooldown_seconds_remaining=-12.5,
+            controller_mode="bang_bang",
+            thermal_model=model,
+            # Cùng khóa với loop_timing_stats() của main.py
+            loop_timing={
+                "control": schedulers[0].stats(),
+                "power": schedulers[1].stats(),
+                "event_loop_lag_seconds": lag.summary(),
+                "broadcasts_skipped": 0,
+            },
+            readiness={"control_ready": True, "detector": "ready"},
+            memory_monitor=memory,
+        )
+        return len(json.dumps(status_payload))
+    return run
+
+
+class FakeADC:
+    """Thay cho AnalogIn của ADS1115: dòng 50 Hz lấy mẫu ở 860 SPS, offset 2.5 V, có nhiễu cố định."""
+
+    def __init__(self, amps_rms=0.4, sensitivity=0.100, samples=860, seed=3):
+        rng = np.random.default_rng(seed)
+        t = np.arange(samples) / 860.0
+        wave = 2.5 + amps_rms * math.sqrt(2) * sensitivity * np.sin(2 * math.pi * 50 * t)
+        self._values = (wave + rng.normal(0, 0.002, samples)).tolist()
+        self._i = 0
+
+    @property
+    def voltage(self):
+        v = self._values[self._i]
+        self._i = (self._i + 1) % len(self._values)
+        return v
+
+
+def bench_get_rms_current(stack):
+    from current_sensor import get_rms_current
+
+    def run():
+        adc = FakeADC()
+        return round(get_rms_current(adc), 6)
+    return run
+
+
+BENCHES = {
+    "timestep.log_first_detect[80 classes]": bench_log_first_detect,
+    "timestep.check_active_timeouts[80 classes]": bench_check_active_timeouts,
+    "postprocess.filter_detections[300 boxes]": bench_filter_detections,
+    "tiled_inference.global_nms[120 boxes]": bench_global_nms,
+    "show_activate.render_image": bench_show_activate_render,
+    "show_activate.draw_wrapped_text_pil": bench_wrapped_text,
+    "controller.broadcast_status_payload": bench_broadcast_status,
+    "controller.get_rms_current[fake ADC]": bench_get_rms_current,
+}
+
+
+def fingerprint(value):
+    """Dấu vân tay ngắn của kết quả để so hành vi giữa các lần chạy (ảnh: crc32 của pixel)."""
+    if isinstance(value, np.ndarray):
+        return f"{value.shape}:{zlib.crc32(np.ascontiguousarray(value).tobytes()):08x}"
+    return f"{zlib.crc32(repr(value).encode('utf-8')):08x}"
+
+
+def measure(run, repeat, min_time):
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    number = max(1, int(math.ceil(number * min_time / 0.2)))
+    per_call = sorted(t / number for t in timer.repeat(repeat=repeat, number=number))
+    return {
+        "loops": number,
+        "median_us": round(statistics.median(per_call) * 1e6, 3),
+        "min_us": round(per_call[0] * 1e6, 3),
+        "check": fingerprint(run()),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Đánh dấu bench có trung vị chậm hơn baseline quá `tolerance`; trả về danh sách tên bench chậm đi."""
+    regressions = []
+    for name, r in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old is None or "error" in r or "error" in old:
+            continue
+        r["change"] = round(r["median_us"] / old["median_us"] - 1, 3)
+        r["check_changed"] = r["check"] != old["check"]
+        if r["change"] > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    default_baseline = os.path.join(BASELINE_DIR, f"microbench_{platform.machine()}.json")
+    parser = argparse.ArgumentParser(description="Micro-benchmark các hàm nóng (không cần camera/GPU)")
+    parser.add_argument("--only", nargs="+", default=None, help="chỉ chạy bench có tên chứa chuỗi này")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="thời gian tối thiểu mỗi lần lặp (giây)")
+    parser.add_argument("--baseline", default=default_baseline)
+    parser.add_argument("--save", action="store_true", help="ghi kết quả lần này làm baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="ngưỡng coi là chậm đi (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    results = {}
+    for name, setup in BENCHES.items():
+        if args.only and not any(s in name for s in args.only):
+            continue
+        with contextlib.ExitStack() as stack:
+            try:
+                run = setup(stack)
+            except ImportError as e:
+                # cv2/PIL chưa cài trên máy dev: bỏ qua bench đó thay vì dừng cả bộ
+                results[name] = {"error": f"skipped ({e})"}
+                continue
+            results[name] = measure(run, args.repeat, args.min_time)
+
+    baseline, regressions = None, []
+    if not args.save and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+
+    print("========== Micro-benchmarks ==========")
+    print(f"{'bench':<44} {'loops':>7} {'median us':>11} {'min us':>11} {'vs base':>8}  check")
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:<44} {r['error']}")
+            continue
+        change = f"{r['change']:+.1%}" if "change" in r else "-"
+        flags = ("  <-- SLOWER" if name in regressions else "") + \
+                ("  <-- OUTPUT CHANGED" if r.get("check_changed") else "")
+        print(f"{name:<44} {r['loops']:>7} {r['median_us']:>11.2f} {r['min_us']:>11.2f} {change:>8}  "
+              f"{r['check']}{flags}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"meta": {"machine": platform.machine(), "python": platform.python_version(),
+                                "numpy": np.__version__, "repeat": args.repeat},
+                       "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved baseline to: {args.baseline}")
+    elif baseline is None:
+        print(f"NO BASELINE at {args.baseline}: nothing was compared (run with --save on this machine "
+              f"and commit the file)")
+    print("======================================")
+    if regressions:
+        sys.exit(1)
+    if baseline is None and not args.save:
+        # Không có baseline thì không phát hiện được chậm đi: báo lỗi thay vì coi như đạt
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+import argparse
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from config import (
+    CAMERA_FORMAT, CAMERA_SOURCES, MULTI_CAMERA_BATCH,
+    MODEL_WATCH_INTERVAL, DARK_FRAME_INTERVAL,
+    TILED_INFERENCE, CASCADE_ENABLED, SHADOW_MODEL_PATH
+)
+from timestep_logger import TimeStepLogger
+from metrics import REGISTRY
+from YoloDetector import YOLOCameraDetector, update_light_state
+from display import DisplayComposer
+
+
+class FrameSource:
+    """Một nguồn ảnh: Picamera2 (camera_num kiểu int) hoặc cv2.VideoCapture (chuỗi: USB/file/rtsp)."""
+
+    def __init__(self, source, width, height):
+        self.source = source
+        self.width = width
+        self.height = height
+        if isinstance(source, int):
+            from picamera2 import Picamera2
+            self.picam2 = Picamera2(camera_num=source)
+            try:
+                cfg = self.picam2.create_still_configuration(
+                    main={"format": CAMERA_FORMAT, "size": (width, height)}
+                )
+                self.picam2.configure(cfg)
+                self.picam2.start()
+            except Exception:
+                self.picam2.close()
+                raise
+            self.capture = None
+        else:
+            self.picam2 = None
+            self.capture = cv2.VideoCapture(source)
+            if not self.capture.isOpened():
+                self.capture.release()
+                raise RuntimeError(f"Cannot open frame source {source}")
+
+    def read(self):
+        """Trả về frame BGR đúng kích thước cấu hình."""
+        if self.picam2 is not None:
+            return cv2.cvtColor(self.picam2.capture_array(), cv2.COLOR_RGB2BGR)
+        ok, frame = self.capture.read()
+        if not ok:
+            # File video: quay lại đầu để chạy benchmark/replay liên tục
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture.read()
+            if not ok:
+                raise RuntimeError(f"Frame source {self.source} returned no frame")
+        if frame.shape[1] != self.width or frame.shape[0] != self.height:
+            frame = cv2.resize(frame, (self.width, self.height))
+        return frame
+
+    def close(self):
+        if self.picam2 is not None:
+            self.picam2.stop()
+            self.picam2.close()
+        else:
+            self.capture.release()
+
+
+class CameraSlot:
+    """Trạng thái riêng của 1 camera: nguồn ảnh, logger, box cho click chuột, chế độ cửa đóng."""
+
+    def __init__(self, index, source, width, height, log_dir):
+        self.index = index
+        self.name = f"cam{index}"
+        self.source = FrameSource(source, width, height)
+        self.logger = TimeStepLogger(log_dir=log_dir)
+        self.boxes_ui = []
+        self.frame = None
+        self.low_power = False
+        self._dark_frames = 0
+        self._dark_since = None
+        self.frames_total = REGISTRY.counter("detector_camera_frames_total",
+                                             "Số frame đã suy luận theo camera", camera=self.name)
+
+    def update_light_state(self, frame):
+        return update_light_state(self, frame, self.name)
+
+
+class MultiCameraDetector(YOLOCameraDetector):
+    """
+    Nhiều camera dùng chung 1 model: frame của các camera đang sáng được gộp vào
+    1 lần model.predict, kết quả trả về đúng TimeStepLogger và ô hiển thị của camera đó.
+    Dùng lại phần hot-swap model, governor và vẽ box của YOLOCameraDetector.
+    """
+
+    def __init__(self, sources=CAMERA_SOURCES, batch=MULTI_CAMERA_BATCH):
+        print(f"[INIT] Loading Model & {len(sources)} cameras...")
+        # Không gọi YOLOCameraDetector.__init__ (mở 1 Picamera2, tile/cascade/shadow chỉ cho 1 camera)
+        self._init_state()
+        # Cache theo tile, cache danh tính của cascade và so sánh shadow đều giả định 1 luồng frame
+        unsupported = [name for name, enabled in (("TILED_INFERENCE", TILED_INFERENCE),
+                                                  ("CASCADE_ENABLED", CASCADE_ENABLED),
+                                                  ("SHADOW_MODEL_PATH", SHADOW_MODEL_PATH)) if enabled]
+        if unsupported:
+            print(f"[WARNING] {', '.join(unsupported)} not supported by MultiCameraDetector; ignored.")
+        self.batch = batch
+        self.batch_size_gauge = REGISTRY.gauge("detector_batch_size", "Số frame trong lần predict gần nhất")
+
+        t0 = time.perf_counter()
+        self.slots = []
+        self._capture_pool = None
+        try:
+            for i, source in enumerate(sources):
+                # 1 camera: giữ thư mục log cũ; nhiều camera: logs/cam<N>/ để CSV không ghi đè nhau
+                self.slots.append(CameraSlot(i, source, self.frame_width, self.frame_height,
+                                             "logs" if len(sources) == 1 else f"logs/cam{i}"))
+            self.logger = self.slots[0].logger
+            self._capture_pool = ThreadPoolExecutor(max_workers=len(self.slots), thread_name_prefix="capture")
+            camera_started = time.perf_counter()
+            self.init_profile["camera_start"] = camera_started - t0
+            self._load_model(camera_started)
+        except Exception:
+            # Camera sau (hoặc model) lỗi: dừng và giải phóng các camera đã mở, nếu không
+            # Picamera2 vẫn giữ thiết bị và lần khởi tạo lại sẽ báo camera đang bận
+            self.close()
+            raise
+        self.init_profile["total"] = time.perf_counter() - t0
+
+        self.grid_cols = math.ceil(math.sqrt(len(self.slots)))
+        self.grid_rows = math.ceil(len(self.slots) / self.grid_cols)
+        self.display = DisplayComposer(self.frame_width, self.frame_height, self.grid_rows, self.grid_cols)
+
+        if MODEL_WATCH_INTERVAL > 0:
+            threading.Thread(target=self._watch_model_file, name="model-watcher", daemon=True).start()
+        print("[READY] System Started!")
+
+    def _capture_all(self):
+        """Chụp song song mọi camera (capture_array chặn tới khi có frame mới)."""
+        frames = list(self._capture_pool.map(lambda slot: slot.source.read(), self.slots))
+        for slot, frame in zip(self.slots, frames):
+            slot.frame = frame
+
+    def _infer(self, frames, imgsz):
+        """Gộp batch (1 lần predict) hoặc lần lượt từng frame, trả về 1 result mỗi frame."""
+        if self.batch:
+            return self.model.predict(frames, verbose=False, imgsz=imgsz)
+        return [self.model.predict(frame, verbose=False, imgsz=imgsz)[0] for frame in frames]
+
+    def mouse_callback(self, event, x, y, flags, param):
+        if event == cv2.EVENT_LBUTTONDOWN:
+            col, row = x // self.frame_width, y // self.frame_height
+            if col >= self.grid_cols:
+                return  # click vào panel thông tin
+            index = row * self.grid_cols + col
+            if index >= len(self.slots):
+                return
+            tx, ty = x - col * self.frame_width, y - row * self.frame_height
+            for (x1, y1, x2, y2, cls_name) in self.slots[index].boxes_ui:
+                if x1 <= tx <= x2 and y1 <= ty <= y2:
+                    print(f"[CLICK] {self.slots[index].name} selected: {cls_name}")
+                    self.viewer.show_specific_item(cls_name)
+                    return
+        elif event == cv2.EVENT_RBUTTONDOWN:
+            self.viewer.close_panel()
+            print("[CLICK] Closed Panel")
+
+    def run(self):
+        window_name = "Smart Fridge System"
+        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+        cv2.setMouseCallback(window_name, self.mouse_callback)
+
+        fps = 0.0
+        try:
+            while True:
+                if self._pending_model is not None:
+                    self._apply_pending_model()
+                frame_start = time.perf_counter()
+                self._capture_all()
+                active = [slot for slot in self.slots if not slot.update_light_state(slot.frame)]
+                self.low_power = not active
+                self.low_power_gauge.set(1 if self.low_power else 0)
+                if not active:
+                    self.is_ready = True
+                    key = cv2.waitKey(int(DARK_FRAME_INTERVAL * 1000)) & 0xFF
+                    if key == ord('q'):
+                        break
+                    continue
+
+                imgsz = self.governor.imgsz if self.governor is not None else self.frame_width
+                infer_start = time.perf_counter()
+                results = self._infer([slot.frame for slot in active], imgsz)
+                self.inference_seconds.observe(time.perf_counter() - infer_start)
+                self.batch_size_gauge.set(len(active))
+                if not self.is_ready:
+                    self.init_profile["first_inference"] = time.perf_counter() - infer_start
+                    self.is_ready = True
+
+                for slot in self.slots:
+                    annotated = self.display.put(slot.index, slot.frame)
+                    if slot in active:
+                        r = results[active.index(slot)]
+                        boxes, scores, classes = self._result_arrays(r)
+                        slot.boxes_ui = self._draw_detections(boxes, scores, classes, r.names,
+                                                              annotated, slot.logger)
+                        slot.frames_total.inc()
+                        deleted = slot.logger.check_active_timeouts()
+                        if deleted is not None:
+                            self.delected_item = deleted
+                    else:
+                        slot.boxes_ui = []
+                        cv2.putText(annotated, "PAUSED", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
+                    cv2.putText(annotated, slot.name, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+                if self.viewer.is_visible:
+                    final_display = self.display.with_panel(self.viewer.get_image())
+                else:
+                    final_display = self.display.grid
+
+                cv2.imshow(window_name, final_display)
+
+                frame_time = time.perf_counter() - frame_start
+                self.frame_seconds.observe(frame_time)
+                self.frames_total.inc(len(active))
+                fps = 0.9 * fps + 0.1 / frame_time if fps else 1.0 / frame_time
+                self.fps_gauge.set(fps)
+
+                wait_ms = 1
+                if self.governor is not None:
+                    self.governor.observe(frame_time)
+                    wait_ms = max(1, int((self.governor.frame_interval - frame_time) * 1000))
+                key = cv2.waitKey(wait_ms) & 0xFF
+                if key == ord('q'):
+                    break
+                if key == ord('s'):
+                    if self.viewer.is_visible:
+                        self.viewer.close_panel()
+
+        finally:
+            self.close()
+            cv2.destroyAllWindows()
+            print("[EXIT] Cleanup done.")
+
+    def close(self):
+        if self._capture_pool is not None:
+            self._capture_pool.shutdown(wait=False)
+        for slot in self.slots:
+            try:
+                slot.source.close()
+            except Exception as e:
+                print(f"[ERROR] Closing {slot.name}: {e}")
+
+    def benchmark_scaling(self, iterations=50):
+        """
+        Đo thông lượng (chụp + suy luận, không vẽ) với 1..N camera, chạy tuần tự và gộp batch.
+        Hiệu suất = FPS tổng với k camera / (k * FPS tổng với 1 camera).
+        """
+        imgsz = self.governor.imgsz if self.governor is not None else self.frame_width
+        all_slots = self.slots
+        rows = []
+        try:
+            for batch in (False, True):
+                self.batch = batch
+                single_fps = None
+                for count in range(1, len(all_slots) + 1):
+                    self.slots = all_slots[:count]
+                    self._capture_all()
+                    self._infer([slot.frame for slot in self.slots], imgsz)  # warm-up cho batch size mới
+                    infer_total = 0.0
+                    t0 = time.perf_counter()
+                    for _ in range(iterations):
+                        self._capture_all()
+                        infer_start = time.perf_counter()
+                        self._infer([slot.frame for slot in self.slots], imgsz)
+                        infer_total += time.perf_counter() - infer_start
+                    elapsed = time.perf_counter() - t0
+                    total_fps = count * iterations / elapsed
+                    single_fps = single_fps or total_fps
+                    rows.append({
+                        "mode": "batch" if batch else "sequential",
+                        "cameras": count,
+                        "total_fps": total_fps,
+                        "per_camera_fps": total_fps / count,
+                        "ms_per_frame_infer": infer_total / (count * iterations) * 1000,
+                        "efficiency": total_fps / (count * single_fps),
+                    })
+        finally:
+            self.slots = all_slots
+            self.batch = MULTI_CAMERA_BATCH
+
+        print("========== Multi-Camera Throughput ==========")
+        print(f"{'mode':<11} {'cams':>4} {'total fps':>10} {'fps/cam':>8} {'infer ms/frame':>15} {'scaling':>8}")
+        for r in rows:
+            print(f"{r['mode']:<11} {r['cameras']:>4} {r['total_fps']:>10.2f} {r['per_camera_fps']:>8.2f} "
+                  f"{r['ms_per_frame_infer']:>15.1f} {r['efficiency']:>7.0%}")
+        print("=============================================")
+        return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Smart fridge detector, nhiều camera dùng chung model")
+    parser.add_argument("--sources", nargs="+", default=None,
+                        help="camera_num (số) hoặc đường dẫn video/USB; mặc định CAMERA_SOURCES trong config.py")
+    parser.add_argument("--benchmark", action="store_true", help="chỉ đo thông lượng theo số camera rồi thoát")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    sources = CAMERA_SOURCES
+    if args.sources:
+        sources = [int(s) if s.isdigit() else s for s in args.sources]
+    app = MultiCameraDetector(sources)
+    if args.benchmark:
+        try:
+            app.benchmark_scaling(args.iterations)
+        finally:
+            app.close()
+    else:
+        app.run()
@@ -0,0 +1,128 @@
+import time
+
+from config import (
+    GOVERNOR_IMGSZ_STEPS, GOVERNOR_TARGET_FPS, GOVERNOR_MAX_SOC_TEMP, GOVERNOR_TEMP_HYSTERESIS,
+    GOVERNOR_MAX_CPU, GOVERNOR_MAX_FRAME_INTERVAL, GOVERNOR_INTERVAL,
+    GOVERNOR_THERMAL_PATH, GOVERNOR_PROC_STAT_PATH
+)
+
+
+class PerformanceGovernor:
+    """
+    Điều chỉnh imgsz và nhịp chụp theo độ trễ suy luận, tải CPU và nhiệt độ SoC.
+    Ưu tiên giữ FPS mục tiêu và không vượt ngưỡng nhiệt; khi dư tài nguyên thì
+    tăng lại từng bậc (nhịp chụp trước, độ phân giải sau).
+    Đường dẫn sysfs/procfs truyền vào được để kiểm thử bằng file giả.
+    """
+
+    def __init__(self, imgsz_steps=GOVERNOR_IMGSZ_STEPS, target_fps=GOVERNOR_TARGET_FPS,
+                 max_soc_temp=GOVERNOR_MAX_SOC_TEMP, temp_hysteresis=GOVERNOR_TEMP_HYSTERESIS,
+                 max_cpu=GOVERNOR_MAX_CPU, max_frame_interval=GOVERNOR_MAX_FRAME_INTERVAL,
+                 interval=GOVERNOR_INTERVAL, thermal_path=GOVERNOR_THERMAL_PATH,
+                 proc_stat_path=GOVERNOR_PROC_STAT_PATH):
+        self.imgsz_steps = sorted(imgsz_steps)
+        self._all_steps = list(self.imgsz_steps)  # để unlock_imgsz() khôi phục
+        self.level = len(self.imgsz_steps) - 1  # bắt đầu ở độ phân giải cao nhất
+        self.target_fps = target_fps
+        self.max_soc_temp = max_soc_temp
+        self.temp_hysteresis = temp_hysteresis
+        self.max_cpu = max_cpu
+        self.max_frame_interval = max_frame_interval
+        self.interval = interval
+        self.thermal_path = thermal_path
+        self.proc_stat_path = proc_stat_path
+
+        self.frame_interval = 0.0  # thời gian tối thiểu giữa 2 frame (0 = không giới hạn)
+        self.fps = 0.0
+        self.soc_temp = None
+        self.cpu = None
+        self._last_update = time.monotonic()
+        self._last_cpu_times = self._read_cpu_times()
+
+    @property
+    def imgsz(self):
+        return self.imgsz_steps[self.level]
+
+    def _read_soc_temp(self):
+        try:
+            with open(self.thermal_path, "r") as f:
+                return int(f.read().strip()) / 1000.0  # sysfs trả về mili-độ C
+        except (OSError, ValueError):
+            return None
+
+    def _read_cpu_times(self):
+        try:
+            with open(self.proc_stat_path, "r") as f:
+                fields = [int(v) for v in f.readline().split()[1:]]
+            idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+        except (OSError, ValueError, IndexError):
+            # Dòng rỗng/thiếu trường (procfs giả, container lạ) thì bỏ qua số liệu CPU
+            return None
+        return idle, sum(fields)
+
+    def _read_cpu_utilisation(self):
+        current = self._read_cpu_times()
+        previous, self._last_cpu_times = self._last_cpu_times, current
+        if current is None or previous is None or current[1] == previous[1]:
+            return None
+        return 1.0 - (current[0] - previous[0]) / (current[1] - previous[1])
+
+    def observe(self, frame_seconds):
+        """Gọi mỗi frame đã suy luận; quyết định lại sau mỗi `interval` giây."""
+        if frame_seconds > 0:
+            self.fps = 0.9 * self.fps + 0.1 / frame_seconds if self.fps else 1.0 / frame_seconds
+        now = time.monotonic()
+        if now - self._last_update >= self.interval:
+            self._last_update = now
+            self.update()
+
+    def update(self):
+        self.soc_temp = self._read_soc_temp()
+        self.cpu = self._read_cpu_utilisation()
+        too_hot = self.soc_temp is not None and self.soc_temp >= self.max_soc_temp
+        cool = self.soc_temp is None or self.soc_temp < self.max_soc_temp - self.temp_hysteresis
+        too_slow = self.fps < self.target_fps * 0.9
+        cpu_ok = self.cpu is None or self.cpu < self.max_cpu
+        # Chi phí suy luận tỉ lệ ~ imgsz^2: chỉ tăng bậc nếu FPS dự đoán ở bậc mới vẫn đạt mục tiêu
+        next_level = min(self.level + 1, len(self.imgsz_steps) - 1)
+        predicted_fps = self.fps * (self.imgsz / self.imgsz_steps[next_level]) ** 2
+        old = (self.imgsz, self.frame_interval)
+
+        if too_hot:
+            # Quá nhiệt: giảm nhịp chụp trước (giảm nhiệt hiệu quả nhất), rồi mới giảm độ phân giải
+            if self.frame_interval < self.max_frame_interval:
+                self.frame_interval = min(self.max_frame_interval,
+                                          max(self.frame_interval * 2, 1.0 / max(self.target_fps, 0.1)))
+            elif self.level > 0:
+                self.level -= 1
+        elif too_slow and self.level > 0:
+            self.level -= 1
+        elif cool and cpu_ok:
+            if self.frame_interval > 0.0:
+                self.frame_interval /= 2
+                if self.frame_interval < 0.05:
+                    self.frame_interval = 0.0
+            elif next_level != self.level and predicted_fps > self.target_fps * 1.05:
+                self.level = next_level
+
+        if self.imgsz != old[0]:
+            self.fps = 0.0  # FPS cũ không còn đúng với imgsz mới, đo lại từ đầu
+        if (self.imgsz, self.frame_interval) != old:
+            print(f"[GOVERNOR] imgsz {old[0]} -> {self.imgsz}, frame interval "
+                  f"{old[1]:.2f}s -> {self.frame_interval:.2f}s "
+                  f"(fps={self.fps:.1f}, soc={self.soc_temp}, cpu={self.cpu})")
+
+    def lock_imgsz(self, imgsz):
+        """Model export (ONNX/NCNN/OpenVINO) có kích thước đầu vào cố định: chỉ còn điều chỉnh nhịp chụp."""
+        self.imgsz_steps = [imgsz]
+        self.level = 0
+
+    def unlock_imgsz(self):
+        """Quay lại model .pt (imgsz tùy ý): điều chỉnh lại imgsz, bắt đầu từ bậc gần nhất không lớn hơn imgsz đang dùng."""
+        current = self.imgsz
+        self.imgsz_steps = list(self._all_steps)
+        self.level = max([i for i, step in enumerate(self.imgsz_steps) if step <= current] or [0])
+
+    def stats(self):
+        return {"imgsz": self.imgsz, "frame_interval": self.frame_interval, "fps": round(self.fps, 2),
+                "soc_temp": self.soc_temp, "cpu": None if self.cpu is None else round(self.cpu, 3)}
@@ -0,0 +1,12 @@
+import numpy as np
+
+from config import CONF_THRESHOLD, IGNORE_CLASSES
+
+
+def filter_detections(boxes, scores, classes, conf_threshold=CONF_THRESHOLD, ignore_classes=IGNORE_CLASSES):
+    """
+    Hậu xử lý của detector chạy thật: bỏ box dưới CONF_THRESHOLD và class trong IGNORE_CLASSES.
+    Dùng chung cho vòng lặp camera, shadow, benchmark tile và bộ đánh giá để kết quả khớp nhau.
+    """
+    mask = (scores >= conf_threshold) & ~np.isin(classes.astype(int), ignore_classes)
+    return boxes[mask], scores[mask], classes[mask].astype(int)
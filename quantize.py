@@ -0,0 +1,221 @@
+"""
+Lượng tử hóa INT8 (static) cho yolo11n, hiệu chuẩn bằng frame chụp từ chính tủ của mình.
+
+    # 1. Ghi frame hiệu chuẩn từ camera (nên chụp cả lúc tủ đầy / vơi / đèn khác nhau)
+    python quantize.py record --out /home/rpi/project/calib --count 300 --interval 2
+    # 2. Lượng tử hóa + so sánh với FP32 bằng cùng bộ đánh giá (evaluate.py)
+    python quantize.py quantize --backend openvino --calib /home/rpi/project/calib --data /home/rpi/project/eval
+    # 3. Trong config.py: MODEL_PRECISION = "int8", QUANTIZED_MODEL_PATH = <đường dẫn in ra ở bước 2>
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from config import MODEL_PATH, FRAME_WIDTH, FRAME_HEIGHT, CAMERA_FORMAT, CAMERA_SLEEP
+
+
+def int8_artifact_path(weights, backend, imgsz):
+    stem = os.path.splitext(weights)[0]
+    suffix = {"onnx": ".onnx", "ncnn": "_ncnn_model", "openvino": "_openvino_model"}[backend]
+    return f"{stem}_{imgsz}_int8{suffix}"
+
+
+def calibration_images(folder, limit):
+    paths = sorted(p for p in glob.glob(os.path.join(folder, "*.*"))
+                   if p.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+    if not paths:
+        raise SystemExit(f"No calibration frames in {folder} (run: python quantize.py record)")
+    if limit and len(paths) > limit:
+        # Lấy rải đều theo thời gian ghi thay vì chỉ các frame đầu
+        paths = [paths[i] for i in np.linspace(0, len(paths) - 1, limit).astype(int)]
+    return paths
+
+
+def record(args):
+    """Chụp frame giống hệt vòng lặp detector (camera 1, RGB -> BGR, FRAME_WIDTH x FRAME_HEIGHT)."""
+    import cv2
+    from picamera2 import Picamera2
+
+    os.makedirs(args.out, exist_ok=True)
+    picam2 = Picamera2(camera_num=1)
+    picam2.configure(picam2.create_still_configuration(
+        main={"format": CAMERA_FORMAT, "size": (FRAME_WIDTH, FRAME_HEIGHT)}
+    ))
+    picam2.start()
+    time.sleep(CAMERA_SLEEP)
+    try:
+        for i in range(args.count):
+            frame = cv2.cvtColor(picam2.capture_array(), cv2.COLOR_RGB2BGR)
+            path = os.path.join(args.out, f"calib_{time.strftime('%Y%m%d_%H%M%S')}_{i:04d}.jpg")
+            cv2.imwrite(path, frame)
+            print(f"[CALIB] {i + 1}/{args.count} {path}")
+            time.sleep(args.interval)
+    finally:
+        picam2.stop()
+        picam2.close()
+
+
+def _quantize_openvino(args, paths):
+    """ultralytics + NNCF: export int8 với tập hiệu chuẩn khai báo qua file yaml dataset."""
+    from ultralytics import YOLO
+
+    model = YOLO(args.weights)
+    with tempfile.TemporaryDirectory() as tmp:
+        image_dir = os.path.join(tmp, "images")
+        os.makedirs(image_dir)
+        for p in paths:
+            os.symlink(os.path.abspath(p), os.path.join(image_dir, os.path.basename(p)))
+        data_yaml = os.path.join(tmp, "calib.yaml")
+        names = model.names if isinstance(model.names, dict) else dict(enumerate(model.names))
+        with open(data_yaml, "w", encoding="utf-8") as f:
+            f.write(f"path: {tmp}\ntrain: images\nval: images\nnames:\n")
+            for k, v in names.items():
+                f.write(f"  {k}: {json.dumps(v, ensure_ascii=False)}\n")
+        exported = model.export(format="openvino", int8=True, data=data_yaml, imgsz=args.imgsz,
+                                fraction=1.0)
+    return exported
+
+
+def _quantize_onnx(args, paths):
+    """ONNX Runtime quantize_static (QDQ, per-channel) trên bản ONNX FP32, đầu vào letterbox như lúc chạy."""
+    import cv2
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from benchmark import ensure_artifact
+    from infer import letterbox
+
+    fp32_path = ensure_artifact(args.weights, "onnx", args.imgsz)
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            import onnxruntime
+            self.input_name = onnxruntime.InferenceSession(
+                fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+            self.paths = iter(paths)
+
+        def get_next(self):
+            path = next(self.paths, None)
+            if path is None:
+                return None
+            img = cv2.resize(cv2.imread(path), (FRAME_WIDTH, FRAME_HEIGHT))
+            # ultralytics đưa vào model ảnh RGB, CHW, 0-1
+            boxed, _, _ = letterbox(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), args.imgsz)
+            return {self.input_name: (boxed.transpose(2, 0, 1)[None] / np.float32(255.0)).astype(np.float32)}
+
+    out_path = int8_artifact_path(args.weights, "onnx", args.imgsz)
+    quantize_static(fp32_path, out_path, FrameReader(), quant_format=QuantFormat.QDQ,
+                    per_channel=True, activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    return out_path
+
+
+def _quantize_ncnn(args, paths):
+    """Dùng công cụ ncnn2table / ncnn2int8 của NCNN (phải có trong PATH) trên bản NCNN FP32."""
+    from benchmark import ensure_artifact
+
+    for tool in ("ncnn2table", "ncnn2int8"):
+        if shutil.which(tool) is None:
+            raise SystemExit(f"{tool} not found in PATH (build NCNN tools or use --backend openvino/onnx)")
+    fp32_dir = ensure_artifact(args.weights, "ncnn", args.imgsz)
+    out_dir = int8_artifact_path(args.weights, "ncnn", args.imgsz)
+    shutil.copytree(fp32_dir, out_dir, dirs_exist_ok=True)
+    param, bin_ = os.path.join(fp32_dir, "model.ncnn.param"), os.path.join(fp32_dir, "model.ncnn.bin")
+    table = os.path.join(out_dir, "model.table")
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        f.write("\n".join(os.path.abspath(p) for p in paths) + "\n")
+        image_list = f.name
+    try:
+        subprocess.run(["ncnn2table", param, bin_, image_list, table, "mean=[0,0,0]",
+                        "norm=[0.003922,0.003922,0.003922]", f"shape=[{args.imgsz},{args.imgsz},3]",
+                        "pixel=RGB", "thread=4", "method=kl"], check=True)
+        subprocess.run(["ncnn2int8", param, bin_, os.path.join(out_dir, "model.ncnn.param"),
+                        os.path.join(out_dir, "model.ncnn.bin"), table], check=True)
+    finally:
+        os.remove(image_list)
+    return out_dir
+
+
+QUANTIZERS = {"openvino": _quantize_openvino, "onnx": _quantize_onnx, "ncnn": _quantize_ncnn}
+
+
+def quantize(args):
+    paths = calibration_images(args.calib, args.calib_limit)
+    print(f"[QUANT] {args.backend} INT8 @ imgsz={args.imgsz}, calibrating on {len(paths)} frames...")
+    t0 = time.perf_counter()
+    exported = QUANTIZERS[args.backend](args, paths)
+    target = int8_artifact_path(args.weights, args.backend, args.imgsz)
+    if os.path.abspath(exported) != os.path.abspath(target):
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        os.replace(exported, target)
+    print(f"[QUANT] Done in {time.perf_counter() - t0:.0f}s -> {target}")
+
+    if args.data:
+        compare(args, target)
+    print(f'Để dùng cho camera: trong config.py đặt MODEL_PRECISION = "int8" và QUANTIZED_MODEL_PATH = "{target}"')
+
+
+def compare(args, int8_path):
+    """Đánh giá FP32 (cùng backend) và INT8 bằng evaluate.py rồi in bảng so sánh."""
+    from evaluate import evaluate
+
+    def run(model_path):
+        ns = argparse.Namespace(data=args.data, weights=args.weights, backend=args.backend, model=model_path,
+                                imgsz=args.imgsz, warmup=args.warmup)
+        return evaluate(ns)
+
+    from benchmark import ensure_artifact
+    fp32 = run(ensure_artifact(args.weights, args.backend, args.imgsz))
+    int8 = run(int8_path)
+    rows = [("mAP50", "overall", "map50"), ("mAP50-95", "overall", "map50_95"),
+            ("precision", "overall", "precision"), ("recall", "overall", "recall")]
+    os.makedirs(args.report_dir, exist_ok=True)
+    report_path = os.path.join(args.report_dir, f"quant_{args.backend}_{args.imgsz}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"fp32": fp32, "int8": int8}, f, indent=2, ensure_ascii=False)
+
+    print("========== FP32 vs INT8 ==========")
+    print(f"{'metric':<12} {'fp32':>9} {'int8':>9} {'delta':>9}")
+    for label, section, key in rows:
+        a, b = fp32[section][key], int8[section][key]
+        print(f"{label:<12} {a:>9.4f} {b:>9.4f} {b - a:>+9.4f}")
+    for key in ("p50_ms", "p90_ms", "p99_ms"):
+        a, b = fp32["latency"]["inference"][key], int8["latency"]["inference"][key]
+        print(f"{key:<12} {a:>9.1f} {b:>9.1f} {b / a:>8.2f}x")
+    print(f"Report: {report_path}")
+    print("==================================")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lượng tử hóa INT8 hiệu chuẩn bằng frame của tủ")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="ghi frame hiệu chuẩn từ camera")
+    rec.add_argument("--out", default="/home/rpi/project/calib")
+    rec.add_argument("--count", type=int, default=300)
+    rec.add_argument("--interval", type=float, default=2.0, help="giây giữa 2 frame")
+
+    q = sub.add_parser("quantize", help="lượng tử hóa và (tùy chọn) so sánh với FP32")
+    q.add_argument("--weights", default=MODEL_PATH)
+    q.add_argument("--backend", default="openvino", choices=list(QUANTIZERS))
+    q.add_argument("--imgsz", type=int, default=FRAME_WIDTH)
+    q.add_argument("--calib", default="/home/rpi/project/calib")
+    q.add_argument("--calib-limit", type=int, default=300)
+    q.add_argument("--data", default=None, help="tập có nhãn để so sánh FP32/INT8 (xem evaluate.py)")
+    q.add_argument("--warmup", type=int, default=3)
+    q.add_argument("--report-dir", default="reports")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args)
+    else:
+        quantize(args)
+
+
+if __name__ == "__main__":
+    main()
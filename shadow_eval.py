@@ -0,0 +1,211 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from config import SHADOW_MODEL_PATH, SHADOW_CPU_BUDGET, SHADOW_MATCH_IOU, SHADOW_LOG_DIR
+from metrics import REGISTRY
+from postprocess import filter_detections
+
+
+def compare_detections(prod, cand, iou_threshold=SHADOW_MATCH_IOU):
+    """
+    Ghép box 2 model theo IoU (không xét class), trả về số box khớp cùng class, khớp khác class,
+    chỉ có ở production, chỉ có ở ứng viên và điểm đồng thuận F1 = 2*khớp / (tổng 2 bên).
+    """
+    prod_boxes, _, prod_classes = prod
+    cand_boxes, cand_scores, cand_classes = cand
+    used = set()
+    matched = class_mismatch = 0
+    for i in np.argsort(-cand_scores):
+        best, best_iou = None, iou_threshold
+        for j in range(len(prod_boxes)):
+            if j in used:
+                continue
+            a, b = cand_boxes[i], prod_boxes[j]
+            inter = max(0.0, min(a[2], b[2]) - max(a[0], b[0])) * max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+            union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+            iou = inter / union if union > 0 else 0.0
+            if iou >= best_iou:
+                best, best_iou = j, iou
+        if best is not None:
+            used.add(best)
+            if cand_classes[i] == prod_classes[best]:
+                matched += 1
+            else:
+                class_mismatch += 1
+    total = len(prod_boxes) + len(cand_boxes)
+    return {
+        "matched": matched,
+        "class_mismatch": class_mismatch,
+        "prod_only": len(prod_boxes) - matched - class_mismatch,
+        "cand_only": len(cand_boxes) - matched - class_mismatch,
+        "agreement": 2 * matched / total if total else 1.0,
+    }
+
+
+class ShadowEvaluator:
+    """
+    Chạy model ứng viên trên các frame được gửi tới, ở 1 thread ưu tiên thấp, và ghi kết quả
+    cạnh kết quả production (JSONL). Frame mới bị bỏ nếu thread còn bận, và sau mỗi lần suy luận
+    thread nghỉ đủ lâu để thời gian CPU của nó không vượt `cpu_budget` (tỉ lệ của 1 nhân).
+    predict chạy trên pool intra-op của torch (nhiều nhân) nên CPU của 1 lần suy luận được tính
+    là thời gian thực x số thread của pool, không phải thời gian của riêng thread này.
+    """
+
+    def __init__(self, model_path=SHADOW_MODEL_PATH, cpu_budget=SHADOW_CPU_BUDGET, log_dir=SHADOW_LOG_DIR,
+                 max_consecutive_errors=5):
+        self.model_path = model_path
+        self.cpu_budget = cpu_budget
+        self.max_consecutive_errors = max_consecutive_errors
+        os.makedirs(log_dir, exist_ok=True)
+        self.log_path = os.path.join(log_dir, f"shadow_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+        self.model = None
+        self.intra_op_threads = 1  # torch.get_num_threads(), đọc sau khi nạp model
+        self.state = "loading"  # loading | running | failed: <lỗi> | stopped
+        self._queue = queue.Queue(maxsize=1)
+        self._stop = threading.Event()
+
+        self.evaluated = 0
+        self.dropped = 0
+        self.throttled_seconds = 0.0
+        self.errors = 0
+        self.last_error = None
+        self._agreement_sum = 0.0
+        self._totals = {"matched": 0, "class_mismatch": 0, "prod_only": 0, "cand_only": 0}
+        self.latency = REGISTRY.histogram("shadow_inference_seconds", "Thời gian predict của model ứng viên (giây)")
+        self.frames_total = REGISTRY.counter("shadow_frames_total", "Số frame đã đánh giá bằng model ứng viên")
+        self.dropped_total = REGISTRY.counter("shadow_frames_dropped_total", "Frame bỏ qua vì thread shadow đang bận")
+        self.errors_total = REGISTRY.counter("shadow_errors_total", "Số frame đánh giá lỗi (predict/lọc/ghi log)")
+        REGISTRY.gauge("shadow_agreement", "Điểm đồng thuận F1 trung bình với production",
+                       fn=lambda: self._agreement_sum / self.evaluated if self.evaluated else 0.0)
+
+        self._thread = threading.Thread(target=self._worker, name="shadow-eval", daemon=True)
+        self._thread.start()
+
+    def submit(self, frame, prod_boxes, prod_scores, prod_classes, imgsz, prod_seconds):
+        """Gọi từ vòng lặp chính; không bao giờ chặn."""
+        if self.model is None:
+            return False
+        try:
+            self._queue.put_nowait((frame, (prod_boxes, prod_scores, prod_classes), imgsz, prod_seconds))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            self.dropped_total.inc()
+            return False
+
+    def _lower_priority(self):
+        # Trên Linux mỗi thread là 1 task riêng nên có thể đặt nice cho riêng thread này
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except (AttributeError, OSError):
+            pass
+
+    def _worker(self):
+        self._lower_priority()
+        try:
+            import torch
+            from ultralytics import YOLO
+            self.model = YOLO(self.model_path)
+            self.intra_op_threads = max(1, torch.get_num_threads())
+            self.state = "running"
+            print(f"[SHADOW] Candidate loaded: {self.model_path} -> {self.log_path}")
+        except Exception as e:
+            self.state = f"failed: {e}"
+            print(f"[SHADOW] Load failed: {e}")
+            return
+
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as log:
+                self._run(log)
+        except OSError as e:
+            self.state = f"failed: {e}"
+            print(f"[SHADOW] Cannot write {self.log_path}: {e}")
+        finally:
+            # Ngừng nhận frame mới khi thread đã thoát (dừng bình thường hoặc lỗi)
+            self.model = None
+
+    def _run(self, log):
+        consecutive_errors = 0
+        while not self._stop.is_set():
+            try:
+                frame, prod, imgsz, prod_seconds = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            cpu_start = time.thread_time()
+            t0 = time.perf_counter()
+            try:
+                self._evaluate(log, frame, prod, imgsz, prod_seconds, t0)
+                consecutive_errors = 0
+            except Exception as e:
+                # Lỗi của model ứng viên không được làm dừng thread âm thầm: ghi nhận, bỏ frame này
+                consecutive_errors += 1
+                self.errors += 1
+                self.errors_total.inc()
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"[SHADOW] Evaluation failed ({consecutive_errors}/{self.max_consecutive_errors}): "
+                      f"{self.last_error}")
+                if consecutive_errors >= self.max_consecutive_errors:
+                    self.state = f"failed: {self.last_error}"
+                    print("[SHADOW] Too many consecutive errors, stopping shadow evaluation.")
+                    return
+
+            # Giới hạn CPU: thời gian CPU đã dùng / budget = thời gian tối thiểu cho 1 chu kỳ.
+            # thread_time không tính các thread intra-op của torch, vốn chạy song song suốt lần
+            # predict, nên ước lượng theo thời gian thực x số thread (cận trên, an toàn cho production).
+            # Không dùng process_time: nó gồm cả CPU của luồng suy luận production.
+            wall = time.perf_counter() - t0
+            cpu_used = max(time.thread_time() - cpu_start, wall * self.intra_op_threads)
+            rest = cpu_used / self.cpu_budget - (time.perf_counter() - t0)
+            if rest > 0:
+                self.throttled_seconds += rest
+                self._stop.wait(rest)
+        self.state = "stopped"
+
+    def _evaluate(self, log, frame, prod, imgsz, prod_seconds, t0):
+        """Suy luận 1 frame bằng model ứng viên, so với production và ghi 1 dòng JSONL."""
+        r = self.model.predict(frame, verbose=False, imgsz=imgsz)[0]
+        seconds = time.perf_counter() - t0
+        cand = filter_detections(r.boxes.xyxy.cpu().numpy(), r.boxes.conf.cpu().numpy(),
+                                 r.boxes.cls.cpu().numpy())
+        prod = filter_detections(*prod)
+        result = compare_detections(prod, cand)
+
+        self.latency.observe(seconds)
+        self.frames_total.inc()
+        self.evaluated += 1
+        self._agreement_sum += result["agreement"]
+        for key in self._totals:
+            self._totals[key] += result[key]
+        log.write(json.dumps({
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "prod_ms": round(prod_seconds * 1000, 1),
+            "cand_ms": round(seconds * 1000, 1),
+            "prod": [[int(c), round(float(s), 3)] for c, s in zip(prod[2], prod[1])],
+            "cand": [[int(c), round(float(s), 3)] for c, s in zip(cand[2], cand[1])],
+            **result,
+        }) + "\n")
+        log.flush()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "model": self.model_path,
+            "evaluated": self.evaluated,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "agreement": round(self._agreement_sum / self.evaluated, 3) if self.evaluated else None,
+            **self._totals,
+            "latency": self.latency.summary(),
+            "throttled_seconds": round(self.throttled_seconds, 1),
+            "intra_op_threads": self.intra_op_threads,
+        }
@@ -15,6 +15,9 @@ class ShowActivate:
         self.is_visible = False 
         self.current_key = None 
         self.db = {} 
+        # Panel đã vẽ gần nhất và khóa tương ứng; nội dung chỉ đổi khi chọn món khác / nạp lại DB
+        self._panel = None
+        self._panel_key = None
         
         self.font_path = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
         if not os.path.exists(self.font_path):
@@ -32,6 +35,7 @@ class ShowActivate:
                 self.db = {}
         else:
             self.db = {}
+        self._panel = None
 
     def show_specific_item(self, class_name):
         """Hiển thị thông tin class này ngay lập tức"""
@@ -79,6 +83,16 @@ class ShowActivate:
         return y
 
     def get_image(self):
+        """
+        Panel cho món đang chọn, chỉ vẽ lại (PIL, khá chậm) khi món thay đổi. Ảnh trả về được
+        dùng chung giữa các frame: chỉ đọc / chép ra, không vẽ đè lên.
+        """
+        if self._panel is None or self._panel_key != self.current_key:
+            self._panel = self.render_image()
+            self._panel_key = self.current_key
+        return self._panel
+
+    def render_image(self):
         # Tạo nền đen
         canvas = np.zeros((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
         img_pil = Image.fromarray(cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB))
@@ -0,0 +1,235 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from config import (
+    FRAME_WIDTH, FRAME_HEIGHT, IOU_THRESHOLD,
+    SHELF_ROIS, TILE_SIZE, TILE_OVERLAP, TILE_CHANGE_THRESHOLD, TILE_MAX_AGE, TILE_CONTAIN_THRESHOLD
+)
+from postprocess import filter_detections
+
+# Lưới lấy mẫu để so sánh tile với lần suy luận trước (rẻ, không cần resize)
+CHANGE_SAMPLE_STEP = 8
+
+
+def make_tiles(region, tile_size, overlap):
+    """Chia 1 vùng (x1, y1, x2, y2) thành các tile vuông, chồng lấn ít nhất `overlap`, rải đều tới sát mép."""
+    x1, y1, x2, y2 = region
+    if tile_size <= 0 or (x2 - x1 <= tile_size and y2 - y1 <= tile_size):
+        return [region]
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+
+    def starts(lo, hi):
+        span = hi - lo - tile_size
+        if span <= 0:
+            return [lo]
+        count = -(-span // stride) + 1
+        return [lo + round(i * span / (count - 1)) for i in range(count)]
+
+    return [(x, y, min(x + tile_size, x2), min(y + tile_size, y2))
+            for y in starts(y1, y2) for x in starts(x1, x2)]
+
+
+def global_nms(boxes, scores, classes, iou_threshold=IOU_THRESHOLD, contain_threshold=TILE_CONTAIN_THRESHOLD):
+    """
+    NMS theo class trên box đã gộp từ mọi tile. Ngoài IoU còn bỏ box nằm gần trọn trong box
+    cùng class có score cao hơn (nửa chai bị cắt ở mép tile).
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=int)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-scores)
+    keep = []
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for idx in order:
+        if suppressed[idx]:
+            continue
+        keep.append(idx)
+        xx1 = np.maximum(boxes[idx, 0], boxes[:, 0])
+        yy1 = np.maximum(boxes[idx, 1], boxes[:, 1])
+        xx2 = np.minimum(boxes[idx, 2], boxes[:, 2])
+        yy2 = np.minimum(boxes[idx, 3], boxes[:, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / np.maximum(areas[idx] + areas - inter, 1e-6)
+        contained = inter / np.maximum(np.minimum(areas[idx], areas), 1e-6)
+        same_class = classes == classes[idx]
+        suppressed |= same_class & ((iou > iou_threshold) | (contained > contain_threshold))
+    return np.array(keep, dtype=int)
+
+
+class TiledInference:
+    """
+    Suy luận trên các vùng kệ (SHELF_ROIS) và/hoặc tile chồng lấn, mỗi tile được phóng
+    lên imgsz của model nên vật nhỏ có nhiều pixel hơn mà không phải tăng imgsz cả frame.
+    Chỉ tile thay đổi (hoặc quá TILE_MAX_AGE frame) mới được suy luận lại, gộp 1 batch;
+    kết quả mọi tile được đưa về tọa độ frame và qua NMS toàn cục.
+    """
+
+    def __init__(self, rois=SHELF_ROIS, tile_size=TILE_SIZE, overlap=TILE_OVERLAP,
+                 change_threshold=TILE_CHANGE_THRESHOLD, max_age=TILE_MAX_AGE,
+                 frame_size=(FRAME_WIDTH, FRAME_HEIGHT)):
+        regions = [tuple(r) for r in rois] or [(0, 0, frame_size[0], frame_size[1])]
+        self.tiles = [t for region in regions for t in make_tiles(region, tile_size, overlap)]
+        self.change_threshold = change_threshold
+        self.max_age = max_age
+        self.reset()
+
+    def reset(self):
+        """Xóa cache (gọi khi đổi model hoặc đổi imgsz)."""
+        self._signatures = [None] * len(self.tiles)
+        self._cached = [None] * len(self.tiles)
+        self._age = [0] * len(self.tiles)
+        self._imgsz = None
+        self.tiles_inferred = 0
+        self.tiles_reused = 0
+
+    def _changed(self, i, crop):
+        signature = crop[::CHANGE_SAMPLE_STEP, ::CHANGE_SAMPLE_STEP].astype(np.int16)
+        previous = self._signatures[i]
+        if previous is None or self._age[i] >= self.max_age:
+            return True, signature
+        return float(np.abs(signature - previous).mean()) > self.change_threshold, signature
+
+    def predict(self, model, frame, imgsz):
+        """Trả về (boxes xyxy, scores, classes) theo tọa độ frame, giống _result_arrays."""
+        if imgsz != self._imgsz:
+            self.reset()
+            self._imgsz = imgsz
+
+        dirty, crops, signatures = [], [], []
+        for i, (x1, y1, x2, y2) in enumerate(self.tiles):
+            crop = frame[y1:y2, x1:x2]
+            changed, signature = self._changed(i, crop)
+            if changed:
+                dirty.append(i)
+                crops.append(np.ascontiguousarray(crop))
+                signatures.append(signature)
+            else:
+                self._age[i] += 1
+
+        if crops:
+            results = model.predict(crops, verbose=False, imgsz=imgsz)
+            for i, signature, r in zip(dirty, signatures, results):
+                x1, y1 = self.tiles[i][:2]
+                boxes = r.boxes.xyxy.cpu().numpy() + np.array([x1, y1, x1, y1], dtype=np.float32)
+                self._cached[i] = (boxes, r.boxes.conf.cpu().numpy(), r.boxes.cls.cpu().numpy())
+                self._signatures[i] = signature
+                self._age[i] = 0
+        self.tiles_inferred += len(dirty)
+        self.tiles_reused += len(self.tiles) - len(dirty)
+
+        boxes = np.concatenate([c[0] for c in self._cached]).reshape(-1, 4)
+        scores = np.concatenate([c[1] for c in self._cached])
+        classes = np.concatenate([c[2] for c in self._cached])
+        keep = global_nms(boxes, scores, classes)
+        return boxes[keep], scores[keep], classes[keep]
+
+    def stats(self):
+        total = self.tiles_inferred + self.tiles_reused
+        return {"tiles": len(self.tiles), "inferred": self.tiles_inferred, "reused": self.tiles_reused,
+                "reuse_rate": round(self.tiles_reused / total, 3) if total else 0.0}
+
+
+def _match(pred, labels, iou_threshold=0.5):
+    """Ghép tham lam theo score; trả về (TP, FP, FN, TP của box nhỏ, tổng box nhỏ)."""
+    boxes, scores, classes = pred
+    used = set()
+    tp = 0
+    small_area = (FRAME_WIDTH * FRAME_HEIGHT) * 0.01  # "nhỏ" = dưới 1% diện tích frame
+    small_tp = 0
+    for i in np.argsort(-scores):
+        best, best_iou = None, iou_threshold
+        for j, (cls, x1, y1, x2, y2) in enumerate(labels):
+            if j in used or cls != int(classes[i]):
+                continue
+            bx1, by1, bx2, by2 = boxes[i]
+            inter = max(0, min(x2, bx2) - max(x1, bx1)) * max(0, min(y2, by2) - max(y1, by1))
+            union = (x2 - x1) * (y2 - y1) + (bx2 - bx1) * (by2 - by1) - inter
+            iou = inter / union if union else 0
+            if iou >= best_iou:
+                best, best_iou = j, iou
+        if best is not None:
+            used.add(best)
+            tp += 1
+            _, x1, y1, x2, y2 = labels[best]
+            if (x2 - x1) * (y2 - y1) < small_area:
+                small_tp += 1
+    small_total = sum(1 for _, x1, y1, x2, y2 in labels if (x2 - x1) * (y2 - y1) < small_area)
+    return tp, len(boxes) - tp, len(labels) - tp, small_tp, small_total
+
+
+def benchmark(model_path, image_folder, imgsz, label_folder=None):
+    """
+    So sánh suy luận cả frame và theo tile trên cùng chuỗi ảnh (theo thứ tự tên file, như
+    frame ghi lại từ camera). Có thư mục nhãn YOLO thì báo thêm precision/recall.
+    """
+    import cv2
+    from ultralytics import YOLO
+    from YoloDetector import YOLOCameraDetector
+    from evaluate import read_yolo_labels
+
+    model = YOLO(model_path)
+    paths = sorted(glob.glob(os.path.join(image_folder, "*.*")))
+    frames = []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        frames.append((path, cv2.resize(img, (FRAME_WIDTH, FRAME_HEIGHT))))
+    if not frames:
+        print("No images found!")
+        return
+
+    tiler = TiledInference()
+    modes = {
+        "full": lambda frame: YOLOCameraDetector._result_arrays(
+            model.predict(frame, verbose=False, imgsz=imgsz)[0]),
+        "tiled": lambda frame: tiler.predict(model, frame, imgsz),
+    }
+    report = {}
+    for name, run in modes.items():
+        run(frames[0][1])  # warm-up
+        tiler.reset()
+        latencies, counts = [], np.zeros(5, dtype=int)
+        for path, frame in frames:
+            t0 = time.perf_counter()
+            pred = filter_detections(*run(frame))
+            latencies.append(time.perf_counter() - t0)
+            if label_folder:
+                stem = os.path.splitext(os.path.basename(path))[0]
+                counts += _match(pred, read_yolo_labels(os.path.join(label_folder, stem + ".txt"),
+                                                        FRAME_WIDTH, FRAME_HEIGHT))
+        latencies.sort()
+        tp, fp, fn, small_tp, small_total = counts
+        report[name] = {
+            "mean_ms": 1000 * sum(latencies) / len(latencies),
+            "p90_ms": 1000 * latencies[int(0.9 * (len(latencies) - 1))],
+            "precision": tp / (tp + fp) if tp + fp else None,
+            "recall": tp / (tp + fn) if tp + fn else None,
+            "small_recall": small_tp / small_total if small_total else None,
+        }
+
+    def fmt(v):
+        return f"{v:.3f}" if v is not None else "n/a"
+
+    print("========== Full-frame vs Tiled Inference ==========")
+    print(f"Images: {len(frames)} | imgsz: {imgsz} | tiles: {len(tiler.tiles)} | reuse: {tiler.stats()['reuse_rate']:.0%}")
+    print(f"{'mode':<6} {'mean ms':>8} {'p90 ms':>8} {'prec':>6} {'recall':>7} {'small recall':>13}")
+    for name, r in report.items():
+        print(f"{name:<6} {r['mean_ms']:>8.1f} {r['p90_ms']:>8.1f} {fmt(r['precision']):>6} "
+              f"{fmt(r['recall']):>7} {fmt(r['small_recall']):>13}")
+    print("===================================================")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suy luận cả frame vs theo tile")
+    parser.add_argument("--weights", default="/home/rpi/project/best_weights/yolo11n_3.pt")
+    parser.add_argument("--images", default="/home/rpi/project/test", help="frame ghi lại từ camera, sắp theo tên")
+    parser.add_argument("--labels", default=None, help="thư mục nhãn YOLO .txt cùng tên ảnh (tùy chọn)")
+    parser.add_argument("--imgsz", type=int, default=FRAME_WIDTH)
+    args = parser.parse_args()
+    benchmark(args.weights, args.images, args.imgsz, args.labels)
@@ -5,7 +5,7 @@ from datetime import datetime
 from config import ACTIVATE_MINUTES, RESET_AFTER_SECONDS, STABLE_FRAME_COUNT
 
 class TimeStepLogger:
-    def __init__(self):
+    def __init__(self, log_dir="logs"):
         self.activate_seconds = ACTIVATE_MINUTES * 60
         self.reset_after_seconds = RESET_AFTER_SECONDS
         self.stable_frame_limit = STABLE_FRAME_COUNT
@@ -20,13 +20,15 @@ class TimeStepLogger:
         # [MỚI] Lưu tên class để dùng cho hàm dọn dẹp tự động
         self.id_to_name = {} 
 
-        os.makedirs("logs", exist_ok=True)
+        # Mỗi camera có thư mục log riêng (mặc định "logs" như trước)
+        self.log_dir = log_dir
+        os.makedirs(self.log_dir, exist_ok=True)
 
     def _get_csv_file(self, class_name):
-        return f"logs/{class_name}.csv"
+        return f"{self.log_dir}/{class_name}.csv"
 
     def _get_csv_activate_file(self, class_name):
-        return f"logs/{class_name}_activated.csv"
+        return f"{self.log_dir}/{class_name}_activated.csv"
 
     # ... (Giữ nguyên hàm handle_pause) ...
     def handle_pause(self, pause_duration):